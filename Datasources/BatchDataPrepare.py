@@ -0,0 +1,237 @@
+"""
+Batch runner for the data preparation scripts
+
+Prepares the data of many providers and households in one invocation, driven by a manifest (TOML, or YAML
+when PyYAML is installed). Each job runs a data preparation script with its input files, output file prefix
+and output directory. The jobs run in a pool of worker processes without confirmation prompts; the output of
+each job is written to a log file in its output directory and a failing job does not stop the other jobs.
+
+Manifest (paths are relative to the directory of the manifest):
+  workers = 4                                    # optional, default: number of processors
+
+  [[jobs]]
+  name = "house1-electricity"                    # optional, default: name of the script
+  script = "Fluvius/FluviusDataPrepare.py"       # data preparation script
+  input = ["house1/Verbruikshistoriek_*.csv"]    # input file pattern(s)
+  prefix = "house1"                              # optional, prefix of the output file names
+  output_dir = "output/house1"                   # optional, default: directory of the manifest
+  output_file = "gas_high_resolution.csv"        # optional, only generate this output file
+  options = ["--chunk-size", "100000"]           # optional, engine options of the command line
+  settings = { inputFileTimeZoneName = "Europe/Brussels" }  # optional, engine settings of the script
+
+Typical usage:
+  python BatchDataPrepare.py manifest.toml
+  python BatchDataPrepare.py manifest.toml --workers 2 --job house1-electricity
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import functools
+import os
+import sys
+import time
+import traceback
+from pathlib import Path
+
+# The engine is imported by the data preparation scripts from the directory of this script
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import DataPrepareEngine as engine  # noqa: E402
+
+JOB_KEYS = {
+    "name",
+    "script",
+    "input",
+    "prefix",
+    "output_dir",
+    "output_file",
+    "options",
+    "settings",
+}
+
+
+def load_manifest(manifest_path: Path) -> dict:
+    """Read the manifest (TOML, or YAML when PyYAML is installed)."""
+    if manifest_path.suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml  # type: ignore
+        except ImportError:
+            raise SystemExit(
+                "YAML manifests require PyYAML (pip install pyyaml), or use a TOML manifest"
+            )
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = yaml.safe_load(f) or {}
+    else:
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            try:
+                import tomli as tomllib  # type: ignore
+            except ImportError:
+                raise SystemExit(
+                    "TOML manifests require Python 3.11 or tomli (pip install tomli)"
+                )
+        with open(manifest_path, "rb") as f:
+            manifest = tomllib.load(f)
+
+    if not isinstance(manifest, dict) or not manifest.get("jobs"):
+        raise SystemExit(f"No jobs defined in manifest: {manifest_path}")
+    return manifest
+
+
+def resolve_jobs(manifest: dict, base_dir: Path) -> list[dict]:
+    """Validate the jobs of the manifest and resolve their paths relative to the manifest directory."""
+    jobs = []
+    for index, job in enumerate(manifest["jobs"], start=1):
+        if not isinstance(job, dict):
+            raise SystemExit(f"Job {index} of the manifest is not a table")
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            raise SystemExit(
+                f"Job {index}: unknown key(s): {', '.join(sorted(unknown))}"
+            )
+        if "script" not in job or "input" not in job:
+            raise SystemExit(f"Job {index}: 'script' and 'input' are required")
+
+        patterns = [job["input"]] if isinstance(job["input"], str) else job["input"]
+        jobs.append(
+            {
+                "name": job.get("name", Path(job["script"]).stem),
+                "script": str(base_dir / job["script"]),
+                "input": [str(base_dir / pattern) for pattern in patterns],
+                "prefix": job.get("prefix", ""),
+                "output_dir": str(base_dir / job.get("output_dir", ".")),
+                "output_file": job.get("output_file"),
+                "options": [str(option) for option in job.get("options", [])],
+                "settings": job.get("settings", {}),
+            }
+        )
+
+    names = [job["name"] for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise SystemExit(f"Duplicate job name(s): {', '.join(duplicates)}")
+    return jobs
+
+
+@functools.cache
+def load_script_config(script: str) -> engine.ProviderConfig:
+    """Load the engine configuration of a data preparation script (once per worker process)."""
+    return engine.ProviderConfig.fromProviderScript(script)
+
+
+def run_job(job: dict) -> dict:
+    """Run one job in the current (worker) process, the output is written to the log file of the job."""
+    output_dir = Path(job["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    log_file = output_dir / f"{job['name']}.log"
+    start = time.perf_counter()
+    status = "failed"
+
+    cwd = os.getcwd()
+    with open(log_file, "w", encoding="utf-8") as log, contextlib.redirect_stdout(
+        log
+    ), contextlib.redirect_stderr(log):
+        try:
+            config = load_script_config(job["script"])
+            job_config = engine.ProviderConfig(**{**config.settings, **job["settings"]})
+
+            # The engine writes the output files (and its state file) in the current directory
+            os.chdir(output_dir)
+            if engine.Engine(job_config).generateImportDataFiles(
+                job["input"], job["output_file"], job["prefix"], job["options"]
+            ):
+                status = "ok"
+        except SystemExit as e:
+            print(f"Job stopped with exit code {e.code}")
+        except Exception:
+            traceback.print_exc()
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "name": job["name"],
+        "status": status,
+        "seconds": time.perf_counter() - start,
+        "log_file": str(log_file),
+    }
+
+
+def run_jobs(jobs: list[dict], workers: int) -> list[dict]:
+    """Run the jobs in a pool of worker processes and return their results in the order of the jobs."""
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself failed (e.g. it crashed)
+                result = {
+                    "name": job["name"],
+                    "status": "failed",
+                    "seconds": 0.0,
+                    "log_file": f"worker failed: {e!r}",
+                }
+            results[job["name"]] = result
+            print(f"{result['status']:>6}  {job['name']}")
+    return [results[job["name"]] for job in jobs]
+
+
+def print_summary(results: list[dict]) -> None:
+    """Print the status, duration and log file of each job."""
+    width = max(len(result["name"]) for result in results)
+    print("\nSummary:")
+    for result in results:
+        print(
+            f"  {result['name']:<{width}}  {result['status']:<6}  "
+            f"{result['seconds']:8.1f}s  {result['log_file']}"
+        )
+    failed = sum(result["status"] != "ok" for result in results)
+    print(f"{len(results) - failed} job(s) succeeded, {failed} job(s) failed.")
+
+
+def main() -> None:
+    """Entry point of the batch runner."""
+    parser = argparse.ArgumentParser(
+        description="Run the data preparation jobs of a manifest (TOML or YAML) in a pool of worker processes."
+    )
+    parser.add_argument("manifest", type=Path, help="Path to the manifest file.")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of jobs run at the same time (default: workers of the manifest or number of processors).",
+    )
+    parser.add_argument(
+        "--job",
+        action="append",
+        default=None,
+        help="Only run the job with this name (can be repeated).",
+    )
+    args = parser.parse_args()
+
+    manifest_path = args.manifest.resolve()
+    manifest = load_manifest(manifest_path)
+    jobs = resolve_jobs(manifest, manifest_path.parent)
+    if args.job:
+        unknown = set(args.job) - {job["name"] for job in jobs}
+        if unknown:
+            parser.error(f"unknown job(s): {', '.join(sorted(unknown))}")
+        jobs = [job for job in jobs if job["name"] in args.job]
+
+    workers = args.workers or manifest.get("workers") or os.cpu_count() or 1
+    if workers < 1:
+        parser.error("--workers must be a positive number")
+    print(f"Running {len(jobs)} job(s) with {min(workers, len(jobs))} worker(s)")
+
+    results = run_jobs(jobs, min(workers, len(jobs)))
+    print_summary(results)
+    sys.exit(0 if all(result["status"] == "ok" for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,51 @@
+from __future__ import annotations
+
 import argparse
+import collections
+import concurrent.futures
+import contextlib
+import copy
+import csv
 import datetime
 import fnmatch
+import functools
 import glob
+import hashlib
+import importlib.util
+import itertools
 import json
 import os
-import sqlite3
+import re
+import runpy
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
 import warnings
 from enum import Enum, auto
-from typing import List, NamedTuple
+from typing import TYPE_CHECKING, Callable, Iterator, List, NamedTuple
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-import pandas as pd
-import tzlocal  # type: ignore
+# Only imported for the type annotations, the modules are imported when they are used
+if TYPE_CHECKING:
+    import sqlite3
+
+
+# Module which is imported when one of its attributes is used for the first time.
+# pandas and numpy take most of the startup time of the data preparation scripts, importing them on first use
+# keeps showing the help or reporting an argument error fast.
+class LazyModule(types.ModuleType):
+    def __getattr__(self, name: str):
+        module = importlib.import_module(self.__name__)
+        # Later lookups find the attributes of the module directly
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+
+np = LazyModule("numpy")
+pd = LazyModule("pandas")
 
 
 # DataFilter named tuple definition
@@ -112,6 +145,58 @@ inputFileJsonPath: List[str] = []
 inputFileExcelSheetName: str | int = 0
 # When processing SQLite .db files, specify the table name to load
 inputFileDbTableName: str = ""
+# Inputfile(s): Only read the columns which are needed: the date/time columns, the value and filter columns of the
+#               output files and the extra columns below. Exports with many unused columns are read faster and use
+#               less memory. Set to False to read all the columns.
+inputFileReadRequiredColumnsOnly: bool = True
+# Inputfile(s): Extra columns which are needed by the custom hooks (names, wildcards or column indexes).
+#               Leave None in case the hooks need all the columns, the columns are then only limited when the
+#               hooks are not replaced by the provider script.
+inputFileExtraColumnNames: List[str | int] | None = None
+# Inputfile(s): Only read the rows of the SQLite database table which can be used by the output files. The simple
+#               filters of the output files (e.g. a device id) and in incremental mode the dates of the previous run
+#               are evaluated by the SQL query, the filters are still applied to the data that is read.
+#               The rows are only limited when the hooks are not replaced by the provider script.
+inputFileDbReadRequiredRowsOnly: bool = True
+# Inputfile(s): Number of rows per chunk when streaming the input file(s).
+#               Leave at 0 to load all the data in memory before it is processed.
+#               When set, the data is read, prepared and written in chunks so that the memory usage depends on the
+#               chunk size instead of the size of the input file(s). The prepared chunks are kept in temporary files
+#               until all the data has been read, so the input file(s) do not have to be chronologically ordered.
+#               Streaming requires that the custom hooks only manipulate individual rows (see below).
+inputFileChunkSize: int = 0
+# Inputfile(s): Whether the custom hooks of the provider script only manipulate individual rows (e.g. convert the
+#               values of a column), the data can then be streamed in chunks. Hooks which combine rows (e.g. the
+#               difference between readings) need all the data, --chunk-size is then refused.
+customPrepareDataRowWise: bool = False
+# Inputfile(s): Reader engine used to parse csv files: "c" (default), "pyarrow" (requires pyarrow) or "python".
+#               The python engine is automatically used as a fallback when the file cannot be parsed by a faster engine.
+inputFileCsvReaderEngine: str = "c"
+# Inputfile(s): Reader engine used to parse excel files: "calamine" (default, requires python-calamine) or "default"
+#               (openpyxl for xlsx, xlrd for xls). The default engine is used when python-calamine is not installed.
+inputFileExcelReaderEngine: str = "calamine"
+# Inputfile(s): Number of processes used to load multiple input files in parallel.
+#               Leave at 1 to load the files one after another, 0 uses the number of processors.
+inputFileNumReadJobs: int = 1
+# Inputfile(s): Cache the data read from the input file(s) so that the files do not have to be parsed again
+#               when the script is run again (requires pyarrow). Cache entries are stored per file content and
+#               reader settings, the oldest entries are removed when the cache exceeds the maximum size (bytes).
+#               Leave the directory empty to use the default user cache directory. The cache is only used when
+#               enabled (--cache), each input file is then also read to determine its cache key.
+inputFileUseCache: bool = False
+inputFileCacheDirectory: str = ""
+inputFileCacheMaxSize: int = 1024**3
+# Inputfile(s): Remove the duplicate rows, for instance when exports of overlapping periods are combined.
+#               Rows with the same timestamp and the same values in the filter columns of the output files (e.g. the
+#               register) are duplicates. The policy determines which row is kept: "first" (first input file),
+#               "last" (last input file) or "newest" (most recently modified input file, the files are read in order
+#               of modification). Leave empty to keep all the rows. When streaming, the duplicates are removed from
+#               the ordered chunks (see readOrderedData), the duplicate rows are always in the same chunk.
+inputFileDuplicatePolicy: str = ""
+
+# Maximum number of sorted runs (e.g. input files) which are merged when sorting the data, data with more runs
+# is not sorted per input file and is sorted as a whole.
+sortDataMaxRuns: int = 1024
 
 # Name used for the temporary date/time field.
 # This needs normally no change only when it conflicts with existing columns.
@@ -120,6 +205,43 @@ dateTimeColumnName: str = "_DateTime"
 # List of one or more output file definitions
 outputFiles: List[OutputFileDefinition] = []
 
+# Outputfile(s): Number of threads used to write the output files while the next output file is prepared.
+#                Leave at 1 to write the output files one after another.
+outputFileNumWriteThreads: int = 4
+
+# Outputfile(s): Import the output data directly into the IMPORT_DATA table of a database instead of writing the files.
+#                The settings are the database options of ImportData.py: db_type (sqlite, mariadb or postgresql),
+#                sqlite_db, host, user, password, database and port (e.g. {"db_type": "sqlite", "sqlite_db": "x.db"}).
+#                Leave empty to write the output files. The id and resolution are derived from the output file name.
+#                The table is dropped and recreated unless outputDatabaseRecreateTable is False (or incremental mode).
+outputDatabaseSettings: dict = {}
+outputDatabaseRecreateTable: bool = True
+
+# Incremental mode: only the data after the data of the previous run is processed and written to the output files.
+# The state of each output file (e.g. last timestamp and cumulative value) is kept in the state file
+# (current directory) so that the next run continues where the previous run ended.
+incrementalMode: bool = False
+incrementalStateFileName: str = "DataPrepareState.json"
+
+# Profiling: measure the time, number of rows and peak memory of each processing stage and print a report.
+# The memory is measured with tracemalloc (Python, numpy and pandas allocations), which slows down processing.
+# Leave the file name empty to only print the report, otherwise the report is also written as json.
+profileMode: bool = False
+profileFileName: str = ""
+
+# Data quality: check the data of each output file for gaps, duplicate timestamps, counter resets (new meter),
+# negative usage and spikes after the data has been prepared and write a report (json or csv, based on the extension).
+# Leave the file name empty to skip the check. The action when problems are found is "report" (only report them),
+# "fail" (stop before the output files are generated, when streaming after all the data has been processed) or
+# "repair" (remove the rows with a duplicate timestamp, negative usage or a spike, gaps and new meters are kept).
+# The cutoffs have the same meaning as cutoff_new_meter and cutoff_invalid_value of the import SQL scripts (in the
+# unit of the prepared data). An interval longer than the gap factor times the interval of the data is a gap.
+dataQualityReportFileName: str = ""
+dataQualityAction: str = "report"
+dataQualityCutoffNewMeter: float = 25.0
+dataQualityCutoffInvalidValue: float = 1000.0
+dataQualityGapFactor: float = 2.0
+
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Hooks
@@ -144,6 +266,11 @@ def customPrepareDataPost(dataFrame: pd.DataFrame) -> pd.DataFrame:
     return dataFrame
 
 
+# Engine implementations of the hooks (provider scripts can replace the hooks)
+engineCustomPrepareDataPre = customPrepareDataPre
+engineCustomPrepareDataPost = customPrepareDataPost
+
+
 # ---------------------------------------------------------------------------------------------------------------------
 # Core functions
 # ---------------------------------------------------------------------------------------------------------------------
@@ -157,6 +284,8 @@ def getTimeZoneInfo() -> ZoneInfo:
     if inputFileTimeZoneName:
         timeZoneName = inputFileTimeZoneName
     else:
+        import tzlocal  # type: ignore
+
         try:
             timeZoneName = tzlocal.get_localzone_name()
         except Exception:
@@ -190,10 +319,341 @@ def getTimeZoneInfo() -> ZoneInfo:
     return timeZoneInfo
 
 
+# Transition tables of the timezones used for localization (per timezone and span of years)
+timeZoneTransitions: dict = {}
+
+
+# Get the transition table of the timezone for the given span of years
+# Returns the UTC timestamps (seconds) of the transitions and the UTC offsets (seconds) before the first
+# transition and after each transition. The transitions are located on an hourly grid and refined to the second.
+def getTimeZoneTransitions(
+    timeZoneInfo: ZoneInfo, minYear: int, maxYear: int
+) -> tuple[np.ndarray, np.ndarray]:
+    key = (str(timeZoneInfo), minYear, maxYear)
+    if key not in timeZoneTransitions:
+        # Include the days around the span as the local dates can differ from the UTC dates
+        grid = pd.date_range(
+            pd.Timestamp(minYear, 1, 1) - pd.Timedelta(days=2),
+            pd.Timestamp(maxYear + 1, 1, 1) + pd.Timedelta(days=2),
+            freq="h",
+            tz="UTC",
+        )
+        gridSeconds = grid.asi8 // 10**9
+        offsets = (
+            grid.tz_convert(timeZoneInfo).tz_localize(None).asi8 // 10**9
+        ) - gridSeconds
+        changes = np.flatnonzero(offsets[1:] != offsets[:-1]) + 1
+
+        transitions = []
+        for index in changes:
+            before, after = gridSeconds[index - 1], gridSeconds[index]
+            while after - before > 1:
+                middle = (before + after) // 2
+                middleOffset = datetime.datetime.fromtimestamp(
+                    middle, timeZoneInfo
+                ).utcoffset()
+                if middleOffset.total_seconds() == offsets[index]:
+                    after = middle
+                else:
+                    before = middle
+            transitions.append(after)
+
+        timeZoneTransitions[key] = (
+            np.array(transitions, dtype=np.int64),
+            np.concatenate([offsets[:1], offsets[changes]]).astype(np.int64),
+        )
+
+    return timeZoneTransitions[key]
+
+
+# Localize the local date/times of the input data and convert them to UTC (without timezone)
+# Each local date/time is converted with the UTC offset of the interval between the transitions it belongs to.
+# - Repeated (ambiguous) local date/times: the first half of the occurrences of the same date/time (in the order of
+#   the input data) use the offset before the transition (DST), the other occurrences the offset after it.
+#   A single occurrence uses DST.
+# - Non-existent local date/times are shifted forward to the transition.
+def localizeDateTimes(dateTimeSeries: pd.Series) -> pd.Series:
+    timeZoneInfo = getTimeZoneInfo()
+
+    localTimes = dateTimeSeries.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    valid = localTimes != np.iinfo(np.int64).min
+    if not valid.any():
+        return dateTimeSeries
+
+    minYear = pd.Timestamp(localTimes[valid].min()).year
+    maxYear = pd.Timestamp(localTimes[valid].max()).year
+    transitions, offsets = getTimeZoneTransitions(timeZoneInfo, minYear, maxYear)
+    transitions = transitions * 10**9
+    offsets = offsets * 10**9
+
+    # Local date/time range of each interval (the ranges of the intervals around a DST end overlap)
+    lowest = np.iinfo(np.int64).min
+    highest = np.iinfo(np.int64).max
+    localStarts = np.concatenate([[lowest], transitions + offsets[1:]])
+    localEnds = np.concatenate([transitions + offsets[:-1], [highest]])
+
+    # Latest interval which starts at or before the local date/time
+    interval = np.searchsorted(localStarts, localTimes, side="right") - 1
+    utcTimes = localTimes - offsets[interval]
+
+    # Non-existent: the local date/time is after the end of the interval (in the gap of a DST start)
+    nonExistent = valid & (localTimes >= localEnds[interval])
+    utcTimes[nonExistent] = transitions[interval[nonExistent]]
+
+    # Ambiguous: the local date/time is also before the end of the previous interval (in the overlap of a DST end)
+    previous = np.maximum(interval - 1, 0)
+    ambiguous = valid & (interval > 0) & (localTimes < localEnds[previous])
+    if ambiguous.any():
+        repeated = pd.Series(localTimes[ambiguous])
+        occurrence = repeated.groupby(repeated).cumcount().to_numpy()
+        occurrences = repeated.groupby(repeated).transform("size").to_numpy()
+        useFirstOffset = occurrence < (occurrences + 1) // 2
+        utcTimes[np.flatnonzero(ambiguous)[useFirstOffset]] = (
+            localTimes[ambiguous][useFirstOffset]
+            - offsets[previous[ambiguous][useFirstOffset]]
+        )
+
+    utcTimes[~valid] = lowest
+    return pd.Series(
+        utcTimes.view("datetime64[ns]"),
+        index=dateTimeSeries.index,
+        name=dateTimeSeries.name,
+    )
+
+
+# Parse the date and time of separate date and time columns
+# The columns typically contain many repeated values (e.g. the date of every interval of the day), so the
+# distinct dates and distinct times are parsed separately and combined instead of parsing every date/time text.
+# Returns None when the values cannot be parsed this way, the combined date/time text is parsed instead.
+def parseSplitDateTime(
+    dateColumn: pd.Series, timeColumn: pd.Series
+) -> pd.Series | None:
+    if "%z" in inputFileDateTimeColumnFormat or "%Z" in inputFileDateTimeColumnFormat:
+        return None
+
+    dateCodes, dates = factorizeAsText(dateColumn)
+    timeCodes, times = factorizeAsText(timeColumn)
+
+    # Split the format in the date and time part based on the number of spaces in the date values
+    dateSpaces = set(dates.str.count(" "))
+    formatParts = inputFileDateTimeColumnFormat.split(" ")
+    if len(dateSpaces) != 1:
+        return None
+    numDateParts = dateSpaces.pop() + 1
+    if len(formatParts) <= numDateParts:
+        return None
+
+    try:
+        parsedDates = pd.to_datetime(
+            dates, format=" ".join(formatParts[:numDateParts])
+        ).to_numpy(dtype="datetime64[ns]")
+        parsedTimes = pd.to_datetime(
+            times, format=" ".join(formatParts[numDateParts:])
+        ).to_numpy(dtype="datetime64[ns]")
+    except (ValueError, TypeError):
+        return None
+
+    # Only accept dates without a time and times without a date (the format has been split correctly)
+    timeOffsets = parsedTimes - np.datetime64("1900-01-01", "ns")
+    if (
+        pd.isna(parsedDates).any()
+        or pd.isna(parsedTimes).any()
+        or (parsedDates != parsedDates.astype("datetime64[D]")).any()
+        or (timeOffsets < np.timedelta64(0, "ns")).any()
+        or (timeOffsets >= np.timedelta64(1, "D")).any()
+    ):
+        return None
+
+    dateTimes = parsedDates[dateCodes] + timeOffsets[timeCodes]
+    return pd.Series(dateTimes, index=dateColumn.index).dt.tz_localize("UTC")
+
+
+# StageProfile definition (statistics of a processing stage, collected when profiling)
+#   name:       The name of the stage
+#   calls:      Number of times the stage has been run (e.g. once per file, chunk or output file)
+#   rowsIn:     Total number of rows passed to the stage (None when not known)
+#   rowsOut:    Total number of rows produced by the stage (None when not known)
+#   seconds:    Total time spent in the stage
+#   peakMemory: Highest increase of the traced memory during a run of the stage (bytes)
+class StageProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls: int = 0
+        self.rowsIn: int | None = None
+        self.rowsOut: int | None = None
+        self.seconds: float = 0.0
+        self.peakMemory: int = 0
+
+    # Number of rows processed per second (based on the rows passed to the stage if known)
+    def rowsPerSecond(self) -> float | None:
+        rows = self.rowsIn if self.rowsIn is not None else self.rowsOut
+        if rows is None or self.seconds <= 0:
+            return None
+        return rows / self.seconds
+
+
+# StageMeasurement (a single run of a stage, the caller sets the number of rows produced)
+# The caller can discard the run in case no work has been done (e.g. the end of a file read in chunks).
+class StageMeasurement:
+    def __init__(self):
+        self.rowsOut: int | None = None
+        self.discard: bool = False
+        self.nestedPeak: int = 0
+
+
+# Statistics of the stages in order of their first run and the stages which are currently running
+profileStages: dict = {}
+profileStack: List[StageMeasurement] = []
+
+
+# Add the number of rows to the total (None when the number of rows is not known)
+def addRows(total: int | None, rows: int | None) -> int | None:
+    if rows is None:
+        return total
+    return rows if total is None else total + rows
+
+
+# Measure a run of a processing stage (no measurement when not profiling)
+# Stages can be nested, the peak memory of a stage includes the peak memory of its nested stages.
+@contextlib.contextmanager
+def profileStage(name: str, rowsIn: int | None = None) -> Iterator[StageMeasurement]:
+    measurement = StageMeasurement()
+    if not profileMode:
+        yield measurement
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    # Keep the peak of the running stage, the peak is reset to measure this stage
+    startMemory, peakMemory = tracemalloc.get_traced_memory()
+    if profileStack:
+        profileStack[-1].nestedPeak = max(profileStack[-1].nestedPeak, peakMemory)
+    tracemalloc.reset_peak()
+    profileStack.append(measurement)
+    startTime = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        seconds = time.perf_counter() - startTime
+        _, peakMemory = tracemalloc.get_traced_memory()
+        peakMemory = max(peakMemory, measurement.nestedPeak)
+        profileStack.pop()
+        if profileStack:
+            profileStack[-1].nestedPeak = max(profileStack[-1].nestedPeak, peakMemory)
+        if not measurement.discard:
+            stage = profileStages.setdefault(name, StageProfile(name))
+            stage.calls += 1
+            stage.rowsIn = addRows(stage.rowsIn, rowsIn)
+            stage.rowsOut = addRows(stage.rowsOut, measurement.rowsOut)
+            stage.seconds += seconds
+            stage.peakMemory = max(stage.peakMemory, peakMemory - startMemory)
+
+
+# Print the profile report of the stages and write it as json in case a file name is provided
+def reportProfile():
+    if not profileMode:
+        return
+
+    def formatNumber(value, numberFormat: str = ",.0f") -> str:
+        return f"{'-' if value is None else f'{value:{numberFormat}}':>12}"
+
+    print("\nProfile (peak memory is the highest increase of the traced memory):")
+    print(
+        f"{'Stage':<30} {'Calls':>6} {'Rows in':>12} {'Rows out':>12} {'Time (s)':>10} "
+        f"{'Rows/s':>12} {'Peak (MB)':>10}"
+    )
+    for stage in profileStages.values():
+        print(
+            f"{stage.name:<30} {stage.calls:>6} {formatNumber(stage.rowsIn)} "
+            f"{formatNumber(stage.rowsOut)} {stage.seconds:>10.3f} "
+            f"{formatNumber(stage.rowsPerSecond())} {stage.peakMemory / 1024**2:>10.1f}"
+        )
+
+    if profileFileName:
+        report = {
+            "energyProviderName": energyProviderName,
+            "versionNumber": versionNumber,
+            "stages": [
+                {
+                    "name": stage.name,
+                    "calls": stage.calls,
+                    "rowsIn": stage.rowsIn,
+                    "rowsOut": stage.rowsOut,
+                    "seconds": stage.seconds,
+                    "rowsPerSecond": stage.rowsPerSecond(),
+                    "peakMemoryBytes": stage.peakMemory,
+                }
+                for stage in profileStages.values()
+            ],
+        }
+        with open(profileFileName, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Profile written to: {profileFileName}")
+
+
+# Read the inputfile (measured as the readInputFile stage when profiling)
+def readInputFileProfiled(inputFileName: str) -> pd.DataFrame:
+    with profileStage("readInputFile") as stage:
+        df = readInputFile(inputFileName)
+        stage.rowsOut = len(df)
+    return df
+
+
+# Prepare the input data (measured as the prepareData stage when profiling)
+def prepareDataProfiled(
+    dataFrame: pd.DataFrame, dateTimesPrepared: bool = False
+) -> pd.DataFrame:
+    with profileStage("prepareData", len(dataFrame)) as stage:
+        df = prepareData(dataFrame, dateTimesPrepared)
+        stage.rowsOut = len(df)
+    return df
+
+
 # Prepare the input data
-def prepareData(dataFrame: pd.DataFrame) -> pd.DataFrame:
+# In case the date/times are prepared already (see prepareDateTimes), only the remaining steps are done.
+def prepareData(
+    dataFrame: pd.DataFrame, dateTimesPrepared: bool = False
+) -> pd.DataFrame:
     print("Preparing data")
 
+    if not dateTimesPrepared:
+        dataFrame = prepareDateTimes(dataFrame)
+
+    # Select only correct dates
+    df = dataFrame.loc[
+        (dataFrame[dateTimeColumnName] >= datetime.datetime(1970, 1, 1))
+        & (dataFrame[dateTimeColumnName] <= datetime.datetime(2099, 12, 31))
+    ]
+
+    # Incremental mode: skip the data which has been processed by the previous run
+    if incrementalWatermark is not None:
+        df = df.loc[
+            df[dateTimeColumnName] > pd.Timestamp(incrementalWatermark, unit="s")
+        ]
+
+    # Make sure that the data is correctly sorted
+    df = sortData(df)
+
+    # Transform the date into unix timestamp for Home-Assistant
+    # (assign a new frame, df may be a selection of the input data)
+    df = df.assign(
+        **{
+            dateTimeColumnName: df[dateTimeColumnName]
+            .astype("datetime64[ns]")
+            .astype("int64")
+            // 10**9
+        }
+    )
+
+    # Handle any custom dataframe manipulation (Post)
+    df = customPrepareDataPost(df)
+
+    return df
+
+
+# Prepare the date/times of the input data, the date/time column contains the (naive) UTC date/times
+def prepareDateTimes(dataFrame: pd.DataFrame) -> pd.DataFrame:
     # Handle any custom dataframe manipulation (Pre)
     dataFrame = customPrepareDataPre(dataFrame)
 
@@ -203,13 +663,17 @@ def prepareData(dataFrame: pd.DataFrame) -> pd.DataFrame:
         # For excel change the type of the cell to text or adjust the format accordingly,
         # use statement print(dataFrame) to get information about the used format.
         # Initially the date/time format is forced to UTC, this is changed later if needed.
-        dateTimeSeries = pd.to_datetime(
-            dataFrame[inputFileDateColumnName].astype(str)
-            + " "
-            + dataFrame[inputFileTimeColumnName].astype(str),
-            format=inputFileDateTimeColumnFormat,
-            utc=True,
+        dateTimeSeries = parseSplitDateTime(
+            dataFrame[inputFileDateColumnName], dataFrame[inputFileTimeColumnName]
         )
+        if dateTimeSeries is None:
+            dateTimeSeries = pd.to_datetime(
+                dataFrame[inputFileDateColumnName].astype(str)
+                + " "
+                + dataFrame[inputFileTimeColumnName].astype(str),
+                format=inputFileDateTimeColumnFormat,
+                utc=True,
+            )
     else:
         dateTimeSeries = pd.to_datetime(
             dataFrame[inputFileDateColumnName],
@@ -222,55 +686,242 @@ def prepareData(dataFrame: pd.DataFrame) -> pd.DataFrame:
         # Remove the UTC timezone
         dateTimeSeries = dateTimeSeries.dt.tz_localize(None)
 
-        # Localize the dateTimeSeries to the specified timezone
-        # In case of DST and double dates, use the first occurrence
-        dateTimeSeries = dateTimeSeries.dt.tz_localize(
-            getTimeZoneInfo(),
-            ambiguous=True,
-            nonexistent="shift_forward",
-        )
-        dateTimeSeries = dateTimeSeries.dt.tz_convert("UTC")
+        # Localize the dateTimeSeries to the specified timezone and convert it to UTC
+        # In case of DST and double dates, the first occurrence uses DST and the second occurrence standard time
+        dateTimeSeries = localizeDateTimes(dateTimeSeries)
 
     # Remove the timezone
     dataFrame[dateTimeColumnName] = dateTimeSeries.dt.tz_localize(None)
 
-    # Select only correct dates
-    df = dataFrame.loc[
-        (dataFrame[dateTimeColumnName] >= datetime.datetime(1970, 1, 1))
-        & (dataFrame[dateTimeColumnName] <= datetime.datetime(2099, 12, 31))
-    ]
+    return dataFrame
 
-    # Make sure that the data is correctly sorted
-    df.sort_values(by=dateTimeColumnName, ascending=True, inplace=True)
 
-    # Transform the date into unix timestamp for Home-Assistant
-    df[dateTimeColumnName] = (df[dateTimeColumnName].astype("datetime64[ns]")).astype(
-        "int64"
-    ) // 10**9
+# Sort the data on the date/time, rows with the same date/time stay in the order of the input files
+# The input files are typically sorted already, the data then consists of a few sorted runs (one per input file).
+# The data is only reordered in case it is not sorted: runs which do not overlap are put in order of their first
+# date/time, otherwise the runs are merged pairwise (see mergeSortedRuns).
+def sortData(dataFrame: pd.DataFrame) -> pd.DataFrame:
+    dateTimes = dataFrame[dateTimeColumnName].to_numpy()
+    runStarts = np.flatnonzero(dateTimes[1:] < dateTimes[:-1]) + 1
+    if len(runStarts) == 0:
+        return dataFrame
+
+    if len(runStarts) < sortDataMaxRuns:
+        runStarts = np.concatenate(([0], runStarts))
+        runEnds = np.concatenate((runStarts[1:], [len(dateTimes)]))
+        runs = [np.arange(start, end) for start, end in zip(runStarts, runEnds)]
+
+        runOrder = np.argsort(dateTimes[runStarts], kind="stable")
+        if (
+            dateTimes[runEnds[runOrder[:-1]] - 1] < dateTimes[runStarts[runOrder[1:]]]
+        ).all():
+            return dataFrame.take(np.concatenate([runs[run] for run in runOrder]))
+
+        # Merge neighbouring runs until one run is left, rows with the same date/time keep their order
+        while len(runs) > 1:
+            merged = [
+                mergeSortedRuns(dateTimes, runs[i], runs[i + 1])
+                for i in range(0, len(runs) - 1, 2)
+            ]
+            runs = merged + runs[2 * len(merged) :]
+        return dataFrame.take(runs[0])
+
+    return dataFrame.take(np.argsort(dateTimes, kind="stable"))
+
+
+# Merge two sorted runs (row positions) into one run sorted on the date/time
+# Each row is placed after the rows of the other run with an earlier date/time, on equal date/times the rows of
+# the first run come first.
+def mergeSortedRuns(
+    dateTimes: np.ndarray, firstRun: np.ndarray, secondRun: np.ndarray
+) -> np.ndarray:
+    first = dateTimes[firstRun]
+    second = dateTimes[secondRun]
+    firstPositions = np.searchsorted(second, first, side="left") + np.arange(len(first))
+    secondPositions = np.searchsorted(first, second, side="right") + np.arange(
+        len(second)
+    )
 
-    # Handle any custom dataframe manipulation (Post)
-    df = customPrepareDataPost(df)
+    merged = np.empty(len(first) + len(second), dtype=firstRun.dtype)
+    merged[firstPositions] = firstRun
+    merged[secondPositions] = secondRun
+    return merged
 
+
+# Remove the duplicate rows of the prepared data (measured as the deduplicateData stage when profiling)
+def deduplicateDataProfiled(dataFrame: pd.DataFrame) -> pd.DataFrame:
+    with profileStage("deduplicateData", len(dataFrame)) as stage:
+        df = deduplicateData(dataFrame)
+        stage.rowsOut = len(df)
     return df
 
 
+# Remove the rows with the same timestamp and filter column values as another row (see inputFileDuplicatePolicy)
+def deduplicateData(dataFrame: pd.DataFrame) -> pd.DataFrame:
+    # The columns of the filters of the output files identify the rows with the same timestamp (e.g. the register),
+    # filters on a value column only select values
+    valueColumns = {outputFile.valueColumnName for outputFile in outputFiles}
+    keyColumns = dict.fromkeys(
+        dataFilter.column
+        for outputFile in outputFiles
+        for dataFilter in outputFile.dataFilters
+        if dataFilter.column in dataFrame.columns
+        and dataFilter.column not in valueColumns
+    )
+
+    duplicates = findDuplicateRows(
+        dataFrame[dateTimeColumnName].to_numpy(dtype="int64"),
+        [factorizeAsText(dataFrame[column])[0] for column in keyColumns],
+        "first" if inputFileDuplicatePolicy == "first" else "last",
+    )
+    numDuplicates = int(np.count_nonzero(duplicates))
+    if numDuplicates == 0:
+        return dataFrame
+    print(f"Removed {numDuplicates} duplicate rows")
+    return dataFrame[~duplicates]
+
+
+# Determine the rows which are a duplicate of another row, keep: "first" or "last" row of the duplicates
+#   timestamps: The sorted timestamps
+#   keyCodes:   Per key column the codes of the values (e.g. of factorizeAsText)
+# The timestamp (rank) and the codes of the key columns are combined in one int64 key. Duplicates are equal
+# adjacent keys, which only requires a stable sort in case the keys of rows with the same timestamp are not in order.
+# The stable sort (timsort) of the nearly sorted keys is close to linear, the timestamps are never hashed.
+def findDuplicateRows(
+    timestamps: np.ndarray, keyCodes: List[np.ndarray], keep: str
+) -> np.ndarray:
+    equalTimestamps = timestamps[1:] == timestamps[:-1]
+    if not equalTimestamps.any():
+        return np.zeros(len(timestamps), dtype=bool)
+
+    # Combine the codes of the key columns, the combined codes are compressed in case they become too large
+    codes = np.zeros(len(timestamps), dtype=np.int64)
+    numCodes = 1
+    for columnCodes in keyCodes:
+        columnNumCodes = int(columnCodes.max()) + 1 if len(columnCodes) else 1
+        if numCodes * columnNumCodes >= 2**31:
+            uniqueCodes, codes = np.unique(codes, return_inverse=True)
+            numCodes = len(uniqueCodes)
+        codes = codes * columnNumCodes + columnCodes
+        numCodes *= columnNumCodes
+
+    # The timestamps relative to the first timestamp are used as rank unless the keys could overflow
+    timestampRange = int(timestamps[-1]) - int(timestamps[0])
+    if timestampRange < 2**62 // numCodes:
+        ranks = timestamps.astype(np.int64) - timestamps[0]
+    else:
+        ranks = np.concatenate(([0], np.cumsum(~equalTimestamps)))
+    keys = ranks * numCodes + codes if keyCodes else ranks
+    order = None
+    if (keys[1:] < keys[:-1]).any():
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+
+    # The first row of equal keys is kept (a row equal to the previous row is a duplicate) or the last row
+    equalKeys = keys[1:] == keys[:-1]
+    if keep == "first":
+        duplicates = np.concatenate(([False], equalKeys))
+    else:
+        duplicates = np.concatenate((equalKeys, [False]))
+    if order is not None:
+        duplicates[order] = duplicates.copy()
+    return duplicates
+
+
 # Filter the data based on the provided dataFilter(s)
 def filterData(dataFrame: pd.DataFrame, filters: List[DataFilter]) -> pd.DataFrame:
-    df = dataFrame
-    # Iterate all the provided filters
+    # Determine the subset based on the provided filters (regular expressions)
+    plan = OutputFilePlan(dataFrame)
+    mask = pd.Series(True, index=dataFrame.index)
     for dataFilter in filters:
-        # Determine the subset based on the provided filter (regular expression)
-        series = (
-            df[dataFilter.column].astype(str).str.contains(dataFilter.value, regex=True)
+        mask &= plan.filterMask(dataFilter)
+
+    return dataFrame[mask]
+
+
+# Count the positive intervals between consecutive timestamps
+#   intervalCounts: interval -> number of occurrences, in order of the first occurrence of the interval
+def countIntervals(timestamps: np.ndarray, intervalCounts: dict):
+    intervals = np.diff(timestamps)
+    if len(intervals) == 0:
+        return
+
+    # Most data has a fixed interval, only irregular data needs the (sorting) unique
+    if intervals[0] > 0 and (intervals == intervals[0]).all():
+        uniqueIntervals, counts = intervals[:1], [len(intervals)]
+    else:
+        intervals = intervals[intervals > 0]
+        if len(intervals) == 0:
+            return
+        uniqueIntervals, firstIndexes, counts = np.unique(
+            intervals, return_index=True, return_counts=True
         )
+        order = np.argsort(firstIndexes, kind="stable")
+        uniqueIntervals, counts = uniqueIntervals[order], counts[order]
 
-        # Validate whether the data is included or excluded
-        if not dataFilter.equal:
-            series = ~series
+    for interval, count in zip(uniqueIntervals.tolist(), list(counts)):
+        intervalCounts[interval] = intervalCounts.get(interval, 0) + int(count)
 
-        df = df[series]
 
-    return df
+# Determine the interval of the data: the interval which occurs most (the first one in case of a tie)
+# A gap or a duplicate in the data does not influence the interval. Falls back to the interval between the first
+# two timestamps in case there are no positive intervals.
+def getDominantInterval(intervalCounts: dict, firstTimestamps: list):
+    if intervalCounts:
+        return max(intervalCounts, key=intervalCounts.get)
+    return firstTimestamps[1] - firstTimestamps[0]
+
+
+# Recalculate usage values so that the value increases (kernel on the value array)
+# Returns the n + 1 recalculated values: the first value is previousOutputValue, value i is the rounded cumulative
+# sum of the first i values (continuing from previousSum) plus the initial value. The last value belongs to the
+# extra row after the data. The cumulative sum itself (without the initial value) is returned as well.
+def recalculateUsageValues(
+    values: np.ndarray,
+    initialValue: float,
+    previousSum: float = 0.0,
+    previousOutputValue: float | None = None,
+) -> tuple[np.ndarray, float]:
+    result = np.empty(len(values) + 1, dtype="float64")
+    result[0] = previousSum
+    result[1:] = values
+    np.cumsum(result, out=result)
+    cumulativeSum = result[-1]
+
+    result += float(initialValue)
+    np.round(result, 3, out=result)
+    result[0] = initialValue if previousOutputValue is None else previousOutputValue
+    return result, cumulativeSum
+
+
+# Recalculate values which are at the end of the interval (kernel on the value array)
+# Returns the n + 1 values shifted down by one row: the first value is previousValue (NaN at the start of the data)
+# and the last value belongs to the extra row after the data.
+def recalculateEndOfIntervalValues(
+    values: np.ndarray, previousValue: float | None = None
+) -> np.ndarray:
+    result = np.empty(len(values) + 1, dtype="float64")
+    result[0] = np.nan if previousValue is None else previousValue
+    result[1:] = values
+    return result
+
+
+# Create the data frame of the recalculated values, the extra row after the data is placed one interval after
+# the last timestamp. Only the date/time and value column are created.
+def createRecalculatedData(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    dataColumnName: str | int,
+    interval=None,
+) -> pd.DataFrame:
+    if interval is not None:
+        extendedTimestamps = np.empty(len(timestamps) + 1, dtype=timestamps.dtype)
+        extendedTimestamps[:-1] = timestamps
+        extendedTimestamps[-1] = timestamps[-1] + interval
+        timestamps = extendedTimestamps
+    return pd.DataFrame(
+        {dateTimeColumnName: timestamps, dataColumnName: values}, copy=False
+    )
 
 
 # Recalculate the data so that the value increases
@@ -278,71 +929,549 @@ def filterData(dataFrame: pd.DataFrame, filters: List[DataFilter]) -> pd.DataFra
 def recalculateUsageData(
     dataFrame: pd.DataFrame, dataColumnName: str | int, initialValue: float
 ) -> pd.DataFrame:
-    # Work on a copy to ensure we're not modifying a slice of the original DataFrame
-    df = dataFrame.copy()
+    # Dataframe must have at least two rows to determine the interval
+    if len(dataFrame) < 2:
+        return dataFrame
+
+    timestamps = dataFrame[dateTimeColumnName].to_numpy()
+    values, _ = recalculateUsageValues(
+        dataFrame[dataColumnName].to_numpy(dtype="float64"), initialValue
+    )
+
+    # The extra row holds the final cumulative value (including the initial value)
+    intervalCounts: dict = {}
+    countIntervals(timestamps, intervalCounts)
+    interval = getDominantInterval(intervalCounts, timestamps[:2].tolist())
+    return createRecalculatedData(timestamps, values, dataColumnName, interval)
 
+
+# Recalculate the data is at the end of the interval
+def recalculateEndOfIntervalData(
+    dataFrame: pd.DataFrame, dataColumnName: str | int
+) -> pd.DataFrame:
     # Dataframe must have at least two rows to determine the interval
-    if len(df) < 2:
-        return df
+    if len(dataFrame) < 2:
+        return dataFrame
 
-    # 1) Compute cumulative sum, then add the baseline (initial value)
-    cumulative_values = df[dataColumnName].cumsum().add(float(initialValue)).round(3)
+    timestamps = dataFrame[dateTimeColumnName].to_numpy()
+    values = recalculateEndOfIntervalValues(
+        dataFrame[dataColumnName].to_numpy(dtype="float64")
+    )
 
-    # 2) Shift down so that the first recorded value is exactly initialValue
-    df[dataColumnName] = cumulative_values.shift(1, fill_value=initialValue)
+    # The first row is dropped (misaligned due to the shift), the extra row holds the last value
+    intervalCounts: dict = {}
+    countIntervals(timestamps[1:], intervalCounts)
+    interval = getDominantInterval(intervalCounts, timestamps[:2].tolist())
+    return createRecalculatedData(timestamps[1:], values[1:], dataColumnName, interval)
 
-    # Calculate the interval between timestamps (first two rows)
-    interval = df[dateTimeColumnName].iloc[1] - df[dateTimeColumnName].iloc[0]
 
-    # Create an extra row:
-    # - dateTimeColumnName: last timestamp + interval
-    # - value: final cumulative sum value from the original cumulative calculation (including baseline)
-    extra_row = {
-        dateTimeColumnName: df[dateTimeColumnName].iloc[-1] + interval,
-        dataColumnName: cumulative_values.iloc[-1],
-    }
+# Resolve the name of the column holding the value (index or name, wildcards are allowed)
+# The reason why the column cannot be resolved is printed unless quiet.
+def resolveDataColumnName(
+    dataFrame: pd.DataFrame,
+    outputFile: str,
+    dataColumnName: str | int,
+    quiet: bool = False,
+) -> str | int | None:
+    if isinstance(dataColumnName, int):
+        # Verify if the index is valid (only the needed columns of the input file may have been read)
+        if dataColumnName in dataFrame.columns:
+            return dataColumnName
+        problem = f"column index {dataColumnName} is out of range"
+    else:
+        # Find the dataColumnName (resolve wildcards if needed)
+        matches = [
+            col for col in dataFrame.columns if fnmatch.fnmatch(col, dataColumnName)
+        ]
+        if len(matches) == 1:
+            return matches[0]
+        problem = (
+            f"no columns match: {dataColumnName}"
+            if not matches
+            else f"multiple columns match '{dataColumnName}': {matches}"
+        )
 
-    # Append the extra row to the DataFrame
-    df = pd.concat([df, pd.DataFrame([extra_row])], ignore_index=True)
+    if not quiet:
+        print(f"Could not create file: {outputFile} because {problem}")
+    return None
 
-    return df
 
+# Encode a column as codes referring to its unique values as text (the same text as astype(str))
+# Many columns contain only a limited number of distinct values, these can be processed once per value.
+def factorizeAsText(column: pd.Series) -> tuple:
+    # Values of mixed types can be equal while their text differs (e.g. 1 and 1.0), convert these first
+    if column.dtype == object and pd.api.types.infer_dtype(column) not in (
+        "string",
+        "empty",
+    ):
+        column = column.astype(str)
+    codes, uniqueValues = pd.factorize(column, use_na_sentinel=False)
+    return codes, pd.Series(uniqueValues, dtype=object).astype(str)
+
+
+# OutputFilePlan (shared evaluation of the value columns and filters of the output files)
+#   The output files typically use the same value columns and (partly) the same filters on the same data.
+#   Each numeric conversion of a value column and each filter is evaluated only once on the data,
+#   the output files only select their rows and columns instead of working on a full copy of the data.
+class OutputFilePlan:
+    def __init__(self, dataFrame: pd.DataFrame):
+        self.dataFrame = dataFrame
+        self.values: dict = {}
+        self.validMasks: dict = {}
+        self.filterColumns: dict = {}
+        self.filterMasks: dict = {}
+        # Per output file the mask of the selected rows which are kept after the data quality repair
+        self.repairMasks: dict = {}
+
+    # Make sure that the value column is numeric and determine the rows with valid values
+    def numericValues(self, dataColumnName: str | int) -> pd.Series:
+        if dataColumnName not in self.values:
+            values = pd.to_numeric(self.dataFrame[dataColumnName], errors="coerce")
+
+            if inputFileDataRemoveInvalidValues:
+                # Remove the rows with invalid values (NaN)
+                validMask = values.notna()
+            else:
+                # Replace invalid values with 0
+                values = values.fillna(0)
+                validMask = pd.Series(True, index=values.index)
+
+            if inputFileDataRemoveZeroValues:
+                # Remove rows where the value is exactly 0
+                validMask &= values != 0
+
+            self.values[dataColumnName] = values
+            self.validMasks[dataColumnName] = validMask
+        return self.values[dataColumnName]
+
+    # Encode a filter column as codes referring to its unique values (as text)
+    # Filter columns typically contain only a handful of distinct values (e.g. registers or meter types).
+    def filterColumn(self, key, column: pd.Series) -> tuple:
+        if key not in self.filterColumns:
+            self.filterColumns[key] = factorizeAsText(column)
+        return self.filterColumns[key]
+
+    # Determine the rows which match the filter
+    # The regular expression is evaluated once per unique value of the column.
+    # A filter on the value column itself is evaluated on the numeric values.
+    def filterMask(
+        self, dataFilter: DataFilter, dataColumnName: str | int | None = None
+    ) -> pd.Series:
+        onValues = dataFilter.column == dataColumnName
+        key = (dataFilter, dataColumnName if onValues else None)
+        if key not in self.filterMasks:
+            codes, uniqueValues = (
+                self.filterColumn((dataColumnName,), self.numericValues(dataColumnName))
+                if onValues
+                else self.filterColumn(
+                    dataFilter.column, self.dataFrame[dataFilter.column]
+                )
+            )
+            matches = uniqueValues.str.contains(dataFilter.value, regex=True)
 
-# Recalculate the data is at the end of the interval
-def recalculateEndOfIntervalData(
+            # Validate whether the data is included or excluded
+            if not dataFilter.equal:
+                matches = ~matches
+            self.filterMasks[key] = pd.Series(
+                matches.to_numpy(dtype=bool)[codes], index=self.dataFrame.index
+            )
+        return self.filterMasks[key]
+
+    # Select the date/time and (numeric) value column of the valid rows which match all the filters
+    def selectData(
+        self, dataColumnName: str | int, filters: List[DataFilter]
+    ) -> pd.DataFrame:
+        values = self.numericValues(dataColumnName)
+        mask = self.validMasks[dataColumnName]
+        for dataFilter in filters:
+            mask = mask & self.filterMask(dataFilter, dataColumnName)
+
+        return pd.DataFrame(
+            {
+                dateTimeColumnName: self.dataFrame[dateTimeColumnName][mask],
+                dataColumnName: values[mask],
+            }
+        )
+
+
+# Select the first reading of each hour
+# The timestamps are floored to the start of their hour, for instance all readings with a timestamp in
+# [16:00, 17:00) become 16:00. As the data is sorted on the timestamps, the first reading of each hour
+# is the first row of each run of equal hours.
+def selectHourlyData(
     dataFrame: pd.DataFrame, dataColumnName: str | int
 ) -> pd.DataFrame:
-    # Work on a copy to ensure we're not modifying a slice of the original DataFrame
-    df = dataFrame.copy()
+    hours = dataFrame[dateTimeColumnName].to_numpy() // 3600 * 3600
+    values = dataFrame[dataColumnName].to_numpy()
+
+    # Fall back to grouping in case the data is not sorted or contains invalid values (skipped by first())
+    if (hours[1:] < hours[:-1]).any() or pd.isna(values).any():
+        df = dataFrame.assign(**{dateTimeColumnName: hours})
+        return df.groupby(dateTimeColumnName, as_index=False)[dataColumnName].first()
+
+    firstOfHour = np.empty(len(hours), dtype=bool)
+    firstOfHour[:1] = True
+    np.not_equal(hours[1:], hours[:-1], out=firstOfHour[1:])
+    return pd.DataFrame(
+        {
+            dateTimeColumnName: hours[firstOfHour],
+            dataColumnName: values[firstOfHour],
+        }
+    )
 
-    # Dataframe must have at least two rows to determine the interval
-    if len(df) < 2:
-        return df
 
-    # Shift the value column down by one row
-    df[dataColumnName] = df[dataColumnName].shift(1)
+# Number of rows which are formatted and written at once by the output file writer
+outputFileWriteBlockSize = 1_000_000
+
+
+# Format the rows of the timestamp and value columns as csv lines
+# The numbers are formatted as text by the C implementation of str/repr of the Python numbers, which gives the same
+# text as pandas (the shortest text which reads back as the same value, invalid values are left empty).
+def formatImportDataLines(timestamps: np.ndarray, values: np.ndarray) -> str:
+    timestampTexts = map(str, timestamps.tolist())
+    if values.dtype.kind == "f":
+        valueTexts = list(map(repr, values.tolist()))
+        for index in np.flatnonzero(np.isnan(values)).tolist():
+            valueTexts[index] = ""
+    else:
+        valueTexts = list(map(str, values.tolist()))
+
+    if not valueTexts:
+        return ""
+    return os.linesep.join(map(",".join, zip(timestampTexts, valueTexts))) + os.linesep
+
+
+# OutputDatabase definition (connection to the database the output data is imported into)
+#   connection:  The database connection
+#   cursor:      The cursor used to import the data
+#   insertQuery: The query which inserts a row into the IMPORT_DATA table (or updates the value of an existing row)
+#   outputFileIds: The id and resolution of the output files imported so far
+# ImportData.py is only imported when the data is imported into a database, the engine and the provider script
+# can be used without it.
+class OutputDatabase:
+    def __init__(self, settings: dict, recreateTable: bool):
+        import ImportData
+
+        dbType = settings.get("db_type")
+        if not isinstance(dbType, ImportData.DatabaseType):
+            dbType = ImportData.parse_db_type(str(dbType))
+        connectionArgs = argparse.Namespace(
+            **{
+                "sqlite_db": None,
+                "host": "localhost",
+                "user": None,
+                "password": None,
+                "database": None,
+                "port": 5432,
+                **settings,
+            }
+        )
+        self.connection, placeholder = ImportData.get_connection(dbType, connectionArgs)
+        self.cursor = self.connection.cursor()
+        ImportData.create_table(self.cursor, dbType, recreate=recreateTable)
+        self.connection.commit()
+        self.insertQuery = ImportData.get_upsert_query(placeholder, dbType)
+        self.outputFileIds: dict = {}
+
+    # Import the (timestamp, value) data of the output file, the rows are the rows ImportData.py imports from the file
+    # (rows without a valid number are skipped). Returns the number of imported rows.
+    def importData(self, dataFrame: pd.DataFrame, outputFile: str) -> int:
+        import ImportData
+
+        if outputFile not in self.outputFileIds:
+            self.outputFileIds[outputFile] = ImportData.compute_id_and_resolution(
+                outputFile
+            )
+        idValue, resolution = self.outputFileIds[outputFile]
+
+        timestamps = pd.to_numeric(dataFrame.iloc[:, 0], errors="coerce")
+        values = pd.to_numeric(dataFrame.iloc[:, 1], errors="coerce")
+        valid = timestamps.notna() & values.notna()
+        rows = list(
+            zip(
+                itertools.repeat(idValue),
+                itertools.repeat(resolution),
+                timestamps[valid].astype("float64").tolist(),
+                values[valid].astype("float64").tolist(),
+            )
+        )
+        if rows:
+            self.cursor.executemany(self.insertQuery, rows)
+        self.connection.commit()
+        return len(rows)
+
+    def close(self):
+        self.cursor.close()
+        self.connection.close()
 
-    # Drop the first row (misaligned due to the shift)
-    df = df.iloc[1:].reset_index(drop=True)
 
-    # Calculate the interval between timestamps (first two rows)
-    interval = df[dateTimeColumnName].iloc[1] - df[dateTimeColumnName].iloc[0]
+# The database the output data is imported into (None: the output files are written)
+outputDatabase: OutputDatabase | None = None
 
-    # Create an extra row:
-    # - dateTimeColumnName: last timestamp + interval
-    # - value: last value of the original data frame
-    extra_row = {
-        dateTimeColumnName: df[dateTimeColumnName].iloc[-1] + interval,
-        dataColumnName: dataFrame[dataColumnName].iloc[-1],
-    }
 
-    # Append the extra row to the DataFrame
-    df = pd.concat([df, pd.DataFrame([extra_row])], ignore_index=True)
+# Connect to the output database in case database settings are provided (the connection is closed afterwards)
+@contextlib.contextmanager
+def openOutputDatabase() -> Iterator[OutputDatabase | None]:
+    global outputDatabase
+    if not outputDatabaseSettings:
+        yield None
+        return
 
-    return df
+    # In incremental mode the data of the previous runs is kept
+    try:
+        database = OutputDatabase(
+            outputDatabaseSettings, outputDatabaseRecreateTable and not incrementalMode
+        )
+    except Exception as e:
+        print(f"Could not connect to the output database: {e}")
+        sys.exit(1)
+
+    outputDatabase = database
+    try:
+        yield database
+    finally:
+        outputDatabase = None
+        database.close()
+
+
+# Write the (timestamp, value) data to the output file
+# The output is identical to DataFrame.to_csv, the data is formatted and written in blocks of rows.
+# Data with other columns or types (e.g. text values) is written by pandas.
+# When importing into a database the data is imported instead of written (appended data is added to the table).
+def writeImportData(dataFrame: pd.DataFrame, outputFile: str, append: bool = False):
+    if outputDatabase is not None:
+        outputDatabase.importData(dataFrame, outputFile)
+        return
+
+    dtypes = dataFrame.dtypes
+    if (
+        len(dtypes) != 2
+        or dtypes.iloc[0].kind not in "iu"
+        or not (dtypes.iloc[1].kind in "iu" or dtypes.iloc[1] == np.float64)
+    ):
+        dataFrame.to_csv(
+            outputFile,
+            mode="a" if append else "w",
+            sep=",",
+            decimal=".",
+            header=False,
+            index=False,
+            encoding="utf-8",
+        )
+        return
+
+    timestamps = dataFrame.iloc[:, 0].to_numpy()
+    values = dataFrame.iloc[:, 1].to_numpy()
+    with open(outputFile, "a" if append else "w", encoding="utf-8", newline="") as f:
+        for start in range(0, len(dataFrame), outputFileWriteBlockSize):
+            end = start + outputFileWriteBlockSize
+            f.write(formatImportDataLines(timestamps[start:end], values[start:end]))
+
+
+# DataQualityCheck (data quality of the data of an output file, the check continues over the chunks when streaming)
+#   outputFile:      The name of the output file (including the prefix)
+#   intervalMode:    The interval mode of the output file (USAGE values are checked per row, the readings of the
+#                    other modes are checked on the difference with the previous reading)
+#   rows:            Number of rows checked so far
+#   firstTimestamp:  First timestamp checked
+#   lastTimestamp:   Last timestamp checked (compared with the first row of the next chunk)
+#   lastValue:       Last value checked (compared with the first row of the next chunk)
+#   lastSpike:       Whether the last value checked is a spike
+#   intervalCounts:  The number of occurrences of each interval (see countIntervals)
+#   largestGap:      Largest interval between two rows and the timestamp at the start of it
+#   problems:        Per problem the number of rows and the timestamp of the first row with the problem
+#   repairedRows:    Number of rows removed by the repair
+class DataQualityCheck:
+    problemNames = ["duplicateTimestamps", "counterResets", "negativeUsage", "spikes"]
+
+    def __init__(self, outputFile: str, intervalMode: IntervalMode):
+        self.outputFile = outputFile
+        self.intervalMode = intervalMode
+        self.rows: int = 0
+        self.firstTimestamp: int | None = None
+        self.lastTimestamp: int | None = None
+        self.lastValue: float | None = None
+        self.lastSpike: bool = False
+        self.intervalCounts: dict = {}
+        self.largestGap: int = 0
+        self.largestGapStart: int | None = None
+        self.problems: dict = {name: [0, None] for name in self.problemNames}
+        self.repairedRows: int = 0
+
+    # Check the rows (sorted on the timestamp) in one vectorized pass and return the mask of the rows which are
+    # removed by the repair (duplicate timestamp, negative usage or spike compared with the previous row)
+    def check(self, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        numRows = len(timestamps)
+        if numRows == 0:
+            return np.zeros(0, dtype=bool)
+        if self.firstTimestamp is None:
+            self.firstTimestamp = int(timestamps[0])
+
+        # Continue from the last row of the previous chunk
+        if self.lastTimestamp is not None:
+            timestamps = np.concatenate(([self.lastTimestamp], timestamps))
+            values = np.concatenate(([self.lastValue], values))
+        rowTimestamps = timestamps[-numRows:]
+
+        # The intervals and value changes belong to the row at the end of the interval (the last rows)
+        def rowMask(mask: np.ndarray) -> np.ndarray:
+            return mask if len(mask) == numRows else np.concatenate(([False], mask))
+
+        intervals = np.diff(timestamps)
+        countIntervals(timestamps, self.intervalCounts)
+        if len(intervals) > 0:
+            largest = int(np.argmax(intervals))
+            if intervals[largest] > self.largestGap:
+                self.largestGap = int(intervals[largest])
+                self.largestGapStart = int(timestamps[largest])
+
+        duplicates = rowMask(intervals == 0)
+        if self.intervalMode == IntervalMode.USAGE:
+            rowValues = values[-numRows:]
+            counterResets = np.zeros(numRows, dtype=bool)
+            negativeUsage = rowValues < 0
+            spikes = rowValues > dataQualityCutoffInvalidValue
+        else:
+            # The decrease directly after a spike is the return to the normal readings
+            changes = np.diff(values)
+            spikeChanges = changes > dataQualityCutoffInvalidValue
+            afterSpike = np.concatenate(
+                ([self.lastSpike and len(changes) == numRows], spikeChanges[:-1])
+            )[: len(changes)]
+            decreases = (changes < 0) & ~afterSpike
+            counterResets = rowMask(
+                decreases & (values[1:] < dataQualityCutoffNewMeter)
+            )
+            negativeUsage = rowMask(decreases) & ~counterResets
+            spikes = rowMask(spikeChanges)
+
+        for name, mask in zip(
+            self.problemNames, [duplicates, counterResets, negativeUsage, spikes]
+        ):
+            problem = self.problems[name]
+            count = int(np.count_nonzero(mask))
+            if count and problem[1] is None:
+                problem[1] = int(rowTimestamps[np.argmax(mask)])
+            problem[0] += count
+
+        self.rows += numRows
+        self.lastTimestamp = timestamps[-1]
+        self.lastValue = values[-1]
+        self.lastSpike = bool(spikes[-1])
+        return duplicates | negativeUsage | spikes
+
+    # Summary of the data quality of the output file (the timestamps are unix timestamps like the output files)
+    def report(self) -> dict:
+        interval = getDominantInterval(self.intervalCounts, [0, 0])
+        gapIntervals = [
+            count
+            for gap, count in self.intervalCounts.items()
+            if gap > dataQualityGapFactor * interval
+        ]
+        report = {
+            "outputFile": self.outputFile,
+            "rows": self.rows,
+            "firstTimestamp": self.firstTimestamp,
+            "lastTimestamp": self.lastTimestamp,
+            "interval": interval,
+            "gaps": sum(gapIntervals),
+            "largestGap": self.largestGap if gapIntervals else 0,
+            "largestGapStart": self.largestGapStart if gapIntervals else None,
+        }
+        for name, (count, firstTimestamp) in self.problems.items():
+            report[name] = count
+            report[f"{name}First"] = firstTimestamp
+        report["repairedRows"] = self.repairedRows
+        return {
+            name: value.item() if isinstance(value, np.generic) else value
+            for name, value in report.items()
+        }
+
+    # Whether any problem has been found
+    def hasProblems(self) -> bool:
+        report = self.report()
+        return bool(report["gaps"]) or any(report[name] for name in self.problemNames)
+
+
+# Check the data of the output files which are generated (before the output files are generated)
+# When repairing, the rows to remove are kept in the plan and removed when the output file is generated.
+def checkDataQuality(
+    plan: OutputFilePlan, outputFileName: str | None = None, prefix: str = ""
+):
+    checks = []
+    for outputFile in outputFiles:
+        if outputFileName is None or outputFile.outputFileName == outputFileName:
+            fileName = (
+                f"{prefix}_{outputFile.outputFileName}"
+                if prefix
+                else outputFile.outputFileName
+            )
+            dataColumnName = resolveDataColumnName(
+                plan.dataFrame, fileName, outputFile.valueColumnName, quiet=True
+            )
+            if dataColumnName is None:
+                continue
+
+            df = plan.selectData(dataColumnName, outputFile.dataFilters)
+            check = DataQualityCheck(fileName, outputFile.intervalMode)
+            repairMask = checkDataQualityRows(
+                check,
+                df[dateTimeColumnName].to_numpy(),
+                df[dataColumnName].to_numpy(dtype="float64"),
+                outputFile.forcePositive,
+            )
+            if repairMask is not None:
+                plan.repairMasks[fileName] = ~repairMask
+            checks.append(check)
+
+    reportDataQuality(checks)
+
+
+# Check the rows of the output file, returns the mask of the rows to remove in case the data is repaired
+def checkDataQualityRows(
+    check: DataQualityCheck,
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    forcePositive: bool,
+) -> np.ndarray | None:
+    # The values are checked like they are written
+    if forcePositive:
+        values = np.abs(values)
+    repairMask = check.check(timestamps, values)
+    if dataQualityAction != "repair" or not repairMask.any():
+        return None
+    check.repairedRows += int(np.count_nonzero(repairMask))
+    return repairMask
+
+
+# Print the problems and write the data quality report, stops in case of problems when the action is "fail"
+def reportDataQuality(checks: List[DataQualityCheck]):
+    reports = [check.report() for check in checks]
+    for report in reports:
+        problems = [
+            f"{report[name]} {name}"
+            for name in ["gaps"] + DataQualityCheck.problemNames
+            if report[name]
+        ]
+        if problems:
+            print(f"Data quality of {report['outputFile']}: {', '.join(problems)}")
+        if report["repairedRows"]:
+            print(f"Removed {report['repairedRows']} rows of {report['outputFile']}")
+
+    if dataQualityReportFileName.lower().endswith(".csv"):
+        pd.DataFrame(reports).to_csv(dataQualityReportFileName, index=False)
+    else:
+        with open(dataQualityReportFileName, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+    print(f"Data quality report written to: {dataQualityReportFileName}")
+
+    if dataQualityAction == "fail" and any(check.hasProblems() for check in checks):
+        print("Stopped because of the data quality problems (see the report)")
+        sys.exit(1)
 
 
 # Generate the datafile which can be imported
+# The output file is written by the writer in case it is provided, the returned future completes when written.
 def generateImportDataFile(
     dataFrame: pd.DataFrame,
     outputFile: str,
@@ -351,50 +1480,25 @@ def generateImportDataFile(
     intervalMode: IntervalMode,
     initialValue: float,
     forcePositive: bool,
-):
-    if isinstance(dataColumnName, int):
-        # Verify if the index is valid
-        if dataColumnName < 0 or dataColumnName >= len(dataFrame.columns):
-            print(
-                f"Could not create file: {outputFile} because column index {dataColumnName} is out of range"
-            )
-            return
-    else:
-        # Find the dataColumnName (resolve wildcards if needed)
-        matches = [
-            col for col in dataFrame.columns if fnmatch.fnmatch(col, dataColumnName)
-        ]
-        if not matches:
-            print(
-                f"Could not create file: {outputFile} because no columns match: {dataColumnName}"
-            )
-            return
-        if len(matches) > 1:
-            print(
-                f"Could not create file: {outputFile} because multiple columns match '{dataColumnName}': {matches}"
-            )
-            return
-        dataColumnName = matches[0]
-
-    # Make sure that the dataColumnName column is numeric
-    dataFrame[dataColumnName] = pd.to_numeric(
-        dataFrame[dataColumnName], errors="coerce"
+    plan: OutputFilePlan | None = None,
+    writer: concurrent.futures.Executor | None = None,
+) -> concurrent.futures.Future | None:
+    resolvedDataColumnName = resolveDataColumnName(
+        dataFrame, outputFile, dataColumnName
     )
-
-    if inputFileDataRemoveInvalidValues:
-        # Remove the rows with invalid values (NaN)
-        dataFrame = dataFrame[dataFrame[dataColumnName].notna()]
-    else:
-        # Replace invalid values with 0
-        dataFrame[dataColumnName] = dataFrame[dataColumnName].fillna(0)
-
-    if inputFileDataRemoveZeroValues:
-        # Remove rows where the value is exactly 0
-        dataFrame = dataFrame[dataFrame[dataColumnName] != 0]
+    if resolvedDataColumnName is None:
+        return None
+    dataColumnName = resolvedDataColumnName
 
     # Column exists, continue
     print("Creating file: " + outputFile)
-    dataFrameFiltered = filterData(dataFrame, filters).copy()
+    if plan is None:
+        plan = OutputFilePlan(dataFrame)
+    with profileStage("filterData", len(dataFrame)) as stage:
+        dataFrameFiltered = plan.selectData(dataColumnName, filters)
+        if outputFile in plan.repairMasks:
+            dataFrameFiltered = dataFrameFiltered[plan.repairMasks[outputFile]]
+        stage.rowsOut = len(dataFrameFiltered)
 
     # Make sure that the values are positive in case this is required (e.g. for energy production)
     if forcePositive:
@@ -402,38 +1506,35 @@ def generateImportDataFile(
 
     # Check if we have to recalculate the data
     if intervalMode == intervalMode.USAGE:
-        dataFrameFiltered = recalculateUsageData(
-            dataFrameFiltered, dataColumnName, initialValue
-        )
+        with profileStage("recalculateUsageData", len(dataFrameFiltered)) as stage:
+            dataFrameFiltered = recalculateUsageData(
+                dataFrameFiltered, dataColumnName, initialValue
+            )
+            stage.rowsOut = len(dataFrameFiltered)
     if intervalMode == intervalMode.READING_END_INTERVAL:
-        dataFrameFiltered = recalculateEndOfIntervalData(
-            dataFrameFiltered, dataColumnName
-        )
+        with profileStage(
+            "recalculateEndOfIntervalData", len(dataFrameFiltered)
+        ) as stage:
+            dataFrameFiltered = recalculateEndOfIntervalData(
+                dataFrameFiltered, dataColumnName
+            )
+            stage.rowsOut = len(dataFrameFiltered)
 
     # Select only the needed data
     dataFrameFiltered = dataFrameFiltered.filter([dateTimeColumnName, dataColumnName])
 
     if inputFileDateTimeOnlyUseHourly:
-        # Floor each timestamp to the start of its hour.
-        # For instance, all readings with a timestamp in [16:00, 17:00) become 16:00.
-        dataFrameFiltered[dateTimeColumnName] = dataFrameFiltered[
-            dateTimeColumnName
-        ].apply(lambda x: (x // 3600) * 3600)
-
-        # Group by the floored hourly timestamp and select the first reading in each group.
-        dataFrameFiltered = dataFrameFiltered.groupby(
-            dateTimeColumnName, as_index=False
-        )[dataColumnName].first()
+        with profileStage("selectHourlyData", len(dataFrameFiltered)) as stage:
+            dataFrameFiltered = selectHourlyData(dataFrameFiltered, dataColumnName)
+            stage.rowsOut = len(dataFrameFiltered)
 
     # Create the output file
-    dataFrameFiltered.to_csv(
-        outputFile,
-        sep=",",
-        decimal=".",
-        header=False,
-        index=False,
-        encoding="utf-8",
-    )
+    if writer is not None:
+        return writer.submit(writeImportData, dataFrameFiltered, outputFile)
+    with profileStage("writeImportData", len(dataFrameFiltered)) as stage:
+        writeImportData(dataFrameFiltered, outputFile)
+        stage.rowsOut = len(dataFrameFiltered)
+    return None
 
 
 # Generate the datafiles from the provided dataframe
@@ -441,128 +1542,1726 @@ def generateImportDataFilesFromDataFrame(
     dataFrame: pd.DataFrame,
     outputFileName: str | None = None,
     prefix: str = "",
+    dateTimesPrepared: bool = False,
 ):
     # Prepare the data
-    dataFrame = prepareData(dataFrame)
+    dataFrame = prepareDataProfiled(dataFrame, dateTimesPrepared)
+    if inputFileDuplicatePolicy:
+        dataFrame = deduplicateDataProfiled(dataFrame)
+
+    # Create the output files (the value columns and filters they share are evaluated only once)
+    # The output files are written by the writer threads while the next output file is prepared.
+    # When profiling, the output files are written one after another so that each write can be measured.
+    # The database connection is not shared with threads, the data is imported one output file after another.
+    plan = OutputFilePlan(dataFrame)
+    if dataQualityReportFileName:
+        with profileStage("checkDataQuality", len(dataFrame)):
+            checkDataQuality(plan, outputFileName, prefix)
+    writes = []
+    with (
+        concurrent.futures.ThreadPoolExecutor(max_workers=outputFileNumWriteThreads)
+        if outputFileNumWriteThreads > 1 and not profileMode and outputDatabase is None
+        else contextlib.nullcontext()
+    ) as writer:
+        for outputFile in outputFiles:
+            if outputFileName is None or outputFile.outputFileName == outputFileName:
+                write = generateImportDataFile(
+                    dataFrame,
+                    (
+                        f"{prefix}_{outputFile.outputFileName}"
+                        if prefix
+                        else outputFile.outputFileName
+                    ),
+                    outputFile.valueColumnName,
+                    outputFile.dataFilters,
+                    outputFile.intervalMode,
+                    outputFile.initialValue,
+                    outputFile.forcePositive,
+                    plan,
+                    writer,
+                )
+                if write is not None:
+                    writes.append(write)
 
-    # Create the output files
-    for outputFile in outputFiles:
-        if outputFileName is None or outputFile.outputFileName == outputFileName:
-            generateImportDataFile(
-                dataFrame.copy(),
-                (
-                    f"{prefix}_{outputFile.outputFileName}"
-                    if prefix
-                    else outputFile.outputFileName
-                ),
-                outputFile.valueColumnName,
-                outputFile.dataFilters,
-                outputFile.intervalMode,
-                outputFile.initialValue,
-                outputFile.forcePositive,
-            )
+    # Raise any error of the writes
+    for write in writes:
+        write.result()
     print("Processing complete.")
 
 
-# Read the inputfile
-def readInputFile(inputFileName: str) -> pd.DataFrame:
-    # Read the specified file
-    print(f"Loading data: {inputFileName}")
+# OutputFileState definition (state of an output file that is carried across the chunks when streaming)
+#   outputFile:      The name of the output file (including the prefix)
+#   definition:      The output file definition
+#   dataColumnName:  The resolved name of the column holding the value
+#   rowCount:        Number of filtered rows processed so far
+#   firstTimestamps: The first (max 3) timestamps, used to determine the interval of the extra row when the
+#                    data has no positive intervals
+#   intervalCounts:  The number of occurrences of each interval between the rows written so far, the interval of
+#                    the extra row is the interval which occurs most (only used for USAGE and READING_END_INTERVAL)
+#   pendingData:     Filtered rows which are kept back until there is enough data to recalculate (min 2 rows)
+#   lastTimestamp:   Last timestamp of the filtered rows processed so far
+#   lastValue:       USAGE: Cumulative sum of the values processed so far (without the initial value)
+#                    READING_END_INTERVAL: Last value processed so far (None at the start)
+#   lastOutputValue: USAGE: Last cumulative value (rounded, including the initial value)
+#   lastHour:        Last hour that has been written (only used when only hourly data is used)
+#   fileCreated:     Whether the output file has been created
+#   lastEmittedTimestamp: Last timestamp that has been written to the output file
+#   watermark:       Incremental mode: last timestamp processed by the previous run (None: process all data)
+#   qualityCheck:    The data quality check of the output file (None: the data quality is not checked)
+#   emittedWatermark: Incremental mode: last timestamp written by the previous run
+class OutputFileState:
+    def __init__(
+        self,
+        outputFile: str,
+        definition: OutputFileDefinition,
+        dataColumnName: str | int,
+    ):
+        self.outputFile = outputFile
+        self.definition = definition
+        self.dataColumnName = dataColumnName
+        self.rowCount: int = 0
+        self.firstTimestamps: List[int] = []
+        self.intervalCounts: dict = {}
+        self.pendingData: pd.DataFrame | None = None
+        self.lastTimestamp: int | None = None
+        self.lastValue: float | None = (
+            0.0 if definition.intervalMode == IntervalMode.USAGE else None
+        )
+        self.lastOutputValue: float = definition.initialValue
+        self.lastHour: int | None = None
+        self.fileCreated: bool = False
+        self.lastEmittedTimestamp: int | None = None
+        self.watermark: int | None = None
+        self.emittedWatermark: int | None = None
+        self.qualityCheck: DataQualityCheck | None = (
+            DataQualityCheck(outputFile, definition.intervalMode)
+            if dataQualityReportFileName
+            else None
+        )
 
-    try:
-        # Check if we have a supported extension
-        if inputFileNameExtension == ".csv":
-            # Read the CSV file
-            df = pd.read_csv(
-                inputFileName,
-                sep=inputFileDataSeparator,
-                decimal=inputFileDataDecimal,
-                skiprows=inputFileNumHeaderRows,
-                skipfooter=inputFileNumFooterRows,
-                index_col=False,
-                na_values=["N/A", "NaN"],
-                header="infer" if inputFileHasHeaderNameRow else None,
-                engine="python",
-            )
-        elif (inputFileNameExtension == ".xlsx") or (inputFileNameExtension == ".xls"):
-            # Read the XLSX/XLS file
-            warnings.filterwarnings(
-                "ignore",
-                message="Workbook contains no default style, apply openpyxl's default",
+
+# Create the states of the output files which have to be generated when streaming
+def createOutputFileStates(
+    dataFrame: pd.DataFrame,
+    outputFileName: str | None = None,
+    prefix: str = "",
+) -> List[OutputFileState]:
+    states = []
+    for outputFile in outputFiles:
+        if outputFileName is None or outputFile.outputFileName == outputFileName:
+            fileName = (
+                f"{prefix}_{outputFile.outputFileName}"
+                if prefix
+                else outputFile.outputFileName
             )
-            df = pd.read_excel(
-                inputFileName,
-                sheet_name=inputFileExcelSheetName,
-                decimal=inputFileDataDecimal,
-                skiprows=inputFileNumHeaderRows,
-                skipfooter=inputFileNumFooterRows,
+            dataColumnName = resolveDataColumnName(
+                dataFrame, fileName, outputFile.valueColumnName
             )
-        elif inputFileNameExtension == ".json":
-            # Read the JSON file
-            with open(inputFileName, "r", encoding="utf-8") as f:
-                jsonData = json.load(f)
-            df = pd.json_normalize(jsonData, record_path=inputFileJsonPath)
-        elif inputFileNameExtension == ".db":
-            # Read the SQLite database file
-            conn = sqlite3.connect(inputFileName)
-            query = f"SELECT * FROM {inputFileDbTableName}"
-            df = pd.read_sql_query(query, conn)
-            conn.close()
-        else:
-            raise Exception(f"Unsupported extension: {inputFileNameExtension}")
+            if dataColumnName is None:
+                continue
 
-        return df
-    except Exception as e:
-        print(f"Error reading file {inputFileName}: {e}")
-        sys.exit(1)
+            print("Creating file: " + fileName)
+            states.append(OutputFileState(fileName, outputFile, dataColumnName))
+    return states
 
 
-# Check if all the provided files have the correct extension
-def correctFileExtensions(fileNames: list[str]) -> bool:
-    # Check all filenames for the right extension
-    for fileName in fileNames:
-        _, fileNameExtension = os.path.splitext(fileName)
-        if fileNameExtension != inputFileNameExtension:
+# Recalculate a chunk of usage data so that the value increases (continuing from the previous chunks)
+def recalculateUsageDataChunk(
+    dataFrame: pd.DataFrame, state: OutputFileState
+) -> pd.DataFrame:
+    values, state.lastValue = recalculateUsageValues(
+        dataFrame[state.dataColumnName].to_numpy(dtype="float64"),
+        state.definition.initialValue,
+        state.lastValue,
+        state.lastOutputValue,
+    )
+
+    # The last value is the first value of the next chunk (or the value of the extra row)
+    state.lastOutputValue = values[-1]
+
+    return createRecalculatedData(
+        dataFrame[dateTimeColumnName].to_numpy(), values[:-1], state.dataColumnName
+    )
+
+
+# Recalculate a chunk of data which is at the end of the interval (continuing from the previous chunks)
+def recalculateEndOfIntervalDataChunk(
+    dataFrame: pd.DataFrame, state: OutputFileState
+) -> pd.DataFrame:
+    timestamps = dataFrame[dateTimeColumnName].to_numpy()
+    values = recalculateEndOfIntervalValues(
+        dataFrame[state.dataColumnName].to_numpy(dtype="float64"), state.lastValue
+    )
+
+    # Drop the first row of the data (misaligned due to the shift)
+    first = 1 if state.lastValue is None else 0
+    state.lastValue = values[-1]
+
+    return createRecalculatedData(
+        timestamps[first:], values[first:-1], state.dataColumnName
+    )
+
+
+# Select the first reading of each hour (continuing from the previous chunks)
+def selectHourlyDataChunk(
+    dataFrame: pd.DataFrame, state: OutputFileState
+) -> pd.DataFrame:
+    with profileStage("selectHourlyData", len(dataFrame)) as stage:
+        df = selectHourlyData(dataFrame, state.dataColumnName)
+        stage.rowsOut = len(df)
+
+    # Skip the hour which has already been written by the previous chunk
+    if state.lastHour is not None:
+        df = df[df[dateTimeColumnName] > state.lastHour]
+
+    if not df.empty:
+        state.lastHour = df[dateTimeColumnName].iloc[-1]
+
+    return df
+
+
+# Write (append) the data to the output file
+def writeImportDataChunk(dataFrame: pd.DataFrame, state: OutputFileState):
+    # Select only the needed data
+    df = dataFrame.filter([dateTimeColumnName, state.dataColumnName])
+
+    if inputFileDateTimeOnlyUseHourly:
+        df = selectHourlyDataChunk(df, state)
+
+    # Incremental mode: skip the data which has already been written by the previous run
+    if state.emittedWatermark is not None:
+        df = df[df[dateTimeColumnName] > state.emittedWatermark]
+    if not df.empty:
+        state.lastEmittedTimestamp = df[dateTimeColumnName].iloc[-1]
+
+    with profileStage("writeImportData", len(df)) as stage:
+        writeImportData(df, state.outputFile, append=state.fileCreated)
+        stage.rowsOut = len(df)
+    state.fileCreated = True
+
+
+# Generate the part of the datafile for a chunk of the (prepared) data
+def generateImportDataChunk(plan: OutputFilePlan, state: OutputFileState):
+    definition = state.definition
+    dataColumnName = state.dataColumnName
+
+    with profileStage("filterData", len(plan.dataFrame)) as stage:
+        df = plan.selectData(dataColumnName, definition.dataFilters)
+        stage.rowsOut = len(df)
+
+    # Incremental mode: skip the data which has been processed by the previous run
+    if state.watermark is not None:
+        df = df[df[dateTimeColumnName] > state.watermark]
+
+    if df.empty:
+        return
+
+    # Make sure that the values are positive in case this is required (e.g. for energy production)
+    if definition.forcePositive:
+        df[dataColumnName] = df[dataColumnName].abs()
+
+    if state.qualityCheck is not None:
+        with profileStage("checkDataQuality", len(df)) as stage:
+            repairMask = checkDataQualityRows(
+                state.qualityCheck,
+                df[dateTimeColumnName].to_numpy(),
+                df[dataColumnName].to_numpy(),
+                False,
+            )
+            if repairMask is not None:
+                df = df[~repairMask]
+            stage.rowsOut = len(df)
+        if df.empty:
+            return
+
+    previousRowCount = state.rowCount
+    state.rowCount += len(df)
+    state.firstTimestamps.extend(
+        df[dateTimeColumnName].iloc[: 3 - len(state.firstTimestamps)].tolist()
+    )
+    if definition.intervalMode in (
+        IntervalMode.USAGE,
+        IntervalMode.READING_END_INTERVAL,
+    ):
+        # Count the intervals between the rows which are written (continuing from the previous chunk),
+        # for READING_END_INTERVAL the first row is dropped due to the shift
+        timestamps = df[dateTimeColumnName].to_numpy()
+        if previousRowCount > 0:
+            timestamps = np.concatenate(([state.lastTimestamp], timestamps))
+        if (
+            definition.intervalMode == IntervalMode.READING_END_INTERVAL
+            and previousRowCount <= 1
+        ):
+            timestamps = timestamps[1:]
+        countIntervals(timestamps, state.intervalCounts)
+    state.lastTimestamp = df[dateTimeColumnName].iloc[-1]
+
+    # The recalculation needs at least two rows, keep the data until there is enough data
+    if state.pendingData is not None:
+        df = pd.concat([state.pendingData, df], ignore_index=True)
+        state.pendingData = None
+    if state.rowCount < 2:
+        state.pendingData = df
+        return
+
+    # Check if we have to recalculate the data
+    if definition.intervalMode == IntervalMode.USAGE:
+        with profileStage("recalculateUsageData", len(df)) as stage:
+            df = recalculateUsageDataChunk(df, state)
+            stage.rowsOut = len(df)
+    if definition.intervalMode == IntervalMode.READING_END_INTERVAL:
+        with profileStage("recalculateEndOfIntervalData", len(df)) as stage:
+            df = recalculateEndOfIntervalDataChunk(df, state)
+            stage.rowsOut = len(df)
+
+    writeImportDataChunk(df, state)
+
+
+# Finalize the datafile after all the chunks have been processed
+def finalizeImportDataFile(state: OutputFileState):
+    definition = state.definition
+    df = pd.DataFrame(columns=[dateTimeColumnName, state.dataColumnName])
+
+    if state.pendingData is not None:
+        # Not enough data to recalculate, the data is written as is
+        df = state.pendingData
+    elif state.rowCount >= 2 and definition.intervalMode in (
+        IntervalMode.USAGE,
+        IntervalMode.READING_END_INTERVAL,
+    ):
+        # Determine the interval of the data written so far
+        interval = getDominantInterval(state.intervalCounts, state.firstTimestamps)
+
+        # Create an extra row:
+        # - dateTimeColumnName: last timestamp + interval
+        # - value: final cumulative value (USAGE) or last value (READING_END_INTERVAL)
+        df = pd.DataFrame(
+            [
+                {
+                    dateTimeColumnName: state.lastTimestamp + interval,
+                    state.dataColumnName: (
+                        state.lastOutputValue
+                        if definition.intervalMode == IntervalMode.USAGE
+                        else state.lastValue
+                    ),
+                }
+            ]
+        )
+
+    writeImportDataChunk(df, state)
+
+
+# Incremental mode: last timestamp processed by the previous run for all the output files
+# (set while processing, the data up to and including this timestamp is skipped when preparing the data)
+incrementalWatermark: int | None = None
+
+# Fields of the OutputFileState which are kept in the state file
+incrementalStateFields = [
+    "rowCount",
+    "firstTimestamps",
+    "intervalCounts",
+    "lastTimestamp",
+    "lastValue",
+    "lastOutputValue",
+    "lastHour",
+    "lastEmittedTimestamp",
+]
+
+
+# Identification of the output file definition and settings, the state can only be used for the same output
+# (and only when it holds the same fields)
+def getIncrementalStateKey(definition: OutputFileDefinition) -> str:
+    return repr(
+        [
+            definition,
+            inputFileDateTimeOnlyUseHourly,
+            inputFileDataRemoveInvalidValues,
+            inputFileDataRemoveZeroValues,
+            incrementalStateFields,
+        ]
+    )
+
+
+# Load the states of the output files of the previous run
+def loadIncrementalStates() -> dict:
+    if not os.path.exists(incrementalStateFileName):
+        return {}
+    try:
+        with open(incrementalStateFileName, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read the state file {incrementalStateFileName}: {e}")
+        sys.exit(1)
+
+
+# Determine the last timestamp processed by the previous run for all the output files which are generated
+# (None when the data of one of the output files has to be processed from the start)
+def getIncrementalWatermark(
+    savedStates: dict, outputFileName: str | None = None, prefix: str = ""
+) -> int | None:
+    watermarks = []
+    for outputFile in outputFiles:
+        if outputFileName is None or outputFile.outputFileName == outputFileName:
+            fileName = (
+                f"{prefix}_{outputFile.outputFileName}"
+                if prefix
+                else outputFile.outputFileName
+            )
+            savedState = savedStates.get(fileName)
+            if savedState is None or savedState["key"] != getIncrementalStateKey(
+                outputFile
+            ):
+                return None
+            watermarks.append(savedState["lastTimestamp"])
+    return min(watermarks, default=None)
+
+
+# Continue the output files from the states of the previous run
+def restoreIncrementalStates(states: List[OutputFileState], savedStates: dict):
+    for state in states:
+        savedState = savedStates.get(state.outputFile)
+        if savedState is None or savedState["key"] != getIncrementalStateKey(
+            state.definition
+        ):
+            print(f"No previous state for {state.outputFile}, all data is processed")
+            continue
+
+        for field in incrementalStateFields:
+            value = savedState[field]
+            # Dictionaries are saved as a list of (key, value) pairs (json only has text keys)
+            if isinstance(getattr(state, field), dict):
+                value = {key: count for key, count in value}
+            setattr(state, field, value)
+        state.watermark = state.lastTimestamp
+        state.emittedWatermark = state.lastEmittedTimestamp
+        print(
+            f"Continuing {state.outputFile} after {pd.Timestamp(state.watermark, unit='s')} (UTC)"
+        )
+
+
+# Save the states of the output files for the next run
+# Output files without enough data to determine the interval start from the beginning again.
+def saveIncrementalStates(states: List[OutputFileState], savedStates: dict):
+    for state in states:
+        if state.rowCount < 2 or state.pendingData is not None:
+            savedStates.pop(state.outputFile, None)
+            continue
+
+        savedState = {"key": getIncrementalStateKey(state.definition)}
+        for field in incrementalStateFields:
+            value = getattr(state, field)
+            savedState[field] = (
+                [int(item) for item in value]
+                if isinstance(value, list)
+                else (
+                    [[key, count] for key, count in value.items()]
+                    if isinstance(value, dict)
+                    else value.item() if isinstance(value, np.generic) else value
+                )
+            )
+        savedStates[state.outputFile] = savedState
+
+    with open(incrementalStateFileName, "w", encoding="utf-8") as f:
+        json.dump(savedStates, f, indent=2)
+
+
+# Order the input files, the rows with the same date/time are in the order of the input files
+# The last of the duplicate rows is the row of the most recently modified file (see inputFileDuplicatePolicy).
+def orderInputFiles(fileNames: List[str]) -> List[str]:
+    if inputFileDuplicatePolicy == "newest":
+        return sorted(fileNames, key=os.path.getmtime)
+    return fileNames
+
+
+# Read all the input files and concat the data
+# When removing duplicates the date/times of each file are prepared before the data is concatenated: the occurrences
+# of a repeated local date/time at the end of DST are only known per file, files which overlap repeat them as well.
+def readInputFiles(fileNames: List[str]) -> pd.DataFrame:
+    fileNames = orderInputFiles(fileNames)
+    if inputFileNumReadJobs != 1 and len(fileNames) > 1:
+        # The files are read by the worker processes, only the total time of the loading is measured
+        with profileStage("readInputFile") as stage:
+            dataFrames = readInputFilesParallel(fileNames)
+            stage.rowsOut = sum(len(df) for df in dataFrames)
+    else:
+        dataFrames = map(readInputFileProfiled, fileNames)
+    if inputFileDuplicatePolicy:
+        dataFrames = map(prepareDateTimes, dataFrames)
+    return pd.concat(dataFrames, ignore_index=True, sort=True)
+
+
+# Read the inputfile in chunks (each chunk is measured as a run of the readInputFile stage when profiling)
+def readInputFileChunksProfiled(inputFileName: str) -> Iterator[pd.DataFrame]:
+    chunks = readInputFileChunks(inputFileName)
+    while True:
+        with profileStage("readInputFile") as stage:
+            chunk = next(chunks, None)
+            if chunk is None:
+                stage.discard = True
+            else:
+                stage.rowsOut = len(chunk)
+        if chunk is None:
+            return
+        yield chunk
+
+
+# Determine whether the prepared data (sorted unix timestamps) ends in the repeated hour at the end of DST
+# Whether a repeated local date/time uses DST is only known when all its occurrences have been read.
+def endsInRepeatedHour(timestamps: np.ndarray) -> bool:
+    if inputFileDateTimeIsUTC or len(timestamps) == 0:
+        return False
+    lastTimestamp = int(timestamps[-1])
+    year = datetime.datetime.fromtimestamp(lastTimestamp, datetime.timezone.utc).year
+    transitions, offsets = getTimeZoneTransitions(getTimeZoneInfo(), year, year)
+
+    # The repeated local date/times are converted to the UTC range of the repeated hour before and after the transition
+    repeated = offsets[:-1] - offsets[1:]
+    return bool(
+        (
+            (repeated > 0)
+            & (transitions - repeated <= lastTimestamp)
+            & (lastTimestamp < transitions + repeated)
+        ).any()
+    )
+
+
+# Read and prepare the data of the input files as one or more chunks
+# When streaming local date/times, a chunk which ends in the repeated hour at the end of DST is prepared again
+# together with the next chunk of the input file, so that the occurrences of the repeated date/times are complete.
+def readPreparedData(fileNames: List[str]) -> Iterator[pd.DataFrame]:
+    if inputFileChunkSize <= 0:
+        # Read all the found files and concat the data
+        yield prepareDataProfiled(
+            readInputFiles(fileNames), dateTimesPrepared=bool(inputFileDuplicatePolicy)
+        )
+        return
+
+    # Process the files in the same order as when the data is loaded in memory (the order of rows with the same
+    # date/time is the same)
+    for fileName in orderInputFiles(fileNames):
+        pendingChunk = None
+        for chunk in readInputFileChunksProfiled(fileName):
+            if pendingChunk is not None:
+                chunk = pd.concat([pendingChunk, chunk], ignore_index=True)
+            # Keep the chunk as read in case it has to be prepared again (the hooks may change it)
+            pendingChunk = None if inputFileDateTimeIsUTC else chunk.copy()
+            dataFrame = prepareDataProfiled(chunk)
+            if pendingChunk is not None and endsInRepeatedHour(
+                dataFrame[dateTimeColumnName].to_numpy()
+            ):
+                continue
+            pendingChunk = None
+            yield dataFrame
+
+        if pendingChunk is not None:
+            yield prepareDataProfiled(pendingChunk)
+
+
+# Read the prepared data of the input files in chronological order as one or more chunks
+# When streaming, the prepared chunks are written to temporary files per period (bucket) of time. The width of the
+# buckets is based on the first chunk, so that a bucket holds about a chunk of data. After all the data has been read,
+# the buckets are read in chronological order and combined into chunks of at least inputFileChunkSize rows. Rows with
+# the same date/time are in the same bucket and stay in the order of the input files (like sortData), the columns get
+# the type of all the data (e.g. a column with integers in one chunk and missing values in the next one is float).
+def readOrderedData(fileNames: List[str]) -> Iterator[pd.DataFrame]:
+    if inputFileChunkSize <= 0:
+        yield from readPreparedData(fileNames)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="DataPrepare") as directory:
+        bucketWidth = 0
+        bucketFiles: dict = collections.defaultdict(list)
+        firstRows = []
+        emptyData = None
+        for dataFrame in readPreparedData(fileNames):
+            if dataFrame.empty:
+                emptyData = dataFrame
+                continue
+
+            with profileStage("orderData", len(dataFrame)):
+                timestamps = dataFrame[dateTimeColumnName].to_numpy()
+                if bucketWidth == 0:
+                    # Whole hours, so that the buckets of hourly data are not split
+                    bucketWidth = (int(np.ptp(timestamps)) // 3600 + 1) * 3600
+                firstRows.append(dataFrame.iloc[:1])
+
+                # Split the chunk into the parts of each bucket (in the order of the rows)
+                buckets = timestamps // bucketWidth
+                order = np.argsort(buckets, kind="stable")
+                buckets = buckets[order]
+                starts = np.flatnonzero(np.diff(buckets)) + 1
+                for start, end in zip(
+                    np.concatenate(([0], starts)),
+                    np.concatenate((starts, [len(order)])),
+                ):
+                    fileName = os.path.join(directory, f"{len(firstRows)}_{start}.pkl")
+                    dataFrame.take(order[start:end]).to_pickle(fileName)
+                    bucketFiles[buckets[start]].append(fileName)
+
+        if not bucketFiles:
+            if emptyData is not None:
+                yield emptyData
+            return
+
+        dtypes = pd.concat(firstRows, ignore_index=True, sort=True).dtypes
+        parts: List[pd.DataFrame] = []
+        for bucket in sorted(bucketFiles):
+            for fileName in bucketFiles.pop(bucket):
+                parts.append(pd.read_pickle(fileName))
+                os.remove(fileName)
+            if sum(map(len, parts)) < inputFileChunkSize and bucketFiles:
+                continue
+
+            with profileStage("orderData") as stage:
+                dataFrame = pd.concat(parts, ignore_index=True, sort=True)
+                parts = []
+                dataFrame = dataFrame.reindex(columns=dtypes.index)
+                dataFrame = dataFrame.astype(
+                    {
+                        column: dtype
+                        for column, dtype in dtypes.items()
+                        if dataFrame[column].dtype != dtype
+                    }
+                )
+                dataFrame = sortData(dataFrame)
+                stage.rowsOut = len(dataFrame)
+            yield dataFrame
+
+
+# Generate the datafiles which can be imported by streaming the input file(s) in chunks
+# In incremental mode the output files continue from the state of the previous run.
+def generateImportDataFilesStreaming(
+    fileNames: List[str],
+    outputFileName: str | None = None,
+    prefix: str = "",
+):
+    global incrementalWatermark
+
+    states: List[OutputFileState] | None = None
+    savedStates = loadIncrementalStates() if incrementalMode else {}
+    incrementalWatermark = getIncrementalWatermark(savedStates, outputFileName, prefix)
+
+    try:
+        for dataFrame in readOrderedData(fileNames):
+            if inputFileDuplicatePolicy:
+                dataFrame = deduplicateDataProfiled(dataFrame)
+
+            # Determine the output files based on the columns of the first chunk
+            if states is None:
+                states = createOutputFileStates(dataFrame, outputFileName, prefix)
+                if incrementalMode:
+                    restoreIncrementalStates(states, savedStates)
+
+            # Create the part of the output files
+            plan = OutputFilePlan(dataFrame)
+            for state in states:
+                generateImportDataChunk(plan, state)
+    finally:
+        incrementalWatermark = None
+
+    for state in states or []:
+        finalizeImportDataFile(state)
+    if dataQualityReportFileName:
+        reportDataQuality([state.qualityCheck for state in states or []])
+    if incrementalMode and states is not None:
+        saveIncrementalStates(states, savedStates)
+    print("Processing complete.")
+
+
+# Get the directory of the input file cache
+def getInputFileCacheDirectory() -> str:
+    if inputFileCacheDirectory:
+        return inputFileCacheDirectory
+    cacheHome = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cacheHome, "Home-Assistant-Import-Energy-Data")
+
+
+# Determine the cache key of the input file based on the file content and the settings of the reader
+def getInputFileCacheKey(inputFileName: str) -> str:
+    fileHash = hashlib.sha256()
+    with open(inputFileName, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            fileHash.update(block)
+
+    readerSettings = [
+        versionNumber,
+        pd.__version__,
+        inputFileNameExtension,
+        inputFileDataSeparator,
+        inputFileDataDecimal,
+        inputFileHasHeaderNameRow,
+        inputFileNumHeaderRows,
+        inputFileNumFooterRows,
+        inputFileExcelSheetName,
+        inputFileCsvReaderEngine,
+        inputFileExcelReaderEngine,
+        inputFileJsonPath,
+        inputFileDbTableName,
+        getRequiredInputColumns(),
+        getDbRowSelection() if inputFileNameExtension == ".db" else None,
+    ]
+    fileHash.update(json.dumps(readerSettings, default=str).encode("utf-8"))
+    return fileHash.hexdigest()
+
+
+# Read the data of the input file from the cache (None when the data is not cached)
+def readCachedInputFile(cacheKey: str) -> pd.DataFrame | None:
+    cacheFileName = os.path.join(getInputFileCacheDirectory(), f"{cacheKey}.parquet")
+    if not os.path.exists(cacheFileName):
+        return None
+
+    try:
+        df = pd.read_parquet(cacheFileName)
+    except Exception:
+        # Missing pyarrow or an invalid cache file, parse the input file instead
+        return None
+
+    # Mark the cache file as recently used
+    os.utime(cacheFileName)
+    return df
+
+
+# Check that the cached data is exactly the same as the data read from the input file
+# Columnar files store the values per type, text columns with other values (e.g. numbers or missing values)
+# could be returned differently.
+def isCachedDataIdentical(cachedData: pd.DataFrame, dataFrame: pd.DataFrame) -> bool:
+    try:
+        pd.testing.assert_frame_equal(cachedData, dataFrame, check_exact=True)
+    except AssertionError:
+        return False
+
+    for column in range(len(dataFrame.columns)):
+        values = dataFrame.iloc[:, column]
+        if values.dtype == object and not values.map(type).equals(
+            cachedData.iloc[:, column].map(type)
+        ):
+            return False
+    return True
+
+
+# Store the data of the input file in the cache, data which cannot be cached exactly is not stored
+def writeCachedInputFile(cacheKey: str, dataFrame: pd.DataFrame):
+    cacheDirectory = getInputFileCacheDirectory()
+    cacheFileName = os.path.join(cacheDirectory, f"{cacheKey}.parquet")
+    tempFileName = f"{cacheFileName}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cacheDirectory, exist_ok=True)
+        dataFrame.to_parquet(tempFileName)
+        if isCachedDataIdentical(pd.read_parquet(tempFileName), dataFrame):
+            # Replace the file at once, other processes could read the same cache file
+            os.replace(tempFileName, cacheFileName)
+            evictInputFileCache()
+    except Exception:
+        # Missing pyarrow or data which cannot be stored, the data is just not cached
+        pass
+    finally:
+        if os.path.exists(tempFileName):
+            os.remove(tempFileName)
+
+
+# Remove the least recently used cache files when the cache exceeds the maximum size
+def evictInputFileCache():
+    cacheDirectory = getInputFileCacheDirectory()
+    cacheFiles = []
+    for entry in os.scandir(cacheDirectory):
+        if entry.name.endswith(".parquet"):
+            stat = entry.stat()
+            cacheFiles.append((stat.st_mtime, stat.st_size, entry.path))
+
+    cacheSize = sum(size for _, size, _ in cacheFiles)
+    for _, size, path in sorted(cacheFiles):
+        if cacheSize <= inputFileCacheMaxSize:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        cacheSize -= size
+
+
+# Check if the provider script replaced the hooks which prepare the data
+def isCustomPrepareDataReplaced() -> bool:
+    return (
+        customPrepareDataPre is not engineCustomPrepareDataPre
+        or customPrepareDataPost is not engineCustomPrepareDataPost
+    )
+
+
+# Determine the columns of the input file(s) which are needed to generate the output files
+# (names, wildcards or column indexes, None: all the columns are needed)
+def getRequiredInputColumns() -> List[str | int] | None:
+    # Custom hooks can use any column unless they declare the extra columns they need
+    if (
+        not inputFileReadRequiredColumnsOnly
+        or not outputFiles
+        or (isCustomPrepareDataReplaced() and inputFileExtraColumnNames is None)
+    ):
+        return None
+
+    columns = [inputFileDateColumnName]
+    if inputFileTimeColumnName != "":
+        columns.append(inputFileTimeColumnName)
+    for outputFile in outputFiles:
+        columns.append(outputFile.valueColumnName)
+        columns.extend(dataFilter.column for dataFilter in outputFile.dataFilters)
+    columns.extend(inputFileExtraColumnNames or [])
+    return list(dict.fromkeys(columns))
+
+
+# Create the function which checks whether a column of the input file is needed (None: all the columns are needed)
+# Names are matched as is and as wildcard (like the value columns), indexes match the columns of files without
+# header names.
+def getInputColumnFilter() -> Callable[[str | int], bool] | None:
+    requiredColumns = getRequiredInputColumns()
+    if requiredColumns is None:
+        return None
+
+    names = [column for column in requiredColumns if isinstance(column, str)]
+    indexes = {column for column in requiredColumns if isinstance(column, int)}
+
+    def isRequiredInputColumn(column: str | int) -> bool:
+        if isinstance(column, str):
+            return any(
+                column == name or fnmatch.fnmatch(column, name) for name in names
+            )
+        return column in indexes
+
+    return isRequiredInputColumn
+
+
+# Only keep the needed columns of the data read from the input file
+def selectRequiredInputColumns(dataFrame: pd.DataFrame) -> pd.DataFrame:
+    isRequiredInputColumn = getInputColumnFilter()
+    if isRequiredInputColumn is None:
+        return dataFrame
+    return dataFrame.loc[:, [isRequiredInputColumn(c) for c in dataFrame.columns]]
+
+
+# Determine the rows of the database table which are needed to generate the output files:
+# the filters of each output file which can be evaluated by the SQL query (None: all the rows are needed) and the
+# first date which is needed in incremental mode (None: all the dates are needed).
+# Only inclusive filters are used, filters on the value column are evaluated on the numeric values.
+def getDbRowSelection() -> tuple | None:
+    if (
+        not inputFileDbReadRequiredRowsOnly
+        or not outputFiles
+        or isCustomPrepareDataReplaced()
+    ):
+        return None
+
+    filters: List[List[DataFilter]] | None = []
+    for outputFile in outputFiles:
+        outputFileFilters = [
+            dataFilter
+            for dataFilter in outputFile.dataFilters
+            if dataFilter.equal
+            and isinstance(dataFilter.column, str)
+            and not (
+                isinstance(outputFile.valueColumnName, str)
+                and fnmatch.fnmatch(dataFilter.column, outputFile.valueColumnName)
+            )
+        ]
+        if not outputFileFilters:
+            filters = None
+            break
+        filters.append(outputFileFilters)
+
+    # The dates are stored as text, which can be compared in case the format starts with the date.
+    # The date of the previous run is moved back 2 days so that the local dates are included as well.
+    firstDate = None
+    if (
+        incrementalWatermark is not None
+        and isinstance(inputFileDateColumnName, str)
+        and inputFileDateTimeColumnFormat.startswith("%Y-%m-%d")
+    ):
+        firstDate = (
+            pd.Timestamp(incrementalWatermark, unit="s") - pd.Timedelta(days=2)
+        ).strftime("%Y-%m-%d")
+
+    if filters is None and firstDate is None:
+        return None
+    return filters, firstDate
+
+
+# Quote the name of a column or table for use in a SQL query
+def quoteDbIdentifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Check if the value of a database column matches a regular expression like the filters do on the data read from
+# the database: the text of the value, of integers also their text when the column is read as floating point numbers
+# (in case of missing values) and of missing values "nan" (numeric column) and "None" (text column).
+def dbValueMatches(pattern: str, value) -> bool:
+    if value is None:
+        texts = ["nan", "None"]
+    elif isinstance(value, int):
+        texts = [str(value), str(float(value))]
+    else:
+        texts = [str(value)]
+    regex = re.compile(pattern)
+    return any(regex.search(text) for text in texts)
+
+
+# Translate a filter into a SQL condition which holds for (at least) the rows matched by the filter
+# Filters on exact values (like "^2$" or "^(2|3)$") are compared directly (as text and as number), so an index on
+# the column can be used. Other regular expressions are evaluated with dbValueMatches.
+def dbFilterCondition(dataFilter: DataFilter) -> tuple[str, list]:
+    column = quoteDbIdentifier(dataFilter.column)
+    match = re.fullmatch(r"\^(?:\((?:\?:)?(.*)\)|(.*))\$", dataFilter.value)
+    if match is not None:
+        alternatives = match.group(1)
+        literals = (
+            alternatives.split("|") if alternatives is not None else [match.group(2)]
+        )
+        if all(
+            re.fullmatch(r"(?:[^.^$*+?{}\[\]\\|()]|\\[^A-Za-z0-9])*", literal)
+            for literal in literals
+        ):
+            params: list = []
+            for literal in literals:
+                text = re.sub(r"\\(.)", r"\1", literal)
+                if text in ("nan", "None"):
+                    break
+                params.append(text)
+                with contextlib.suppress(ValueError):
+                    params.append(float(text))
+            else:
+                return f"{column} IN ({', '.join('?' * len(params))})", params
+
+    return f"{column} REGEXP ?", [dataFilter.value]
+
+
+# Build the SQL query which reads the needed columns and rows of the database table
+def getDbTableQuery(conn: sqlite3.Connection) -> tuple[str, list]:
+    cursor = conn.execute(f"SELECT * FROM {inputFileDbTableName} LIMIT 0")
+    tableColumns = [d[0] for d in cursor.description]
+
+    columns = "*"
+    isRequiredInputColumn = getInputColumnFilter()
+    if isRequiredInputColumn is not None:
+        names = [name for name in tableColumns if isRequiredInputColumn(name)]
+        if names:
+            columns = ", ".join(quoteDbIdentifier(name) for name in names)
+    query = f"SELECT {columns} FROM {inputFileDbTableName}"
+
+    rowSelection = getDbRowSelection()
+    if rowSelection is None:
+        return query, []
+
+    # The rows are needed by one of the output files, filters on unknown columns are left to the engine
+    conditions: List[tuple[str, list]] = []
+    filters, firstDate = rowSelection
+    outputFileConditions = []
+    for outputFileFilters in filters or []:
+        filterConditions = [
+            dbFilterCondition(dataFilter)
+            for dataFilter in outputFileFilters
+            if dataFilter.column in tableColumns
+        ]
+        if not filterConditions:
+            outputFileConditions = []
+            break
+        outputFileConditions.append(
+            (
+                " AND ".join(condition for condition, _ in filterConditions),
+                [param for _, params in filterConditions for param in params],
+            )
+        )
+    if outputFileConditions:
+        conditions.append(
+            (
+                " OR ".join(f"({condition})" for condition, _ in outputFileConditions),
+                [param for _, params in outputFileConditions for param in params],
+            )
+        )
+    if firstDate is not None and inputFileDateColumnName in tableColumns:
+        conditions.append(
+            (f"{quoteDbIdentifier(inputFileDateColumnName)} >= ?", [firstDate])
+        )
+
+    if not conditions:
+        return query, []
+    where = " AND ".join(f"({condition})" for condition, _ in conditions)
+    return f"{query} WHERE {where}", [p for _, params in conditions for p in params]
+
+
+# Open the SQLite database (the regular expressions of the filters are evaluated by dbValueMatches)
+def openDbFile(inputFileName: str) -> sqlite3.Connection:
+    import sqlite3
+
+    conn = sqlite3.connect(inputFileName)
+    conn.create_function("REGEXP", 2, dbValueMatches, deterministic=True)
+    return conn
+
+
+# Read the needed columns and rows of the SQLite database table
+def readDbTable(inputFileName: str) -> pd.DataFrame:
+    conn = openDbFile(inputFileName)
+    try:
+        query, params = getDbTableQuery(conn)
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+
+# Read the needed columns and rows of the SQLite database table in chunks of inputFileChunkSize rows
+def readDbTableChunks(inputFileName: str) -> Iterator[pd.DataFrame]:
+    conn = openDbFile(inputFileName)
+    try:
+        query, params = getDbTableQuery(conn)
+        chunksRead = 0
+        for chunk in pd.read_sql_query(
+            query, conn, params=params, chunksize=inputFileChunkSize
+        ):
+            chunksRead += 1
+            yield chunk
+        # Make sure that the columns are known in case there are no rows
+        if chunksRead == 0:
+            yield pd.read_sql_query(f"{query} LIMIT 0", conn, params=params)
+    finally:
+        conn.close()
+
+
+# Number of json records which are converted to a data frame at once when the file is not read in chunks
+jsonRecordBatchSize = 100_000
+
+
+# Incremental reader of a json file, the file is read in blocks and only the records are decoded as a whole
+# (the values around the records are walked through without building the complete object tree).
+class JsonRecordReader:
+    blockSize = 1024**2
+    whitespace = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, file):
+        self.file = file
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    # Read the next block of the file (at least minSize characters), the processed part of the buffer is dropped
+    def readBlock(self, minSize: int = 0) -> bool:
+        if self.eof:
+            return False
+        data = self.file.read(max(self.blockSize, minSize))
+        self.buffer = self.buffer[self.pos :] + data
+        self.pos = 0
+        self.eof = data == ""
+        return not self.eof
+
+    # Skip the whitespace and return the next character ("" at the end of the file)
+    def peek(self) -> str:
+        while True:
+            self.pos = self.whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.readBlock():
+                return ""
+
+    # Skip the expected character
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if char == "" or char not in chars:
+            raise json.JSONDecodeError(
+                f"Expecting one of '{chars}'", self.buffer, self.pos
+            )
+        self.pos += 1
+        return char
+
+    # Decode the next value, more blocks are read until the value is complete
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer can continue in the next block
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.readBlock(len(self.buffer) - self.pos)
+
+    # Walk through the keys of an object, the caller has to read (or skip) the value of each key
+    def objectKeys(self) -> Iterator[str]:
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    # Walk through the items of an array, the caller has to read (or skip) each item
+    def arrayItems(self) -> Iterator[None]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield None
+            if self.expect(",]") == "]":
+                return
+
+    # Return the records at the json path (like the record_path of pd.json_normalize)
+    # Arrays on the path are walked through and the records of all the items are returned.
+    def records(self, path: List[str]) -> Iterator:
+        char = self.peek()
+        if char == "[":
+            for _ in self.arrayItems():
+                if path:
+                    yield from self.records(path)
+                else:
+                    yield self.value()
+        elif not path:
+            record = self.value()
+            if record is not None:
+                yield record
+        elif char == "{":
+            found = False
+            for key in self.objectKeys():
+                if key == path[0] and not found:
+                    found = True
+                    yield from self.records(path[1:])
+                else:
+                    self.value()
+            if not found:
+                raise Exception(f"Json path not found: {path[0]}")
+        else:
+            raise Exception(f"Json path not found: {path[0]}")
+
+
+# Flatten a json record like pd.json_normalize does, only the needed fields are kept
+# The names of nested fields are joined with a "." and the nested objects of the record follow its other fields.
+def flattenJsonRecord(
+    record, isRequiredInputColumn: Callable[[str | int], bool] | None
+) -> dict:
+    flatRecord: dict = {}
+
+    def flattenObject(value: dict, prefix: str):
+        for key, nestedValue in value.items():
+            name = prefix + key
+            if isinstance(nestedValue, dict):
+                flattenObject(nestedValue, name + ".")
+            elif isRequiredInputColumn is None or isRequiredInputColumn(name):
+                flatRecord[name] = nestedValue
+
+    if not isinstance(record, dict):
+        record = {0: record}
+    nestedObjects = []
+    for key, value in record.items():
+        if isinstance(value, dict):
+            nestedObjects.append((key, value))
+        elif isRequiredInputColumn is None or isRequiredInputColumn(key):
+            flatRecord[key] = value
+    for key, value in nestedObjects:
+        flattenObject(value, key + ".")
+    return flatRecord
+
+
+# Read the records of the json file in data frames of at most the given number of records
+# The file is parsed incrementally, so only the (flattened) records of one data frame are in memory.
+def readJsonFileChunks(inputFileName: str, chunkSize: int) -> Iterator[pd.DataFrame]:
+    # The records share their field names, so the check of each name is remembered
+    isRequiredInputColumn = getInputColumnFilter()
+    if isRequiredInputColumn is not None:
+        isRequiredInputColumn = functools.cache(isRequiredInputColumn)
+    with open(inputFileName, "r", encoding="utf-8") as f:
+        reader = JsonRecordReader(f)
+        records: List[dict] = []
+        chunksRead = 0
+        for record in reader.records(inputFileJsonPath):
+            records.append(flattenJsonRecord(record, isRequiredInputColumn))
+            if len(records) >= chunkSize:
+                chunksRead += 1
+                yield pd.DataFrame(records)
+                records = []
+        if reader.peek() != "":
+            raise json.JSONDecodeError("Extra data", reader.buffer, reader.pos)
+
+    if records or chunksRead == 0:
+        yield pd.DataFrame(records)
+
+
+# Read the json file (the records are converted in batches to limit the memory usage)
+def readJsonFile(inputFileName: str) -> pd.DataFrame:
+    dataFrames = list(readJsonFileChunks(inputFileName, jsonRecordBatchSize))
+    if len(dataFrames) == 1:
+        return dataFrames[0]
+    return pd.concat(dataFrames, ignore_index=True)
+
+
+# Read the inputfile
+def readInputFile(inputFileName: str) -> pd.DataFrame:
+    # Read the specified file
+    print(f"Loading data: {inputFileName}")
+
+    try:
+        # Use the cached data in case the file has been read before with the same settings
+        cacheKey = None
+        if inputFileUseCache:
+            cacheKey = getInputFileCacheKey(inputFileName)
+            df = readCachedInputFile(cacheKey)
+            if df is not None:
+                return df
+
+        # Check if we have a supported extension
+        if inputFileNameExtension == ".csv":
+            # Read the CSV file
+            df = readCsvFile(inputFileName)
+        elif (inputFileNameExtension == ".xlsx") or (inputFileNameExtension == ".xls"):
+            # Read the XLSX/XLS file
+            warnings.filterwarnings(
+                "ignore",
+                message="Workbook contains no default style, apply openpyxl's default",
+            )
+            df = pd.read_excel(
+                inputFileName,
+                sheet_name=inputFileExcelSheetName,
+                decimal=inputFileDataDecimal,
+                skiprows=inputFileNumHeaderRows,
+                skipfooter=inputFileNumFooterRows,
+                usecols=getInputColumnFilter(),
+                engine=excelReaderEngine(),
+            )
+        elif inputFileNameExtension == ".json":
+            # Read the JSON file
+            df = readJsonFile(inputFileName)
+        elif inputFileNameExtension == ".db":
+            # Read the SQLite database file
+            df = readDbTable(inputFileName)
+        else:
+            raise Exception(f"Unsupported extension: {inputFileNameExtension}")
+
+        if cacheKey is not None:
+            writeCachedInputFile(cacheKey, df)
+
+        return df
+    except Exception as e:
+        print(f"Error reading file {inputFileName}: {e}")
+        sys.exit(1)
+
+
+# Engine implementation of readInputFile (provider scripts can replace the readInputFile hook)
+engineReadInputFile = readInputFile
+
+
+# Count the number of data rows in a csv file which precede the footer rows
+# (the footer rows are the last records of the file, empty lines are counted as footer rows as well)
+# The records are counted instead of the lines, a quoted field can span multiple lines.
+def countCsvDataRows(inputFileName: str) -> int:
+    rows = 0
+    footerRecords: collections.deque[bool] = collections.deque()
+    with open(inputFileName, "r", encoding="utf-8", errors="replace", newline="") as f:
+        for _ in range(inputFileNumHeaderRows):
+            f.readline()
+        # Only the quoting determines where a record ends, the csv module only supports single character separators
+        delimiter = inputFileDataSeparator if len(inputFileDataSeparator) == 1 else ","
+        for record in csv.reader(f, delimiter=delimiter):
+            footerRecords.append(
+                len(record) > 1 or (len(record) == 1 and bool(record[0].strip()))
+            )
+            if len(footerRecords) > inputFileNumFooterRows:
+                rows += footerRecords.popleft()
+    return rows - 1 if inputFileHasHeaderNameRow else rows
+
+
+# Options of the csv reader which are shared by all the reader engines
+def csvReaderOptions() -> dict:
+    return {
+        "sep": inputFileDataSeparator,
+        "decimal": inputFileDataDecimal,
+        "skiprows": inputFileNumHeaderRows,
+        "index_col": False,
+        "na_values": ["N/A", "NaN"],
+        "header": "infer" if inputFileHasHeaderNameRow else None,
+    }
+
+
+# Determine the csv reader engines to try, the python engine is used as fallback
+def csvReaderEngines(chunked: bool = False) -> List[str]:
+    if inputFileCsvReaderEngine not in ("c", "pyarrow", "python"):
+        raise Exception(f"Unsupported csv reader engine: {inputFileCsvReaderEngine}")
+
+    # The pyarrow engine cannot read in chunks and does not skip the header rows like the other engines
+    if (
+        inputFileCsvReaderEngine == "pyarrow"
+        and not chunked
+        and inputFileNumHeaderRows == 0
+    ):
+        return ["pyarrow", "c", "python"]
+    if inputFileCsvReaderEngine == "python":
+        return ["python"]
+    return ["c", "python"]
+
+
+# Convert the decimal token of numeric values in text columns (as done by the python engine)
+# The fast engines only convert the decimal token of numeric columns, the python engine also converts the
+# numeric values in text columns (e.g. a column with numbers and text values).
+def normalizeCsvDecimals(dataFrame: pd.DataFrame) -> pd.DataFrame:
+    if inputFileDataDecimal == ".":
+        return dataFrame
+
+    numericValue = r"^[\-\+]?[0-9]*(?:{decimal}[0-9]*)?(?:[0-9]?(?:E|e)\-?[0-9]+)?$"
+    decimalValue = re.compile(
+        numericValue.format(decimal=re.escape(inputFileDataDecimal))
+    )
+    pointValue = re.compile(numericValue.format(decimal=r"\."))
+    for column in dataFrame.columns[dataFrame.dtypes == object]:
+        # Only the unique values are checked, text columns typically contain many repeated values
+        uniqueValues = [
+            value for value in dataFrame[column].unique() if isinstance(value, str)
+        ]
+        replacements = {
+            value: value.replace(inputFileDataDecimal, ".")
+            for value in uniqueValues
+            if inputFileDataDecimal in value and decimalValue.match(value.strip())
+        }
+        if replacements:
+            dataFrame[column] = dataFrame[column].replace(replacements)
+
+        # Like the python engine, columns with only numeric values become numeric columns
+        if uniqueValues and all(
+            pointValue.match(replacements.get(value, value).strip())
+            for value in uniqueValues
+        ):
+            try:
+                dataFrame[column] = pd.to_numeric(dataFrame[column])
+            except (ValueError, TypeError):
+                pass
+    return dataFrame
+
+
+# Determine the positions of the needed columns of the csv file based on its header (None: all the columns)
+# Positions are used as the names in the header can be duplicated or missing (e.g. "Unnamed: 2").
+def getCsvColumnPositions(inputFileName: str, readerEngine: str) -> List[int] | None:
+    isRequiredInputColumn = getInputColumnFilter()
+    if isRequiredInputColumn is None:
+        return None
+
+    header = pd.read_csv(
+        inputFileName, nrows=0, engine=readerEngine, **csvReaderOptions()
+    ).columns
+    return [i for i, column in enumerate(header) if isRequiredInputColumn(column)]
+
+
+# Read the csv file with the configured reader engine
+def readCsvFile(inputFileName: str) -> pd.DataFrame:
+    numRows = None
+    for readerEngine in csvReaderEngines():
+        try:
+            if readerEngine == "python":
+                # The python engine is able to skip the footer rows itself
+                return pd.read_csv(
+                    inputFileName,
+                    skipfooter=inputFileNumFooterRows,
+                    engine="python",
+                    usecols=getCsvColumnPositions(inputFileName, "python"),
+                    **csvReaderOptions(),
+                )
+
+            # The fast engines cannot skip the footer, only keep the rows before the footer
+            if inputFileNumFooterRows > 0 and numRows is None:
+                numRows = countCsvDataRows(inputFileName)
+
+            if readerEngine == "pyarrow":
+                # The pyarrow engine cannot limit the rows, remove the footer after parsing
+                # and does not support index_col=False (rows with extra fields are rejected instead)
+                options = csvReaderOptions()
+                options["index_col"] = None
+                df = pd.read_csv(inputFileName, engine="pyarrow", **options)
+                # The pyarrow engine converts ISO formatted date/time values itself, the engine expects text
+                if any(
+                    pd.api.types.is_datetime64_any_dtype(values)
+                    or (
+                        values.dtype == object
+                        and pd.api.types.infer_dtype(values) in ("date", "time")
+                    )
+                    for _, values in df.items()
+                ):
+                    raise ValueError(
+                        "date/time values are converted by the pyarrow reader"
+                    )
+                # Unnamed and duplicate columns are named like the other engines do
+                columns = []
+                for i, column in enumerate(df.columns):
+                    column = f"Unnamed: {i}" if column == "" else column
+                    name, count = column, 0
+                    while name in columns:
+                        count += 1
+                        name = f"{column}.{count}"
+                    columns.append(name)
+                df.columns = columns
+                # The pyarrow engine cannot select the columns by position, only keep the needed columns afterwards
+                df = selectRequiredInputColumns(df)
+                return normalizeCsvDecimals(
+                    df if numRows is None else df.iloc[:numRows].copy()
+                )
+
+            return normalizeCsvDecimals(
+                pd.read_csv(
+                    inputFileName,
+                    nrows=numRows,
+                    engine=readerEngine,
+                    usecols=getCsvColumnPositions(inputFileName, readerEngine),
+                    **csvReaderOptions(),
+                )
+            )
+        except (ValueError, ImportError) as e:
+            if readerEngine == "python":
+                raise
+            print(f"Could not read the file with the {readerEngine} reader: {e}")
+
+    raise Exception("No csv reader engine available")
+
+
+# Determine the reader engine for excel files (None: the default engine of pandas)
+def excelReaderEngine() -> str | None:
+    if inputFileExcelReaderEngine not in ("calamine", "default"):
+        raise Exception(
+            f"Unsupported excel reader engine: {inputFileExcelReaderEngine}"
+        )
+    if (
+        inputFileExcelReaderEngine == "calamine"
+        and importlib.util.find_spec("python_calamine") is not None
+    ):
+        return "calamine"
+    return None
+
+
+# Read the rows of the excel sheet one by one, the cells are converted like pandas does
+# (empty cells become "", numbers without fraction become integers).
+# Xls files can only be read row by row with calamine.
+def readExcelRows(inputFileName: str) -> Iterator[list]:
+    if excelReaderEngine() == "calamine":
+        from python_calamine import CalamineWorkbook
+
+        calamineWorkbook = CalamineWorkbook.from_path(inputFileName)
+        calamineSheet = (
+            calamineWorkbook.get_sheet_by_index(inputFileExcelSheetName)
+            if isinstance(inputFileExcelSheetName, int)
+            else calamineWorkbook.get_sheet_by_name(inputFileExcelSheetName)
+        )
+
+        def convertCalamineCell(value):
+            if isinstance(value, float) and value.is_integer():
+                return int(value)
+            if isinstance(value, datetime.date):
+                return pd.Timestamp(value)
+            if isinstance(value, datetime.timedelta):
+                return pd.Timedelta(value)
+            return value
+
+        # The rows start at the first row of the sheet, the columns at the first column with data
+        emptyColumns = [""] * (
+            calamineSheet.start[1] if calamineSheet.start is not None else 0
+        )
+        return (
+            emptyColumns + [convertCalamineCell(value) for value in row]
+            for row in calamineSheet.iter_rows()
+        )
+
+    # Only the sheet is read (row by row) instead of loading the complete workbook
+    import openpyxl
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    workbook = openpyxl.load_workbook(
+        inputFileName, read_only=True, data_only=True, keep_links=False
+    )
+    sheet = (
+        workbook.worksheets[inputFileExcelSheetName]
+        if isinstance(inputFileExcelSheetName, int)
+        else workbook[inputFileExcelSheetName]
+    )
+
+    def convertOpenpyxlCell(cell):
+        if cell.value is None:
+            return ""
+        if cell.data_type == TYPE_ERROR:
+            return np.nan
+        if cell.data_type == TYPE_NUMERIC:
+            value = int(cell.value)
+            return value if value == cell.value else float(cell.value)
+        return cell.value
+
+    def openpyxlRows() -> Iterator[list]:
+        try:
+            sheet.reset_dimensions()
+            for row in sheet.rows:
+                yield [convertOpenpyxlCell(cell) for cell in row]
+        finally:
+            workbook.close()
+
+    return openpyxlRows()
+
+
+# Read the excel sheet in chunks of inputFileChunkSize rows
+# The rows are parsed like pd.read_excel does: the row after the header rows holds the column names, empty rows
+# within the data are kept, empty rows at the end and the footer rows are skipped.
+# Cells beyond the columns of the header row are ignored.
+def readExcelFileChunks(inputFileName: str) -> Iterator[pd.DataFrame]:
+    from pandas.io.parsers import TextParser
+
+    rows = readExcelRows(inputFileName)
+
+    def isEmptyRow(row: list) -> bool:
+        return all(cell == "" for cell in row)
+
+    def parseRows(header: list, dataRows: list) -> pd.DataFrame:
+        return TextParser(
+            [header] + [(row + [""] * len(header))[: len(header)] for row in dataRows],
+            header=0,
+            skip_blank_lines=False,
+            decimal=inputFileDataDecimal,
+            usecols=getInputColumnFilter(),
+        ).read()
+
+    for _ in range(inputFileNumHeaderRows):
+        next(rows, None)
+    header = next(rows, None)
+    if header is None:
+        yield pd.DataFrame()
+        return
+    while header and header[-1] == "":
+        header.pop()
+
+    # Rows are kept back until it is known that they are no empty rows at the end or footer rows
+    pendingRows: collections.deque[list] = collections.deque()
+    emptyRows: List[list] = []
+    dataRows: List[list] = []
+    chunksRead = 0
+    for row in rows:
+        if isEmptyRow(row):
+            emptyRows.append(row)
+            continue
+        pendingRows.extend(emptyRows)
+        emptyRows = []
+        pendingRows.append(row)
+        while len(pendingRows) > inputFileNumFooterRows:
+            dataRows.append(pendingRows.popleft())
+            if len(dataRows) >= inputFileChunkSize:
+                chunksRead += 1
+                yield parseRows(header, dataRows)
+                dataRows = []
+
+    if dataRows or chunksRead == 0:
+        yield parseRows(header, dataRows)
+
+
+# Check if the input files can be read in chunks by the engine
+# (csv, xlsx, json and db files, xls files only with calamine, custom readers return the data at once)
+def isInputFileReadInChunks() -> bool:
+    if readInputFile is not engineReadInputFile:
+        return False
+    if inputFileNameExtension == ".xls":
+        return excelReaderEngine() == "calamine"
+    return inputFileNameExtension in (".csv", ".xlsx", ".json", ".db")
+
+
+# Read the inputfile in chunks of inputFileChunkSize rows
+# Custom readers (and xls files without calamine) return the data as one chunk.
+def readInputFileChunks(inputFileName: str) -> Iterator[pd.DataFrame]:
+    if not isInputFileReadInChunks():
+        yield readInputFile(inputFileName)
+        return
+
+    # Read the specified file
+    print(f"Loading data: {inputFileName}")
+
+    try:
+        # Json files are parsed incrementally, the records are converted per chunk
+        if inputFileNameExtension == ".json":
+            yield from readJsonFileChunks(inputFileName, inputFileChunkSize)
+            return
+
+        # The rows of the database table are fetched per chunk
+        if inputFileNameExtension == ".db":
+            yield from readDbTableChunks(inputFileName)
+            return
+
+        # Excel files are read row by row, the rows are parsed per chunk
+        if inputFileNameExtension != ".csv":
+            yield from readExcelFileChunks(inputFileName)
+            return
+
+        # Chunks cannot skip the footer, only read the rows before the footer
+        numRows = None
+        if inputFileNumFooterRows > 0:
+            numRows = countCsvDataRows(inputFileName)
+
+        for readerEngine in csvReaderEngines(chunked=True):
+            chunksRead = 0
+            try:
+                with pd.read_csv(
+                    inputFileName,
+                    nrows=numRows,
+                    chunksize=inputFileChunkSize,
+                    engine=readerEngine,
+                    usecols=getCsvColumnPositions(inputFileName, readerEngine),
+                    **csvReaderOptions(),
+                ) as reader:
+                    for chunk in reader:
+                        chunksRead += 1
+                        yield (
+                            chunk
+                            if readerEngine == "python"
+                            else normalizeCsvDecimals(chunk)
+                        )
+                return
+            except ValueError as e:
+                # Only fall back to the next reader in case no data has been processed yet
+                if readerEngine == "python" or chunksRead > 0:
+                    raise
+                print(f"Could not read the file with the {readerEngine} reader: {e}")
+    except Exception as e:
+        print(f"Error reading file {inputFileName}: {e}")
+        sys.exit(1)
+
+
+# Engine settings which are needed to read the input files in a worker process
+def readInputFileSettings() -> dict:
+    settings = {
+        name: value for name, value in globals().items() if name.startswith("inputFile")
+    }
+    settings["readInputFile"] = readInputFile
+    settings["outputFiles"] = outputFiles
+    # The hooks determine which columns are needed
+    settings["customPrepareDataPre"] = customPrepareDataPre
+    settings["customPrepareDataPost"] = customPrepareDataPost
+    return settings
+
+
+# Initialize a worker process with the engine settings of the main process
+# (needed for platforms where worker processes do not inherit the state of the main process)
+def initializeReadInputFileWorker(settings: dict):
+    globals().update(settings)
+
+
+# Read an inputfile in a worker process
+# Errors are returned instead of ending the worker so that the other files are still loaded.
+# The output files are returned as well because custom readers may define them based on the file contents.
+def readInputFileWorker(inputFileName: str) -> tuple:
+    initialOutputFiles = outputFiles
+    try:
+        df = readInputFile(inputFileName)
+    except SystemExit:
+        # readInputFile already reported the error
+        return None, f"Error reading file {inputFileName}", None
+    except Exception as e:
+        print(f"Error reading file {inputFileName}: {e}")
+        return None, f"Error reading file {inputFileName}: {e}", None
+    return df, None, None if outputFiles is initialOutputFiles else outputFiles
+
+
+# Read all the input files in parallel processes, the data is returned in the order of the input files
+def readInputFilesParallel(fileNames: List[str]) -> List[pd.DataFrame]:
+    global outputFiles
+
+    numJobs = min(inputFileNumReadJobs or os.cpu_count() or 1, len(fileNames))
+    print(f"Loading {len(fileNames)} files using {numJobs} processes")
+
+    dataFrames = []
+    errors = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=numJobs,
+        initializer=initializeReadInputFileWorker,
+        initargs=(readInputFileSettings(),),
+    ) as executor:
+        # Hand out the files in batches to limit the overhead of many small files
+        chunkSize = max(1, len(fileNames) // (numJobs * 4))
+        for df, error, fileOutputFiles in executor.map(
+            readInputFileWorker, fileNames, chunksize=chunkSize
+        ):
+            if error is not None:
+                errors.append(error)
+                continue
+            if fileOutputFiles is not None:
+                outputFiles = fileOutputFiles
+            dataFrames.append(df)
+
+    if errors:
+        print(f"Could not load {len(errors)} of {len(fileNames)} files:")
+        for error in errors:
+            print(f"  {error}")
+        sys.exit(1)
+
+    return dataFrames
+
+
+# Check if all the provided files have the correct extension
+def correctFileExtensions(fileNames: list[str]) -> bool:
+    # Check all filenames for the right extension
+    for fileName in fileNames:
+        _, fileNameExtension = os.path.splitext(fileName)
+        if fileNameExtension != inputFileNameExtension:
             return False
     return True
 
 
 # Generate the datafiles which can be imported
 def generateImportDataFiles(
-    inputFileNames: str,
+    inputFileNames: str | List[str],
     outputFileName: str | None = None,
     prefix: str = "",
-):
-    # Find the file(s)
-    fileNames = glob.glob(inputFileNames)
+) -> bool:
+    # Find the file(s), multiple patterns can be provided as a list
+    patterns = [inputFileNames] if isinstance(inputFileNames, str) else inputFileNames
+    inputFileNames = ", ".join(patterns)
+    fileNames = list(
+        dict.fromkeys(name for pattern in patterns for name in glob.glob(pattern))
+    )
     if not fileNames:
         print(f"No files found based on: {inputFileNames}")
-        return
+        return False
 
     print(f"Found {len(fileNames)} files based on: {inputFileNames}")
 
     if not correctFileExtensions(fileNames):
         print(f"Only {inputFileNameExtension} data files are allowed.")
-        return
-
-    # For SQLite .db files, enforce that only one file is allowed.
-    if inputFileNameExtension == ".db" and len(fileNames) > 1:
-        print("Error: Only one SQLite database file is allowed for .db files.")
-        return
+        return False
 
-    # Read all the found files and concat the data
-    dataFrame = pd.concat(map(readInputFile, fileNames), ignore_index=True, sort=True)
-
-    # Generate the datafiles which can be imported based on the provided dataframe
-    generateImportDataFilesFromDataFrame(dataFrame, outputFileName, prefix)
+    # Streaming is refused before anything is written in case the custom hooks need all the data
+    if (
+        inputFileChunkSize > 0
+        and isCustomPrepareDataReplaced()
+        and not customPrepareDataRowWise
+    ):
+        print(
+            f"The {energyProviderName} data cannot be processed in chunks because the custom hooks need all the data, "
+            "run without a chunk size"
+        )
+        return False
+
+    # Import the output data into the database in case database settings are provided
+    with openOutputDatabase():
+        # Stream the data in chunks in case a chunk size is provided or continue from the previous run
+        if inputFileChunkSize > 0 or incrementalMode:
+            generateImportDataFilesStreaming(fileNames, outputFileName, prefix)
+            return True
+
+        # Read all the found files and concat the data
+        dataFrame = readInputFiles(fileNames)
+
+        # Generate the datafiles which can be imported based on the provided dataframe
+        # The date/times are prepared per file already when removing duplicates (see readInputFiles)
+        generateImportDataFilesFromDataFrame(
+            dataFrame,
+            outputFileName,
+            prefix,
+            dateTimesPrepared=bool(inputFileDuplicatePolicy),
+        )
+    return True
 
 
-# Main Entry point
-def main():
-    print(f"{energyProviderName} Data Prepare\n")
-    print(
-        f"This python script prepares {energyProviderName} data for import into Home Assistant.\n"
-    )
+# Create the parser of the command line arguments
+# Without the input file arguments only the engine options are parsed (e.g. by the batch runner).
+def createArgumentParser(inputFileArguments: bool = True) -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description=f"""
 Notes:
@@ -587,6 +3286,106 @@ Notes:
         help="Prefix to add to all output file names",
     )
 
+    parser.add_argument(
+        "-c",
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Stream the input file(s) in chunks of the given number of rows to limit the memory usage",
+    )
+
+    parser.add_argument(
+        "--csv-engine",
+        choices=["c", "pyarrow", "python"],
+        default=None,
+        help="Reader engine used to parse csv files (default: c, falls back to python when needed)",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of processes used to load multiple input files in parallel (0: number of processors)",
+    )
+
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help=f"Only process the data after the data of the previous run (state kept in {incrementalStateFileName})",
+    )
+
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Cache the data of the input files so that they are not parsed again by the next run (requires pyarrow)",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time, rows and peak memory of each processing stage (slows down processing)",
+    )
+
+    parser.add_argument(
+        "--profile-json",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Also write the profile report as json to the given file (implies --profile)",
+    )
+
+    parser.add_argument(
+        "--deduplicate",
+        choices=["first", "last", "newest"],
+        default=None,
+        help="Remove the duplicate rows of overlapping input files, keep the row of the first, last or newest file",
+    )
+
+    parser.add_argument(
+        "--quality-report",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Check the data quality of the output files and write the report (json or csv) to the given file",
+    )
+
+    parser.add_argument(
+        "--quality-action",
+        choices=["report", "fail", "repair"],
+        default=None,
+        help="Action when data quality problems are found (default: report, implies --quality-report)",
+    )
+
+    parser.add_argument(
+        "--cutoff-new-meter",
+        type=float,
+        default=None,
+        help=f"Reading below which a decrease is a new meter (default: {dataQualityCutoffNewMeter})",
+    )
+
+    parser.add_argument(
+        "--cutoff-invalid-value",
+        type=float,
+        default=None,
+        help=f"Usage above which a value is a spike (default: {dataQualityCutoffInvalidValue})",
+    )
+
+    # The database options are only available when ImportData.py can be imported (it is not copied together with
+    # the engine and the provider script)
+    if importlib.util.find_spec("ImportData") is not None:
+        import ImportData
+
+        databaseArguments = parser.add_argument_group(
+            "database output",
+            "Import the output data directly into the IMPORT_DATA table (see ImportData.py) instead of writing the files",
+        )
+        ImportData.add_database_arguments(databaseArguments, db_type_required=False)
+
+    if not inputFileArguments:
+        return parser
+
     parser.add_argument(
         "input_file",
         type=str,
@@ -601,11 +3400,97 @@ Notes:
         help="Optional: Name of the specific output file to generate (default: all).",
     )
 
-    args = parser.parse_args()
+    return parser
+
+
+# Apply the engine options of the command line arguments to the engine globals
+def applyArguments(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    if args.chunk_size is not None:
+        if args.chunk_size <= 0:
+            parser.error("--chunk-size must be a positive number")
+        global inputFileChunkSize
+        inputFileChunkSize = args.chunk_size
+
+    if args.csv_engine is not None:
+        global inputFileCsvReaderEngine
+        inputFileCsvReaderEngine = args.csv_engine
+
+    if args.jobs is not None:
+        if args.jobs < 0:
+            parser.error("--jobs must be 0 or a positive number")
+        global inputFileNumReadJobs
+        inputFileNumReadJobs = args.jobs
+
+    if args.incremental:
+        global incrementalMode
+        incrementalMode = True
+
+    if args.cache:
+        global inputFileUseCache
+        inputFileUseCache = True
+
+    if args.profile or args.profile_json:
+        global profileMode, profileFileName
+        profileMode = True
+        profileFileName = args.profile_json or ""
+
+    if args.deduplicate is not None:
+        global inputFileDuplicatePolicy
+        inputFileDuplicatePolicy = args.deduplicate
+
+    if args.quality_report or args.quality_action:
+        global dataQualityReportFileName, dataQualityAction
+        dataQualityReportFileName = args.quality_report or "DataQualityReport.json"
+        dataQualityAction = args.quality_action or dataQualityAction
+
+    if args.cutoff_new_meter is not None:
+        global dataQualityCutoffNewMeter
+        dataQualityCutoffNewMeter = args.cutoff_new_meter
+
+    if args.cutoff_invalid_value is not None:
+        global dataQualityCutoffInvalidValue
+        dataQualityCutoffInvalidValue = args.cutoff_invalid_value
+
+    if getattr(args, "db_type", None) is not None:
+        global outputDatabaseSettings, outputDatabaseRecreateTable
+        outputDatabaseSettings = {
+            name: getattr(args, name)
+            for name in (
+                "db_type",
+                "sqlite_db",
+                "host",
+                "user",
+                "password",
+                "database",
+                "port",
+            )
+        }
+        outputDatabaseRecreateTable = not args.suppress_recreate
+
 
+# Main Entry point (the command line arguments are taken from sys.argv in case no arguments are provided)
+def main(arguments: List[str] | None = None):
+    print(f"{energyProviderName} Data Prepare\n")
     print(
-        "The files will be prepared in the current directory. Any previous files will be overwritten!\n"
+        f"This python script prepares {energyProviderName} data for import into Home Assistant.\n"
     )
+    parser = createArgumentParser()
+    args = parser.parse_args(arguments)
+    applyArguments(parser, args)
+
+    if outputDatabaseSettings:
+        print(
+            "The data will be imported into the IMPORT_DATA table of the database."
+            + (
+                " Any previous data will be removed!\n"
+                if outputDatabaseRecreateTable and not incrementalMode
+                else "\n"
+            )
+        )
+    else:
+        print(
+            "The files will be prepared in the current directory. Any previous files will be overwritten!\n"
+        )
 
     # proceed automatically if --yes was passed
     if args.yes or (
@@ -614,4 +3499,138 @@ Notes:
         .lower()
         .startswith("y")
     ):
-        generateImportDataFiles(args.input_file, args.output_file, args.prefix.strip())
+        with profileStage("total"):
+            generateImportDataFiles(
+                args.input_file, args.output_file, args.prefix.strip()
+            )
+        reportProfile()
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Engine instances
+# ---------------------------------------------------------------------------------------------------------------------
+# The provider scripts configure the engine by setting the engine globals and replacing the hooks of the module.
+# To prepare the data of several providers (or households) in one process, the settings and hooks of a provider are
+# kept in a ProviderConfig. An Engine applies them to the engine globals during a run and restores the previous
+# globals afterwards, so the providers (and hooks which change engine globals) do not influence each other.
+# This is a compatibility layer over the module globals, not an engine whose state is held by the instance: the state
+# of a run is still kept in the engine globals. Runs are serialized by a process wide lock, so engines in different
+# threads never run at the same time. Use separate processes (e.g. BatchDataPrepare.py) to prepare data in parallel.
+
+# Defaults of the engine globals which can be configured (the settings, hooks and the state of a run)
+engineDefaults = {
+    name: value
+    for name, value in globals().items()
+    if not name.startswith("_")
+    and not isinstance(value, (types.ModuleType, type))
+    and (not callable(value) or getattr(value, "__module__", None) == __name__)
+    and name not in ("main", "versionNumber")
+}
+
+# The engine globals are shared, runs of engines in different threads are done one after another (the lock serializes
+# the runs, it does not make the engine usable by several threads at the same time)
+engineLock = threading.RLock()
+
+
+# Determine the engine globals which differ from the defaults of the engine
+def getChangedEngineGlobals() -> dict:
+    changedGlobals = {}
+    for name, default in engineDefaults.items():
+        value = globals()[name]
+        if value is default:
+            continue
+        try:
+            if type(value) is type(default) and bool(value == default):
+                continue
+        except (TypeError, ValueError):
+            pass
+        changedGlobals[name] = value
+    return changedGlobals
+
+
+# ProviderConfig (the settings and hooks of a provider)
+#   The settings are the engine globals which differ from the defaults of the engine, e.g.
+#   ProviderConfig(inputFileNameExtension=".json", customPrepareDataPre=prepareData). The settings can be read and
+#   changed as attributes, like the provider scripts do with the engine module.
+class ProviderConfig:
+    def __init__(self, **settings):
+        self.__dict__["settings"] = {}
+        for name, value in settings.items():
+            setattr(self, name, value)
+
+    def __getattr__(self, name: str):
+        settings = self.__dict__.get("settings", {})
+        if name in settings:
+            return settings[name]
+        if name in engineDefaults:
+            return engineDefaults[name]
+        raise AttributeError(f"Unknown engine setting: {name}")
+
+    def __setattr__(self, name: str, value):
+        if name not in engineDefaults:
+            raise AttributeError(f"Unknown engine setting: {name}")
+        self.settings[name] = value
+
+    # Create the configuration of the engine globals which are changed by the provider script (module or script)
+    # The script is run as main script, but its call of main() does not start the engine: main is replaced by a
+    # function which does nothing while the script runs (restored together with the other engine globals).
+    @classmethod
+    def fromProviderScript(cls, scriptFileName: str) -> "ProviderConfig":
+        with Engine().activate():
+            globals()["main"] = lambda arguments=None: None
+            runpy.run_path(scriptFileName, run_name="__main__")
+            return cls(**getChangedEngineGlobals())
+
+    # Create the configuration of the engine globals which are currently changed (e.g. by an imported provider script)
+    @classmethod
+    def fromEngineGlobals(cls) -> "ProviderConfig":
+        return cls(**getChangedEngineGlobals())
+
+
+# Engine (prepares the data with the settings and hooks of a provider)
+#   The engine globals are set to the defaults of the engine and the settings of the provider during a run, the
+#   settings are copied so that changes during a run do not change the configuration. The engine does not hold the
+#   state of a run, the runs of all the engines in a process are done one after another (see engineLock).
+class Engine:
+    def __init__(self, config: ProviderConfig | None = None):
+        self.config = config if config is not None else ProviderConfig()
+
+    # Apply the settings to the engine globals, the previous engine globals are restored afterwards
+    @contextlib.contextmanager
+    def activate(self) -> Iterator["Engine"]:
+        with engineLock:
+            savedGlobals = dict(globals())
+            try:
+                for name, value in itertools.chain(
+                    engineDefaults.items(), self.config.settings.items()
+                ):
+                    globals()[name] = copy.deepcopy(value)
+                yield self
+            finally:
+                # Remove the globals which have been created during the run (e.g. by a hook)
+                for name in globals().keys() - savedGlobals.keys():
+                    del globals()[name]
+                globals().update(savedGlobals)
+
+    # Generate the datafiles which can be imported (see generateImportDataFiles)
+    # The engine options of the command line can be provided as arguments (e.g. ["--chunk-size", "100000"]).
+    def generateImportDataFiles(
+        self,
+        inputFileNames: str | List[str],
+        outputFileName: str | None = None,
+        prefix: str = "",
+        arguments: List[str] | None = None,
+    ) -> bool:
+        with self.activate():
+            if arguments:
+                parser = createArgumentParser(inputFileArguments=False)
+                applyArguments(parser, parser.parse_args(arguments))
+            with profileStage("total"):
+                result = generateImportDataFiles(inputFileNames, outputFileName, prefix)
+            reportProfile()
+            return result
+
+    # Run the engine with the given command line arguments (see main)
+    def main(self, arguments: List[str] | None = None):
+        with self.activate():
+            main(arguments)
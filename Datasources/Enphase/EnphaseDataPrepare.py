@@ -1,15 +1,15 @@
+from __future__ import annotations
+
 import sys
 from pathlib import Path
 
-import pandas as pd
-
 # 1) Add engine to path (simple way to add the engine to the path)
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT))
 
 # 2) Import engine (supress linter warnings)
 import DataPrepareEngine as engine  # noqa: E402
-from DataPrepareEngine import IntervalMode, OutputFileDefinition  # noqa: E402
+from DataPrepareEngine import IntervalMode, OutputFileDefinition, pd  # noqa: E402
 
 # 3) Override DataPrepare engine globals
 # Name of the energy provider
@@ -34,6 +34,8 @@ engine.inputFileHasHeaderNameRow = True
 engine.inputFileNumHeaderRows = 0
 # Inputfile(s): Number of footer rows in the input file (csv and excel files)
 engine.inputFileNumFooterRows = 1
+# Inputfile(s): Extra columns which are needed by the custom hooks (besides the date/time, value and filter columns)
+engine.inputFileExtraColumnNames = []
 
 # List of one or more output file definitions
 engine.outputFiles = [
@@ -141,5 +143,7 @@ def customPrepareDataPost(dataFrame: pd.DataFrame) -> pd.DataFrame:
 if __name__ == "__main__":
     # Set the hook functions
     engine.customPrepareDataPost = customPrepareDataPost
+    # The hooks only manipulate individual rows (the data can be processed in chunks)
+    engine.customPrepareDataRowWise = True
 
     engine.main()
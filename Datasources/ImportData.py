@@ -208,18 +208,10 @@ def expand_file_patterns(patterns: list[str]) -> list[str]:
     return files
 
 
-def import_csv_data(
-    cursor,
-    csv_file: str,
-    placeholder: str,
-    id_val: str,
-    resolution: str,
-    db_type: DatabaseType,
-) -> tuple[int, int]:
+def get_upsert_query(placeholder: str, db_type: DatabaseType) -> str:
     """
-    Efficiently imports data from a CSV into the IMPORT_DATA table with upsert support.
-    Each CSV file is expected to have two columns: timestamp and value.
-    The computed id_val and resolution values are used for every row.
+    Returns the query which inserts a row into the IMPORT_DATA table or updates the value of an existing row.
+    The query takes the parameters (id, resolution, timestamp, value).
     """
     base_query = (
         f"INSERT INTO IMPORT_DATA (id, resolution, timestamp, value) "
@@ -235,7 +227,23 @@ def import_csv_data(
     else:
         raise ValueError(f"Unsupported database type: {db_type}")
 
-    insert_query = base_query + conflict_clause
+    return base_query + conflict_clause
+
+
+def import_csv_data(
+    cursor,
+    csv_file: str,
+    placeholder: str,
+    id_val: str,
+    resolution: str,
+    db_type: DatabaseType,
+) -> tuple[int, int]:
+    """
+    Efficiently imports data from a CSV into the IMPORT_DATA table with upsert support.
+    Each CSV file is expected to have two columns: timestamp and value.
+    The computed id_val and resolution values are used for every row.
+    """
+    insert_query = get_upsert_query(placeholder, db_type)
 
     rows = []
     total_rows = 0
@@ -261,34 +269,16 @@ def import_csv_data(
     return processed_count, skipped_count
 
 
-def main():
+def add_database_arguments(parser, db_type_required: bool = True):
     """
-    Entry point for the CSV import script.
-    Handles argument parsing, database setup, and CSV processing.
+    Adds the database connection and table recreation options to the parser (or argument group).
     """
-    parser = argparse.ArgumentParser(
-        description=(
-            "Import one or more CSV files (timestamp and value) into the IMPORT_DATA table. "
-            "The id and resolution are derived from each CSV file name. "
-            "Filenames may end with 'high_resolution.csv' or 'low_resolution.csv'; "
-            "if no such suffix is present, HIGH resolution is assumed. "
-            "By default, the table is dropped and recreated; use --suppress-recreate to keep the existing table."
-        )
-    )
-    parser.add_argument(
-        "--verbose", action="store_true", help="Enable verbose logging output."
-    )
     parser.add_argument(
         "--db-type",
         type=parse_db_type,
-        required=True,
+        required=db_type_required,
         help="Type of database to use: sqlite, mariadb, or postgresql",
     )
-    parser.add_argument(
-        "--csv-file",
-        nargs="+",
-        help="Path(s) or wildcard pattern(s) to one or more CSV files. Required unless --cleanup-backup is used.",
-    )
 
     # SQLite-specific parameters
     parser.add_argument(
@@ -322,6 +312,33 @@ def main():
         help="If set, the existing IMPORT_DATA table will not be dropped/recreated (default drops the table).",
     )
 
+
+def main():
+    """
+    Entry point for the CSV import script.
+    Handles argument parsing, database setup, and CSV processing.
+    """
+    parser = argparse.ArgumentParser(
+        description=(
+            "Import one or more CSV files (timestamp and value) into the IMPORT_DATA table. "
+            "The id and resolution are derived from each CSV file name. "
+            "Filenames may end with 'high_resolution.csv' or 'low_resolution.csv'; "
+            "if no such suffix is present, HIGH resolution is assumed. "
+            "By default, the table is dropped and recreated; use --suppress-recreate to keep the existing table."
+        )
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Enable verbose logging output."
+    )
+    parser.add_argument(
+        "--csv-file",
+        nargs="+",
+        help="Path(s) or wildcard pattern(s) to one or more CSV files. Required unless --cleanup-backup is used.",
+    )
+
+    # Database connection parameters and table recreation
+    add_database_arguments(parser)
+
     # Exclusive option for cleaning up backup tables.
     parser.add_argument(
         "--cleanup-backup",
@@ -373,7 +390,8 @@ def main():
                 cursor, csv_file, placeholder, id_val, resolution, db_type
             )
             log(
-                f"🔢 Processed {processed_count} records from '{csv_file}'", args.verbose
+                f"🔢 Processed {processed_count} records from '{csv_file}'",
+                args.verbose,
             )
             if skipped_count > 0:
                 log(
@@ -1,9 +1,9 @@
+from __future__ import annotations
+
 import datetime
 import sys
 from pathlib import Path
 
-import pandas as pd
-
 # 1) Add engine to path (simple way to add the engine to the path)
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT))
@@ -14,6 +14,7 @@ from DataPrepareEngine import (  # noqa: E402
     DataFilter,
     IntervalMode,
     OutputFileDefinition,
+    pd,
 )
 
 # 3) Override DataPrepare engine globals
@@ -1,16 +1,16 @@
+from __future__ import annotations
+
 import re
 import sys
 from pathlib import Path
 
-import pandas as pd
-
 # 1) Add engine to path (simple way to add the engine to the path)
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT))
 
 # 2) Import engine (supress linter warnings)
 import DataPrepareEngine as engine  # noqa: E402
-from DataPrepareEngine import IntervalMode, OutputFileDefinition  # noqa: E402
+from DataPrepareEngine import IntervalMode, OutputFileDefinition, pd  # noqa: E402
 
 # 3) Override DataPrepare engine globals
 # Name of the energy provider
@@ -48,6 +48,8 @@ engine.inputFileTimeZoneName = "Europe/Amsterdam"
 # Inputfile(s): Json path of the records (only needed for json files)
 # Example: inputFileJsonPath: List[str] = ['energy', 'values']
 engine.inputFileJsonPath = ["energy", "values"]
+# Inputfile(s): Extra columns which are needed by the custom hooks (besides the date/time, value and filter columns)
+engine.inputFileExtraColumnNames = []
 
 # List of one or more output file definitions
 engine.outputFiles = [
@@ -97,4 +99,6 @@ def customPrepareDataPre(dataFrame: pd.DataFrame) -> pd.DataFrame:
 # 4) Invoke DataPrepare engine
 if __name__ == "__main__":
     engine.customPrepareDataPre = customPrepareDataPre
+    # The hooks only manipulate individual rows (the data can be processed in chunks)
+    engine.customPrepareDataRowWise = True
     engine.main()
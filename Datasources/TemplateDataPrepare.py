@@ -1,15 +1,15 @@
+from __future__ import annotations
+
 import sys
 from pathlib import Path
 
-import pandas as pd
-
 # 1) Add engine to path (simple way to add the engine to the path)
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT))
 
 # 2) Import engine (supress linter warnings)
 import DataPrepareEngine as engine  # noqa: E402
-from DataPrepareEngine import DataFilter, OutputFileDefinition  # noqa: E402
+from DataPrepareEngine import DataFilter, OutputFileDefinition, pd  # noqa: E402
 
 # 3) Override DataPrepare engine globals
 # Name of the energy provider
@@ -61,6 +61,8 @@ engine.inputFileJsonPath = []
 engine.inputFileExcelSheetName = 0
 # When processing SQLite .db files, specify the table name to load
 engine.inputFileDbTableName = "data"
+# Inputfile(s): Extra columns which are needed by the custom hooks (besides the date/time, value and filter columns)
+engine.inputFileExtraColumnNames = []
 
 # Name used for the temporary date/time field.
 # This needs normally no change only when it conflicts with existing columns.
@@ -116,5 +118,8 @@ if __name__ == "__main__":
     # Set the hook functions
     engine.customPrepareDataPre = customPrepareDataPre
     engine.customPrepareDataPost = customPrepareDataPost
+    # The hooks only manipulate individual rows, set to False in case a hook combines rows (e.g. a difference
+    # between readings) so that the data is not processed in chunks
+    engine.customPrepareDataRowWise = True
 
     engine.main()
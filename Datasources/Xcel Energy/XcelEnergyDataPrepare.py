@@ -1,15 +1,15 @@
+from __future__ import annotations
+
 import sys
 from pathlib import Path
 
-import pandas as pd
-
 # 1) Add engine to path (simple way to add the engine to the path)
 ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT))
 
 # 2) Import engine (supress linter warnings)
 import DataPrepareEngine as engine  # noqa: E402
-from DataPrepareEngine import IntervalMode, OutputFileDefinition  # noqa: E402
+from DataPrepareEngine import IntervalMode, OutputFileDefinition, pd  # noqa: E402
 
 # 3) Override DataPrepare engine globals
 # Name of the energy provider
@@ -132,6 +132,8 @@ def customPrepareDataPre(dataFrame: pd.DataFrame) -> pd.DataFrame:
 # Set the custom functions
 engine.readInputFile = customReadInputFile
 engine.customPrepareDataPre = customPrepareDataPre
+# The hooks only manipulate individual rows (the data can be processed in chunks)
+engine.customPrepareDataRowWise = True
 
 
 # 4) Invoke DataPrepare engine
@@ -0,0 +1,441 @@
+"""
+Synthetic large-scale benchmark for the DataPrepare engine
+
+Generates synthetic input files of a configurable number of rows for the main input shapes, processes
+them with the settings of a representative data preparation script and reports the time, throughput
+and peak memory of every processing stage (see the --profile option of the engine).
+The results can be stored as a baseline, later runs with the same number of rows are compared against
+the baseline and regressions are flagged (exit code 1).
+
+Input shapes:
+  long-csv    Long format csv, one row per interval and register (Fluvius)
+  wide-csv    Wide format csv, one row per day with a column per interval (Enel Distribuzione)
+  nested-json Nested json records (GivEnergy)
+  xlsx        Excel workbook with multiple sheets (P1mon)
+  sqlite      SQLite database with the readings of many devices (Domoticz)
+
+Typical usage:
+  python benchmark/EngineBenchmark.py
+  python benchmark/EngineBenchmark.py --rows 5256000 --shape long-csv --shape sqlite
+  python benchmark/EngineBenchmark.py --rows 1000000 --save-baseline
+  python benchmark/EngineBenchmark.py --hourly-selection
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import runpy
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+# Add engine to path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import DataPrepareEngine as engine  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "EngineBenchmarkBaseline.json"
+
+# Engine hooks which can be replaced by the data preparation scripts
+HOOKS = ["customPrepareDataPre", "customPrepareDataPost", "readInputFile"]
+
+# Changes below these amounts are considered noise and never flagged
+MIN_SECONDS_CHANGE = 0.05
+MIN_MEMORY_CHANGE = 1024**2
+
+
+def timestamps(rows: int, freq: str) -> pd.DatetimeIndex:
+    """Return consecutive timestamps starting at 1 January 2019."""
+    return pd.date_range("2019-01-01", periods=rows, freq=freq)
+
+
+def readings(rows: int, seed: int) -> np.ndarray:
+    """Return increasing meter readings (kWh) with random usage per interval."""
+    rng = np.random.default_rng(seed)
+    return np.round(1000 + np.cumsum(rng.random(rows) * 0.25), 3)
+
+
+def generate_long_csv(path: Path, rows: int) -> Path:
+    """Fluvius quarter hour export: a row per interval and register, local dates and decimal comma."""
+    registers = ["Afname Dag", "Afname Nacht", "Injectie Dag", "Injectie Nacht"]
+    intervals = -(-rows // len(registers))
+    start = np.repeat(timestamps(intervals, "15min"), len(registers))[:rows]
+    end = start + pd.Timedelta(minutes=15)
+    rng = np.random.default_rng(1)
+    pd.DataFrame(
+        {
+            "Van datum": start.strftime("%d-%m-%Y"),
+            "Van tijdstip": start.strftime("%H:%M:%S"),
+            "Tot datum": end.strftime("%d-%m-%Y"),
+            "Tot tijdstip": end.strftime("%H:%M:%S"),
+            "EAN": '="123456879123456789"',
+            "Meter": "1SAG12345678",
+            "Metertype": "Digitale Meter",
+            "Register": np.resize(registers, rows),
+            "Volume": np.round(rng.random(rows) * 0.5, 3),
+            "Eenheid": "kWh",
+            "Validatiestatus": "Geen verbruik",
+        }
+    ).to_csv(path, sep=";", decimal=",", index=False)
+    return path
+
+
+def generate_wide_csv(path: Path, rows: int) -> Path:
+    """Enel Distribuzione export: a row per day with a column per quarter hour (rows counts the values)."""
+    days = timestamps(max(1, -(-rows // 96)), "D")
+    columns = [
+        f"{start:%H:%M}-{end:%H:%M}".replace("-00:00", "-24:00")
+        for start, end in zip(
+            timestamps(96, "15min"), timestamps(96, "15min") + pd.Timedelta(minutes=15)
+        )
+    ]
+    rng = np.random.default_rng(2)
+    data = pd.DataFrame(
+        np.round(rng.random((len(days), len(columns))) * 0.3, 3), columns=columns
+    )
+    data.insert(0, "Giorno", days.strftime("%d/%m/%Y"))
+    data.to_csv(path, sep=";", decimal=",", index=False)
+    return path
+
+
+def generate_nested_json(path: Path, rows: int) -> Path:
+    """GivEnergy meter data: nested records every 5 minutes with daily and total readings."""
+    times = timestamps(rows, "5min").strftime("%Y-%m-%dT%H:%M:%SZ")
+    solar, gridImport, gridExport = (
+        readings(rows, 3),
+        readings(rows, 4),
+        readings(rows, 5),
+    )
+    records = [
+        {
+            "time": times[i],
+            "status": "NORMAL",
+            "power": {"grid": {"voltage": 230.0, "power": -10}},
+            "today": {
+                "solar": 0,
+                "grid": {"import": 0, "export": 0},
+                "battery": {"charge": 1.5, "discharge": 1.2},
+            },
+            "total": {
+                "solar": solar[i],
+                "grid": {"import": gridImport[i], "export": gridExport[i]},
+            },
+            "is_metered": True,
+        }
+        for i in range(rows)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"data": records, "links": {}, "meta": {}}, f)
+    return path
+
+
+def generate_xlsx(path: Path, rows: int) -> Path:
+    """P1mon history workbook: hourly readings in local time and a small daily sheet."""
+    columns = ["VERBR_KWH_181", "VERBR_KWH_182", "GELVR_KWH_281", "GELVR_KWH_282"]
+
+    def history(sheetRows: int, freq: str) -> pd.DataFrame:
+        data = {"TIMESTAMP": timestamps(sheetRows, freq).strftime("%Y-%m-%d %H:%M:%S")}
+        for seed, column in enumerate(columns):
+            data[column] = readings(sheetRows, seed)
+        data["TARIEFCODE"] = "P"
+        data["VERBR_GAS_2421"] = readings(sheetRows, 9)
+        return pd.DataFrame(data)
+
+    with pd.ExcelWriter(path) as writer:
+        history(max(1, rows // 24), "D").to_excel(
+            writer, sheet_name="e_history_dag", index=False
+        )
+        history(rows, "h").to_excel(writer, sheet_name="e_history_uur", index=False)
+    return path
+
+
+def generate_sqlite(path: Path, rows: int) -> Path:
+    """Domoticz database: the meter table with 5 minute readings of 20 devices."""
+    devices = 20
+    intervals = -(-rows // devices)
+    dates = np.repeat(timestamps(intervals, "5min"), devices)[:rows]
+    data = pd.DataFrame(
+        {
+            "DeviceRowID": np.resize(np.arange(1, devices + 1), rows),
+            "Value": np.arange(rows, dtype=np.int64) * 7 // devices,
+            "Usage": 0,
+            "Price": 0.0,
+            "Date": dates.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    )
+    if path.exists():
+        path.unlink()
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        conn.execute(
+            "CREATE TABLE [Meter] ([DeviceRowID] BIGINT NOT NULL, [Value] BIGINT NOT NULL, "
+            "[Usage] INTEGER DEFAULT 0, [Price] FLOAT DEFAULT 0, [Date] DATETIME)"
+        )
+        data.to_sql("Meter", conn, if_exists="append", index=False)
+        conn.commit()
+    return path
+
+
+# Input shape: (data preparation script, input file name, generator)
+SHAPES: dict[str, tuple[str, str, Callable[[Path, int], Path]]] = {
+    "long-csv": ("Fluvius/FluviusDataPrepare.py", "long.csv", generate_long_csv),
+    "wide-csv": (
+        "Enel Distribuzione/EnelDistribuzioneDataPrepare.py",
+        "wide.csv",
+        generate_wide_csv,
+    ),
+    "nested-json": (
+        "GivEnergy/GivEnergyDataPrepare.py",
+        "nested.json",
+        generate_nested_json,
+    ),
+    "xlsx": ("P1mon/P1MonDataPrepare.py", "history.xlsx", generate_xlsx),
+    "sqlite": ("Domoticz/DomoticzDataPrepare.py", "domoticz.db", generate_sqlite),
+}
+
+
+def load_provider_settings(script: Path, defaults: dict) -> None:
+    """Reset the engine settings and hooks and apply the settings and hooks of the provider script."""
+    for name, value in defaults.items():
+        setattr(engine, name, value)
+    namespace = runpy.run_path(str(script), run_name="__benchmark__")
+    # The scripts install their hooks when run as main, install them here
+    for hook in HOOKS:
+        if callable(namespace.get(hook)):
+            setattr(engine, hook, namespace[hook])
+
+
+def run_shape(inputFile: Path, outputDir: Path) -> dict:
+    """Process the input file with profiling enabled and return the statistics per stage."""
+    engine.inputFileUseCache = False
+    engine.profileMode = True
+    engine.profileStages = {}
+
+    outputDir.mkdir(parents=True, exist_ok=True)
+    currentDir = os.getcwd()
+    os.chdir(outputDir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with engine.profileStage("total"):
+                engine.generateImportDataFiles(str(inputFile))
+    finally:
+        os.chdir(currentDir)
+        engine.profileMode = False
+
+    return {
+        stage.name: {
+            "seconds": stage.seconds,
+            "rowsPerSecond": stage.rowsPerSecond(),
+            "peakMemoryBytes": stage.peakMemory,
+        }
+        for stage in engine.profileStages.values()
+    }
+
+
+def benchmark_hourly_selection(rows: int) -> None:
+    """Compare the hourly selection with the original per-row implementation on ten second readings."""
+    engine.dateTimeColumnName = "_DateTime"
+    dataFrame = pd.DataFrame(
+        {
+            "_DateTime": np.arange(1700000000, 1700000000 + 10 * rows, 10),
+            "value": np.round(np.arange(rows) * 0.001, 3),
+        }
+    )
+
+    start = time.perf_counter()
+    df = dataFrame.copy()
+    df["_DateTime"] = df["_DateTime"].apply(lambda x: (x // 3600) * 3600)
+    expected = df.groupby("_DateTime", as_index=False)["value"].first()
+    referenceTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = engine.selectHourlyData(dataFrame, "value")
+    vectorizedTime = time.perf_counter() - start
+
+    if actual.to_csv(index=False) != expected.to_csv(index=False):
+        raise SystemExit("The hourly selection differs from the per-row implementation")
+    print(
+        f"Hourly selection of {rows:,} rows: per-row {referenceTime * 1000:.1f}ms, "
+        f"vectorized {vectorizedTime * 1000:.1f}ms ({referenceTime / vectorizedTime:.1f}x)"
+    )
+
+
+def best_of(runs: list[dict]) -> dict:
+    """Combine repeated runs, per stage the lowest time and memory are kept."""
+    stages = {}
+    for run in runs:
+        for name, stats in run.items():
+            if name not in stages:
+                stages[name] = dict(stats)
+                continue
+            best = stages[name]
+            if stats["seconds"] < best["seconds"]:
+                best["seconds"] = stats["seconds"]
+                best["rowsPerSecond"] = stats["rowsPerSecond"]
+            best["peakMemoryBytes"] = min(
+                best["peakMemoryBytes"], stats["peakMemoryBytes"]
+            )
+    return stages
+
+
+def compare(stats: dict, baseline: dict | None, tolerance: float) -> str:
+    """Return the change compared to the baseline, flagged in case of a regression."""
+    if baseline is None:
+        return ""
+    timeChange = (
+        stats["seconds"] / baseline["seconds"] - 1 if baseline["seconds"] else 0
+    )
+    memoryChange = (
+        stats["peakMemoryBytes"] / baseline["peakMemoryBytes"] - 1
+        if baseline["peakMemoryBytes"]
+        else 0
+    )
+    slower = (
+        timeChange > tolerance
+        and stats["seconds"] - baseline["seconds"] > MIN_SECONDS_CHANGE
+    )
+    larger = (
+        memoryChange > tolerance
+        and stats["peakMemoryBytes"] - baseline["peakMemoryBytes"] > MIN_MEMORY_CHANGE
+    )
+    flag = " REGRESSION" if slower or larger else ""
+    return f"{timeChange:>+7.0%} {memoryChange:>+7.0%}{flag}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the engine on synthetic input files of every input shape."
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=100_000,
+        help="Number of rows (values for wide-csv) of the generated input files",
+    )
+    parser.add_argument(
+        "--shape",
+        action="append",
+        choices=list(SHAPES),
+        help="Input shape to benchmark, can be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Number of runs per shape (per stage the best result is reported)",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help="Baseline file to compare against (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store the results of the benchmarked shapes in the baseline instead of comparing against them",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed relative increase of time and peak memory before a regression is flagged",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=None,
+        help="Directory for the generated files, reused when the number of rows matches (default: temporary)",
+    )
+    parser.add_argument(
+        "--hourly-selection",
+        action="store_true",
+        help="Only compare the hourly selection with the original per-row implementation (--rows readings)",
+    )
+    args = parser.parse_args()
+
+    if args.hourly_selection:
+        benchmark_hourly_selection(args.rows)
+        return
+
+    defaults = {
+        name: value
+        for name, value in vars(engine).items()
+        if name.startswith("inputFile")
+        or name in HOOKS
+        or name in ("energyProviderName", "dateTimeColumnName", "outputFiles")
+    }
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+
+    with contextlib.ExitStack() as stack:
+        workDir = args.work_dir or Path(
+            stack.enter_context(tempfile.TemporaryDirectory())
+        )
+        workDir.mkdir(parents=True, exist_ok=True)
+
+        results = {}
+        for shape in args.shape or list(SHAPES):
+            script, fileName, generate = SHAPES[shape]
+            inputFile = workDir / f"{args.rows}_{fileName}"
+            if not inputFile.exists():
+                print(f"Generating {shape} input with {args.rows:,} rows")
+                generate(inputFile, args.rows)
+
+            load_provider_settings(ROOT / script, defaults)
+            runs = [
+                run_shape(inputFile, workDir / f"{shape}_output")
+                for _ in range(args.repeat)
+            ]
+            results[shape] = {"rows": args.rows, "stages": best_of(runs)}
+
+    print(
+        f"\n{'Shape':<12} {'Stage':<30} {'Time (s)':>10} {'Rows/s':>12} {'Peak (MB)':>10}"
+        + ("" if args.save_baseline else f" {'Time':>7} {'Memory':>7}")
+    )
+    regressions = 0
+    for shape, result in results.items():
+        shapeBaseline = None if args.save_baseline else baseline.get(shape)
+        if shapeBaseline is not None and shapeBaseline["rows"] != result["rows"]:
+            print(
+                f"{shape:<12} baseline has {shapeBaseline['rows']:,} rows, not compared"
+            )
+            shapeBaseline = None
+        for name, stats in result["stages"].items():
+            change = compare(
+                stats,
+                shapeBaseline["stages"].get(name) if shapeBaseline else None,
+                args.tolerance,
+            )
+            regressions += change.endswith("REGRESSION")
+            rowsPerSecond = (
+                "-"
+                if stats["rowsPerSecond"] is None
+                else f"{stats['rowsPerSecond']:,.0f}"
+            )
+            print(
+                f"{shape:<12} {name:<30} {stats['seconds']:>10.3f} {rowsPerSecond:>12} "
+                f"{stats['peakMemoryBytes'] / 1024**2:>10.1f} {change}"
+            )
+
+    if args.save_baseline:
+        # Only the benchmarked shapes are replaced in the baseline
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2), encoding="utf-8")
+        print(f"\nBaseline written to: {args.baseline}")
+    elif regressions:
+        print(f"\n{regressions} regression(s) compared to the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
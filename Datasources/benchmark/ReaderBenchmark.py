@@ -0,0 +1,138 @@
+"""
+CSV reader benchmark for the DataPrepare engine
+
+Reads the csv sample files of all the data preparation scripts with every csv reader engine
+(python, c and pyarrow) and reports the parse time, the speedup compared to the python engine
+and whether the parsed data is identical to the data of the python engine.
+
+Typical usage:
+  python benchmark/ReaderBenchmark.py
+  python benchmark/ReaderBenchmark.py --repeat 10 --provider Fluvius
+"""
+
+import argparse
+import glob
+import runpy
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Add engine to path
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import DataPrepareEngine as engine  # noqa: E402
+
+READER_ENGINES = ["python", "c", "pyarrow"]
+
+
+def find_sample_files(provider_dir: Path) -> list[Path]:
+    """Return the csv input sample files of a provider (the generated output samples are skipped)."""
+    return [
+        Path(f)
+        for f in sorted(
+            glob.glob(
+                str(provider_dir / "Sample files" / "**" / "*.csv"), recursive=True
+            )
+        )
+        if not f.endswith("_resolution.csv")
+    ]
+
+
+def load_provider_settings(script: Path, defaults: dict) -> None:
+    """Reset the engine globals and apply the settings of the provider script."""
+    for name, value in defaults.items():
+        setattr(engine, name, value)
+    runpy.run_path(str(script), run_name="__benchmark__")
+    # Some scripts replace the reader, the benchmark always uses the engine reader
+    engine.readInputFile = engine.engineReadInputFile
+
+
+def time_reader(
+    file_name: Path, reader_engine: str, repeat: int
+) -> tuple[float, pd.DataFrame | None]:
+    """Return the best parse time (seconds) of the reader engine and the parsed data."""
+    engine.inputFileCsvReaderEngine = reader_engine
+    best = float("inf")
+    data = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            data = engine.readCsvFile(str(file_name))
+        except Exception:
+            return float("nan"), None
+        best = min(best, time.perf_counter() - start)
+    return best, data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the csv reader engines on the sample files."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of runs per file (best time is reported)",
+    )
+    parser.add_argument(
+        "--provider",
+        default="*",
+        help="Name (wildcards allowed) of the provider directory",
+    )
+    args = parser.parse_args()
+
+    defaults = {
+        name: value
+        for name, value in vars(engine).items()
+        if name.startswith("inputFile")
+    }
+    results = []
+    for script in sorted(ROOT.glob(f"{args.provider}/*DataPrepare*.py")):
+        load_provider_settings(script, defaults)
+        if engine.inputFileNameExtension != ".csv":
+            continue
+
+        for sample in find_sample_files(script.parent):
+            timings = {}
+            data = {}
+            for reader_engine in READER_ENGINES:
+                timings[reader_engine], data[reader_engine] = time_reader(
+                    sample, reader_engine, args.repeat
+                )
+            if data["python"] is None:
+                # The sample is not a plain csv file for this script (custom reader)
+                continue
+            identical = all(
+                data[reader_engine] is None
+                or data[reader_engine].equals(data["python"])
+                for reader_engine in READER_ENGINES
+            )
+            results.append(
+                (script.stem, sample.name, len(data["python"]), timings, identical)
+            )
+
+    print(
+        f"{'Script':<36} {'File':<45} {'Rows':>7} {'python':>9} {'c':>9} {'pyarrow':>9} {'c x':>6} {'Same':>5}"
+    )
+    total = dict.fromkeys(READER_ENGINES, 0.0)
+    for script_name, file_name, rows, timings, identical in results:
+        for reader_engine in READER_ENGINES:
+            if timings[reader_engine] == timings[reader_engine]:
+                total[reader_engine] += timings[reader_engine]
+        print(
+            f"{script_name[:36]:<36} {file_name[:45]:<45} {rows:>7} "
+            + " ".join(f"{timings[e] * 1000:>7.1f}ms" for e in READER_ENGINES)
+            + f" {timings['python'] / timings['c']:>5.1f}x {'yes' if identical else 'NO':>5}"
+        )
+    print(
+        f"{'Total':<90} "
+        + " ".join(f"{total[e] * 1000:>7.1f}ms" for e in READER_ENGINES)
+        + f" {total['python'] / total['c']:>5.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Startup benchmark for the data preparation scripts
+
+Runs every data preparation script with --help in a fresh interpreter (python -X importtime) and reports
+the wall time and the import time of the script. The heavy modules (pandas, numpy, the Excel readers, ...)
+are only imported when input files are processed, a script which imports one of them to show the help or
+takes more import time than the budget is flagged (exit code 1).
+
+Typical usage:
+  python benchmark/StartupBenchmark.py
+  python benchmark/StartupBenchmark.py --budget 0.5 --provider Fluvius --provider NEM12 --top 10
+"""
+
+import argparse
+import glob
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules which are only needed to process input files
+HEAVY_MODULES = [
+    "numpy",
+    "pandas",
+    "pyarrow",
+    "openpyxl",
+    "python_calamine",
+    "sqlite3",
+    "tzlocal",
+]
+
+
+def find_scripts(providers: list[str] | None) -> list[Path]:
+    """Return the data preparation scripts of the given providers (default: all scripts and the template)."""
+    if providers:
+        scripts = [
+            Path(f)
+            for provider in providers
+            for f in sorted(glob.glob(str(ROOT / provider / "*DataPrepare.py")))
+        ]
+    else:
+        scripts = [
+            Path(f) for f in sorted(glob.glob(str(ROOT / "*" / "*DataPrepare.py")))
+        ]
+        scripts.append(ROOT / "TemplateDataPrepare.py")
+    return scripts
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, int, int]]:
+    """Return (module, nesting level, self time, cumulative time) of the -X importtime lines, times in us."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        selfTime, cumulativeTime, name = line[len("import time:") :].split("|")
+        level = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        imports.append((name.strip(), level, int(selfTime), int(cumulativeTime)))
+    return imports
+
+
+def measure_script(script: Path) -> dict:
+    """Run the script with --help in a fresh interpreter and return the wall time and imports."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(script), "--help"],
+        cwd=script.parent,
+        capture_output=True,
+        text=True,
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"{script} --help failed:\n{result.stderr[-2000:]}")
+    imports = parse_importtime(result.stderr)
+    return {
+        "seconds": seconds,
+        "importSeconds": sum(
+            cumulative for _, level, _, cumulative in imports if level == 0
+        )
+        / 1e6,
+        "imports": imports,
+    }
+
+
+def best_of(runs: list[dict]) -> dict:
+    """Combine repeated runs of a script, the run with the lowest import time is kept."""
+    best = min(runs, key=lambda run: run["importSeconds"])
+    return {**best, "seconds": min(run["seconds"] for run in runs)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the startup (--help) of the data preparation scripts."
+    )
+    parser.add_argument(
+        "--provider",
+        action="append",
+        help="Directory name of the provider to benchmark, can be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of runs per script (the best result is reported)",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.25,
+        help="Allowed import time (seconds) of a script before it is flagged (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="Show the given number of imports with the highest self time of the slowest script",
+    )
+    args = parser.parse_args()
+
+    scripts = find_scripts(args.provider)
+    if not scripts:
+        parser.error("no data preparation scripts found")
+
+    print(f"{'Script':<40} {'Wall':>8} {'Imports':>8}")
+    failed = False
+    results = {}
+    for script in scripts:
+        stats = best_of([measure_script(script) for _ in range(max(args.repeat, 1))])
+        results[script] = stats
+        heavy = sorted(
+            {name for name, _, _, _ in stats["imports"]} & set(HEAVY_MODULES)
+        )
+        flags = []
+        if stats["importSeconds"] > args.budget:
+            flags.append("OVER BUDGET")
+        if heavy:
+            flags.append(f"IMPORTS {', '.join(heavy)}")
+        failed |= bool(flags)
+        print(
+            f"{script.stem:<40} {stats['seconds']:>7.3f}s {stats['importSeconds']:>7.3f}s"
+            f"{' ' + ' '.join(flags) if flags else ''}"
+        )
+
+    if args.top > 0:
+        script, stats = max(results.items(), key=lambda item: item[1]["importSeconds"])
+        print(f"\nHighest self import time of {script.stem}:")
+        for name, _, selfTime, cumulativeTime in sorted(
+            stats["imports"], key=lambda item: item[2], reverse=True
+        )[: args.top]:
+            print(
+                f"  {name:<40} {selfTime / 1e3:>8.1f}ms {cumulativeTime / 1e3:>8.1f}ms"
+            )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2273 @@
+# test_DataPrepareEngine.py
+# Unit tests for DataPrepareEngine.py
+# Usage for coverage check: python -m pytest test --cov=DataPrepareEngine --cov-report=term-missing
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import DataPrepareEngine as engine
+import ImportData
+from DataPrepareEngine import DataFilter, IntervalMode, OutputFileDefinition
+
+DATASOURCES = Path(__file__).resolve().parent.parent
+
+# ---------- helpers ----------
+
+
+def _configure_engine(monkeypatch, **settings):
+    """Set the engine globals (restored by monkeypatch after the test)."""
+    defaults = {
+        "inputFileNameExtension": ".csv",
+        "inputFileDateColumnName": "date",
+        "inputFileTimeColumnName": "",
+        "inputFileDateTimeColumnFormat": "%Y-%m-%d %H:%M",
+        "inputFileDateTimeIsUTC": True,
+        "inputFileDateTimeOnlyUseHourly": False,
+        "inputFileDataSeparator": ",",
+        "inputFileDataDecimal": ".",
+        "inputFileHasHeaderNameRow": True,
+        "inputFileNumHeaderRows": 0,
+        "inputFileNumFooterRows": 0,
+        "inputFileJsonPath": [],
+        "inputFileReadRequiredColumnsOnly": True,
+        "inputFileExtraColumnNames": None,
+        "inputFileDbReadRequiredRowsOnly": True,
+        "inputFileChunkSize": 0,
+        "inputFileCsvReaderEngine": "c",
+        "inputFileExcelReaderEngine": "calamine",
+        "inputFileExcelSheetName": 0,
+        "inputFileNumReadJobs": 1,
+        "inputFileUseCache": False,
+        "incrementalMode": False,
+        "outputFiles": [],
+    }
+    defaults.update(settings)
+    for name, value in defaults.items():
+        monkeypatch.setattr(engine, name, value)
+
+
+def _write_readings_csv(path: Path, periods: int = 50, freq: str = "15min") -> Path:
+    """Write a long format csv file with readings for two registers."""
+    dates = pd.date_range("2024-01-01", periods=periods, freq=freq)
+    rows = []
+    for i, date in enumerate(dates):
+        rows.append((date.strftime("%Y-%m-%d %H:%M"), "day", round(0.1 * i + 0.25, 3)))
+        rows.append((date.strftime("%Y-%m-%d %H:%M"), "night", i % 7))
+    pd.DataFrame(rows, columns=["date", "register", "value"]).to_csv(path, index=False)
+    return path
+
+
+def _generate(monkeypatch, directory: Path, inputFile: Path, **settings):
+    """Generate the output files in the given directory and return their contents."""
+    _configure_engine(monkeypatch, **settings)
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    engine.generateImportDataFiles(str(inputFile))
+    return {
+        name: pd.read_csv(directory / name, header=None)
+        for name in sorted(os.listdir(directory))
+    }
+
+
+OUTPUT_FILES = [
+    OutputFileDefinition(
+        "usage_high_resolution.csv",
+        "value",
+        [DataFilter("register", "^day$", True)],
+        IntervalMode.USAGE,
+        initialValue=100,
+    ),
+    OutputFileDefinition(
+        "end_high_resolution.csv",
+        "value",
+        [DataFilter("register", "^night$", True)],
+        IntervalMode.READING_END_INTERVAL,
+    ),
+    OutputFileDefinition(
+        "start_high_resolution.csv",
+        "value",
+        [DataFilter("register", "^day$", True)],
+    ),
+]
+
+
+# ---------- streaming (chunked) processing ----------
+
+
+@pytest.mark.parametrize("hourly", [False, True])
+@pytest.mark.parametrize("chunkSize", [1, 3, 16])
+def test_streaming_matches_in_memory_processing(
+    tmp_path: Path, monkeypatch, chunkSize, hourly
+):
+    inputFile = _write_readings_csv(tmp_path / "input.csv")
+    settings = {"outputFiles": OUTPUT_FILES, "inputFileDateTimeOnlyUseHourly": hourly}
+
+    expected = _generate(monkeypatch, tmp_path / "memory", inputFile, **settings)
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "streaming",
+        inputFile,
+        inputFileChunkSize=chunkSize,
+        **settings,
+    )
+
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name], check_dtype=False)
+
+
+def test_streaming_skips_footer_rows(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    with open(inputFile, "a") as f:
+        f.write("Created by a test\n\nTotal,,\n")
+    settings = {"outputFiles": OUTPUT_FILES[:1], "inputFileNumFooterRows": 3}
+
+    expected = _generate(monkeypatch, tmp_path / "memory", inputFile, **settings)
+    actual = _generate(
+        monkeypatch, tmp_path / "streaming", inputFile, inputFileChunkSize=4, **settings
+    )
+
+    pd.testing.assert_frame_equal(
+        actual["usage_high_resolution.csv"],
+        expected["usage_high_resolution.csv"],
+        check_dtype=False,
+    )
+
+
+def test_streaming_single_row_is_written_as_is(tmp_path: Path, monkeypatch):
+    inputFile = tmp_path / "input.csv"
+    inputFile.write_text("date,register,value\n2024-01-01 00:00,day,1.5\n")
+
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "streaming",
+        inputFile,
+        outputFiles=OUTPUT_FILES[:1],
+        inputFileChunkSize=10,
+    )
+
+    assert actual["usage_high_resolution.csv"].values.tolist() == [[1704067200, 1.5]]
+
+
+@pytest.mark.parametrize("chunkSize", [1, 4, 30])
+def test_streaming_orders_unordered_data(tmp_path: Path, monkeypatch, chunkSize):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=40)
+    data = pd.read_csv(inputFile)
+    # Blocks of readings in random order and a few readings swapped within a block
+    blocks = np.random.default_rng(1).permutation(np.arange(len(data)) // 10)
+    order = np.argsort(blocks, kind="stable")
+    order[[3, 4, 41, 42]] = order[[4, 3, 42, 41]]
+    data.iloc[order].to_csv(inputFile, index=False)
+    settings = {"outputFiles": OUTPUT_FILES}
+
+    expected = _generate(monkeypatch, tmp_path / "memory", inputFile, **settings)
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "streaming",
+        inputFile,
+        inputFileChunkSize=chunkSize,
+        **settings,
+    )
+
+    for name in expected:
+        assert (tmp_path / "streaming" / name).read_bytes() == (
+            tmp_path / "memory" / name
+        ).read_bytes()
+    assert list(actual) == list(expected)
+
+
+@pytest.mark.parametrize(
+    "script, inputFiles, prefix, chunkSize",
+    [
+        # Integer values
+        ("Domoticz/DomoticzDataPrepare.py", "domoticz.db", "", 7),
+        ("Domoticz/DomoticzDataPrepare.py", "domoticz.db", "", 1000),
+        # Days in random order
+        ("Shelly EM3/ShellyEM3DataPrepare.py", "em_data_phaseA.csv", "phaseA", 1000),
+    ],
+)
+def test_streamed_sample_output_is_identical(
+    tmp_path: Path, monkeypatch, script, inputFiles, prefix, chunkSize
+):
+    sampleDir = (DATASOURCES / script).parent / "Sample files"
+    providerEngine = engine.Engine(
+        engine.ProviderConfig.fromProviderScript(str(DATASOURCES / script))
+    )
+    monkeypatch.chdir(tmp_path)
+
+    assert providerEngine.generateImportDataFiles(
+        str(sampleDir / inputFiles),
+        prefix=prefix,
+        arguments=["--chunk-size", str(chunkSize)],
+    )
+
+    assert os.listdir(tmp_path)
+    for outputFile in os.listdir(tmp_path):
+        assert (tmp_path / outputFile).read_bytes() == (
+            sampleDir / outputFile
+        ).read_bytes()
+
+
+def test_streaming_is_refused_for_hooks_which_combine_rows(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    _configure_engine(monkeypatch, outputFiles=OUTPUT_FILES[:1], inputFileChunkSize=4)
+    monkeypatch.setattr(engine, "customPrepareDataPost", lambda df: df.iloc[1:])
+    output = tmp_path / "output"
+    output.mkdir()
+    monkeypatch.chdir(output)
+
+    assert not engine.generateImportDataFiles(str(inputFile))
+    assert os.listdir(output) == []
+
+    # Hooks which only manipulate individual rows can be streamed
+    monkeypatch.setattr(engine, "customPrepareDataPost", lambda df: df.assign(x=1))
+    monkeypatch.setattr(engine, "customPrepareDataRowWise", True)
+    assert engine.generateImportDataFiles(str(inputFile))
+    assert os.listdir(output) == ["usage_high_resolution.csv"]
+
+
+def _write_dst_end_csv(path: Path, start: str, end: str, freq: str = "15min") -> Path:
+    """Write local (Europe/Amsterdam) readings for two registers, the repeated hour at the end of DST included."""
+    dates = pd.date_range(
+        start, end, freq=freq, tz="Europe/Amsterdam", inclusive="left"
+    )
+    rows = []
+    for date in dates:
+        for register, value in (("day", date.timestamp() / 3600), ("night", 1.0)):
+            rows.append((date.strftime("%Y-%m-%d %H:%M"), register, round(value, 3)))
+    pd.DataFrame(rows, columns=["date", "register", "value"]).to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("freq", ["15min", "h"])
+@pytest.mark.parametrize("chunkSize", [3, 10, 11, 12, 13, 14])
+def test_streaming_splits_the_repeated_hour_at_the_end_of_dst(
+    tmp_path: Path, monkeypatch, freq, chunkSize
+):
+    inputFile = _write_dst_end_csv(
+        tmp_path / "input.csv", "2024-10-27 00:00", "2024-10-27 05:00", freq
+    )
+    settings = {
+        "outputFiles": OUTPUT_FILES,
+        "inputFileDateTimeIsUTC": False,
+        "inputFileTimeZoneName": "Europe/Amsterdam",
+    }
+
+    expected = _generate(monkeypatch, tmp_path / "memory", inputFile, **settings)
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "streaming",
+        inputFile,
+        inputFileChunkSize=chunkSize,
+        **settings,
+    )
+
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(
+            actual[name], expected[name], check_dtype=False, check_exact=True
+        )
+    # Every quarter of an hour (hour) of the 6 hours of the day (the repeated hour included)
+    usage = expected["usage_high_resolution.csv"][0]
+    assert usage.is_monotonic_increasing and usage.is_unique
+    assert len(usage) == (24 if freq == "15min" else 6) + 1
+
+
+# ---------- csv reader engines ----------
+
+
+def _write_semicolon_csv(path: Path) -> Path:
+    """Write a csv file with decimal comma values, a quoted numeric column and a footer."""
+    path.write_text(
+        "date;register;value;quoted\n"
+        '2024-01-01 00:00;day;1,5;"0,25"\n'
+        '2024-01-01 00:15;night;2,75;"1"\n'
+        '2024-01-01 00:30;day;;"2,5"\n'
+        "Total;;4,25;\n"
+    )
+    return path
+
+
+@pytest.mark.parametrize("readerEngine", ["c", "pyarrow"])
+def test_fast_csv_reader_matches_python_reader(
+    tmp_path: Path, monkeypatch, readerEngine
+):
+    if readerEngine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    inputFile = _write_semicolon_csv(tmp_path / "input.csv")
+    _configure_engine(
+        monkeypatch,
+        inputFileDataSeparator=";",
+        inputFileDataDecimal=",",
+        inputFileNumFooterRows=1,
+    )
+
+    monkeypatch.setattr(engine, "inputFileCsvReaderEngine", "python")
+    expected = engine.readCsvFile(str(inputFile))
+    monkeypatch.setattr(engine, "inputFileCsvReaderEngine", readerEngine)
+    actual = engine.readCsvFile(str(inputFile))
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert actual["quoted"].tolist() == [0.25, 1.0, 2.5]
+
+
+@pytest.mark.parametrize("chunkSize", [0, 1])
+def test_footer_rows_are_records_not_lines(tmp_path: Path, monkeypatch, chunkSize):
+    inputFile = tmp_path / "input.csv"
+    inputFile.write_text(
+        "date,register,value,note\n"
+        '2024-01-01 00:00,day,1.5,"reading\nestimated"\n'
+        "2024-01-01 00:15,day,4.5,\n"
+        "Total,,6,\n"
+    )
+    _configure_engine(
+        monkeypatch, inputFileNumFooterRows=1, inputFileChunkSize=chunkSize
+    )
+
+    monkeypatch.setattr(engine, "inputFileCsvReaderEngine", "python")
+    expected = engine.readCsvFile(str(inputFile))
+    monkeypatch.setattr(engine, "inputFileCsvReaderEngine", "c")
+    actual = (
+        pd.concat(engine.readInputFileChunks(str(inputFile)))
+        if chunkSize
+        else engine.readCsvFile(str(inputFile))
+    )
+
+    assert actual["date"].tolist() == ["2024-01-01 00:00", "2024-01-01 00:15"]
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_csv_reader_falls_back_to_python_reader(tmp_path: Path, monkeypatch, capsys):
+    inputFile = tmp_path / "input.csv"
+    inputFile.write_text("date::value\n2024-01-01 00:00::1.5\n")
+    _configure_engine(monkeypatch, inputFileDataSeparator="::")
+
+    df = engine.readCsvFile(str(inputFile))
+
+    assert df.to_dict("records") == [{"date": "2024-01-01 00:00", "value": 1.5}]
+    assert "Could not read the file with the c reader" in capsys.readouterr().out
+
+
+def test_csv_reader_rejects_unknown_engine(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=1)
+    _configure_engine(monkeypatch, inputFileCsvReaderEngine="fast")
+
+    with pytest.raises(Exception, match="Unsupported csv reader engine"):
+        engine.readCsvFile(str(inputFile))
+
+
+# ---------- excel reader ----------
+
+
+def _write_readings_xlsx(path: Path, periods: int = 30) -> Path:
+    """Write a readings workbook with header and footer rows and empty rows."""
+    openpyxl = pytest.importorskip("openpyxl")
+    data = pd.read_csv(_write_readings_csv(path.with_suffix(".csv"), periods))
+    workbook = openpyxl.Workbook()
+    workbook.active.title = "other"
+    workbook.active.append(["not", "used"])
+    sheet = workbook.create_sheet("readings")
+    sheet.append(["Export of the readings"])
+    sheet.append(list(data.columns))
+    for i, row in enumerate(data.itertuples(index=False)):
+        sheet.append(list(row))
+        if i == 10:
+            sheet.append([])
+    sheet.append(["Total", "", data["value"].sum()])
+    sheet.append([])
+    workbook.save(path)
+    return path
+
+
+@pytest.mark.parametrize("readerEngine", ["calamine", "default"])
+@pytest.mark.parametrize("chunkSize", [1, 7, 100])
+def test_excel_chunks_match_reading_the_whole_sheet(
+    tmp_path: Path, monkeypatch, readerEngine, chunkSize
+):
+    if readerEngine == "calamine":
+        pytest.importorskip("python_calamine")
+    inputFile = _write_readings_xlsx(tmp_path / "input.xlsx")
+    _configure_engine(
+        monkeypatch,
+        inputFileNameExtension=".xlsx",
+        inputFileExcelSheetName="readings",
+        inputFileExcelReaderEngine=readerEngine,
+        inputFileNumHeaderRows=1,
+        inputFileNumFooterRows=1,
+        inputFileChunkSize=chunkSize,
+    )
+
+    expected = engine.readInputFile(str(inputFile))
+    chunks = list(engine.readInputFileChunks(str(inputFile)))
+
+    assert len(chunks) == -(-len(expected) // chunkSize)
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True), expected, check_dtype=False
+    )
+    assert len(expected) == 61 and expected["date"].isna().sum() == 1
+
+
+def test_excel_streaming_matches_in_memory_processing(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_xlsx(tmp_path / "input.xlsx")
+    settings = {
+        "outputFiles": OUTPUT_FILES,
+        "inputFileNameExtension": ".xlsx",
+        "inputFileExcelSheetName": 1,
+        "inputFileNumHeaderRows": 1,
+        "inputFileNumFooterRows": 1,
+    }
+
+    expected = _generate(monkeypatch, tmp_path / "memory", inputFile, **settings)
+    actual = _generate(
+        monkeypatch, tmp_path / "streaming", inputFile, inputFileChunkSize=8, **settings
+    )
+
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name], check_dtype=False)
+
+
+# ---------- json reader ----------
+
+
+def _readings_json(periods: int = 30) -> dict:
+    """Readings with nested fields, nested after the other fields like exported by an api."""
+    records = [
+        {
+            "time": f"2024-01-01T{i // 4:02d}:{i % 4 * 15:02d}:00Z",
+            "total": {"grid": {"import": round(0.1 * i, 3), "export": i}, "solar": i},
+            "status": "NORMAL" if i % 5 else "ERROR",
+            "arrays": [{"power": i}],
+        }
+        for i in range(periods)
+    ]
+    return {"meta": {"site": 1}, "data": records, "count": periods}
+
+
+@pytest.mark.parametrize(
+    ("document", "jsonPath"),
+    [
+        (_readings_json(), ["data"]),
+        (_readings_json()["data"], []),
+        (
+            {"energy": [{"values": _readings_json(3)["data"]}, {"values": None}]},
+            ["energy", "values"],
+        ),
+        ({"data": []}, ["data"]),
+        ({"data": [1.5, "text", None]}, ["data"]),
+    ],
+)
+@pytest.mark.parametrize("indent", [None, 4])
+def test_json_reader_matches_json_normalize(
+    tmp_path: Path, monkeypatch, document, jsonPath, indent
+):
+    inputFile = tmp_path / "input.json"
+    inputFile.write_text(json.dumps(document, indent=indent), encoding="utf-8")
+    _configure_engine(
+        monkeypatch, inputFileNameExtension=".json", inputFileJsonPath=jsonPath
+    )
+    monkeypatch.setattr(engine.JsonRecordReader, "blockSize", 5)
+    monkeypatch.setattr(engine, "jsonRecordBatchSize", 7)
+
+    pd.testing.assert_frame_equal(
+        engine.readInputFile(str(inputFile)),
+        pd.json_normalize(document, record_path=jsonPath or None),
+    )
+
+
+def test_json_reader_only_flattens_the_required_fields(tmp_path: Path):
+    record = _readings_json()["data"][0]
+
+    def isRequiredInputColumn(column: str) -> bool:
+        return column in ("time", "total.grid.import")
+
+    assert engine.flattenJsonRecord(record, isRequiredInputColumn) == {
+        "time": record["time"],
+        "total.grid.import": record["total"]["grid"]["import"],
+    }
+
+
+@pytest.mark.parametrize("jsonPath", [["values"], ["data", "missing"]])
+def test_json_reader_reports_a_missing_json_path(tmp_path: Path, monkeypatch, jsonPath):
+    inputFile = tmp_path / "input.json"
+    inputFile.write_text(json.dumps(_readings_json()), encoding="utf-8")
+    _configure_engine(
+        monkeypatch, inputFileNameExtension=".json", inputFileJsonPath=jsonPath
+    )
+
+    with pytest.raises(Exception, match="Json path not found"):
+        engine.readJsonFile(str(inputFile))
+
+
+@pytest.mark.parametrize("chunkSize", [1, 7, 100])
+def test_json_chunks_match_reading_the_whole_file(
+    tmp_path: Path, monkeypatch, chunkSize
+):
+    inputFile = tmp_path / "input.json"
+    inputFile.write_text(json.dumps(_readings_json(), indent=2), encoding="utf-8")
+    _configure_engine(
+        monkeypatch,
+        inputFileNameExtension=".json",
+        inputFileJsonPath=["data"],
+        inputFileChunkSize=chunkSize,
+    )
+
+    expected = engine.readInputFile(str(inputFile))
+    chunks = list(engine.readInputFileChunks(str(inputFile)))
+
+    assert len(chunks) == -(-len(expected) // chunkSize)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_json_streaming_matches_in_memory_processing(tmp_path: Path, monkeypatch):
+    inputFile = tmp_path / "input.json"
+    inputFile.write_text(json.dumps(_readings_json(periods=50)), encoding="utf-8")
+    settings = {
+        "outputFiles": [
+            OutputFileDefinition(
+                "elec_import_high_resolution.csv",
+                "total.grid.import",
+                [DataFilter("status", "^NORMAL$", True)],
+                IntervalMode.READING_START_INTERVAL,
+            ),
+            OutputFileDefinition(
+                "elec_solar_high_resolution.csv",
+                "total.solar",
+                [],
+                IntervalMode.READING_START_INTERVAL,
+            ),
+        ],
+        "inputFileNameExtension": ".json",
+        "inputFileJsonPath": ["data"],
+        "inputFileDateColumnName": "time",
+        "inputFileDateTimeColumnFormat": "%Y-%m-%dT%H:%M:%SZ",
+    }
+
+    expected = _generate(monkeypatch, tmp_path / "memory", inputFile, **settings)
+    actual = _generate(
+        monkeypatch, tmp_path / "streaming", inputFile, inputFileChunkSize=8, **settings
+    )
+
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name], check_dtype=False)
+
+
+# ---------- column projection ----------
+
+
+def _write_wide_readings_csv(path: Path, periods: int = 30) -> Path:
+    """Write a readings csv file with unused columns around the used columns."""
+    data = pd.read_csv(_write_readings_csv(path, periods=periods))
+    data.insert(0, "unused text", "x")
+    data.insert(2, "Unnamed: 2", 1.5)
+    data["unused value"] = range(len(data))
+    data.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("readerEngine", ["c", "pyarrow", "python"])
+@pytest.mark.parametrize("chunkSize", [0, 7])
+def test_only_required_columns_are_read(
+    tmp_path: Path, monkeypatch, readerEngine, chunkSize
+):
+    if readerEngine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    inputFile = _write_wide_readings_csv(tmp_path / "input.csv")
+    settings = {
+        "outputFiles": OUTPUT_FILES,
+        "inputFileCsvReaderEngine": readerEngine,
+        "inputFileChunkSize": chunkSize,
+    }
+
+    expected = _generate(
+        monkeypatch,
+        tmp_path / "all",
+        inputFile,
+        inputFileReadRequiredColumnsOnly=False,
+        **settings,
+    )
+    actual = _generate(monkeypatch, tmp_path / "required", inputFile, **settings)
+
+    assert list(engine.readInputFile(str(inputFile)).columns) == [
+        "date",
+        "register",
+        "value",
+    ]
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name])
+
+
+def test_required_columns_resolve_wildcards_and_indexes(tmp_path: Path, monkeypatch):
+    inputFile = tmp_path / "input.csv"
+    inputFile.write_text("2024-01-01 00:00,a,1,b,2.5,c\n2024-01-01 00:15,a,2,b,3.5,c\n")
+    _configure_engine(
+        monkeypatch,
+        inputFileHasHeaderNameRow=False,
+        inputFileDateColumnName=0,
+        outputFiles=[OutputFileDefinition("value_high_resolution.csv", 4, [])],
+    )
+    assert list(engine.readInputFile(str(inputFile)).columns) == [0, 4]
+
+    _configure_engine(
+        monkeypatch,
+        outputFiles=[OutputFileDefinition("value_high_resolution.csv", "val*", [])],
+    )
+    inputFile = _write_wide_readings_csv(tmp_path / "wide.csv")
+    assert list(engine.readInputFile(str(inputFile)).columns) == ["date", "value"]
+
+
+def test_replaced_hooks_read_all_columns_unless_declared(tmp_path: Path, monkeypatch):
+    inputFile = _write_wide_readings_csv(tmp_path / "input.csv", periods=5)
+    _configure_engine(monkeypatch, outputFiles=OUTPUT_FILES)
+    monkeypatch.setattr(engine, "customPrepareDataPost", lambda df: df)
+
+    assert len(engine.readInputFile(str(inputFile)).columns) == 6
+
+    monkeypatch.setattr(engine, "inputFileExtraColumnNames", ["unused text"])
+    assert list(engine.readInputFile(str(inputFile)).columns) == [
+        "unused text",
+        "date",
+        "register",
+        "value",
+    ]
+
+
+def test_only_required_columns_are_read_from_database_and_json(
+    tmp_path: Path, monkeypatch
+):
+    data = pd.read_csv(_write_wide_readings_csv(tmp_path / "input.csv", periods=5))
+    databaseFile = tmp_path / "input.db"
+    conn = sqlite3.connect(databaseFile)
+    data.to_sql("readings", conn, index=False)
+    conn.close()
+    jsonFile = tmp_path / "input.json"
+    jsonFile.write_text(json.dumps({"data": data.to_dict("records")}))
+
+    _configure_engine(
+        monkeypatch,
+        inputFileNameExtension=".db",
+        inputFileDbTableName="readings",
+        outputFiles=OUTPUT_FILES,
+    )
+    pd.testing.assert_frame_equal(
+        engine.readInputFile(str(databaseFile)), data[["date", "register", "value"]]
+    )
+
+    _configure_engine(
+        monkeypatch,
+        inputFileNameExtension=".json",
+        inputFileJsonPath=["data"],
+        outputFiles=OUTPUT_FILES,
+    )
+    pd.testing.assert_frame_equal(
+        engine.readInputFile(str(jsonFile)), data[["date", "register", "value"]]
+    )
+
+
+# ---------- database reader ----------
+
+
+def _write_meter_db(path: Path, devices=range(1, 6), periods: int = 40) -> Path:
+    """Write a Domoticz like meter table with the readings of several devices."""
+    dates = pd.date_range("2024-01-01", periods=periods, freq="5min")
+    data = pd.DataFrame(
+        [
+            (device, i * device, date.strftime("%Y-%m-%d %H:%M:%S"))
+            for i, date in enumerate(dates)
+            for device in devices
+        ],
+        columns=["DeviceRowID", "Value", "Date"],
+    )
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE meter (DeviceRowID BIGINT NOT NULL, Value BIGINT, Date DATETIME)"
+    )
+    conn.execute("CREATE INDEX m_id_date_idx ON meter(DeviceRowID, Date)")
+    conn.executemany("INSERT INTO meter VALUES (?, ?, ?)", data.values.tolist())
+    conn.commit()
+    conn.close()
+    return path
+
+
+DB_SETTINGS = {
+    "inputFileNameExtension": ".db",
+    "inputFileDbTableName": "meter",
+    "inputFileDateColumnName": "Date",
+    "inputFileDateTimeColumnFormat": "%Y-%m-%d %H:%M:%S",
+    "outputFiles": [
+        OutputFileDefinition(
+            "elec_solar_high_resolution.csv",
+            "Value",
+            [DataFilter("DeviceRowID", "^2$", True)],
+        ),
+        OutputFileDefinition(
+            "gas_high_resolution.csv",
+            "Value",
+            [
+                DataFilter("DeviceRowID", "^(?:3|4)$", True),
+                DataFilter("DeviceRowID", "^4$", False),
+            ],
+        ),
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        "^2$",
+        "^(2|x)$",
+        "^(?:2.0|None)$",
+        "^2\\.0$",
+        "^2",
+        "2$",
+        "^nan$",
+        "^None$",
+        "x",
+        "^$",
+    ],
+)
+def test_db_filter_condition_selects_the_rows_matched_by_the_filter(
+    tmp_path: Path, pattern
+):
+    values = [2, 2.0, 2.5, "2", "x2", "x", "", None, 12, 3]
+    conn = engine.openDbFile(str(tmp_path / "filter.db"))
+    # Columns without type keep the values as is, integer columns are read as floats when values are missing
+    conn.execute("CREATE TABLE filter (id INTEGER, anything, number INTEGER)")
+    conn.executemany(
+        "INSERT INTO filter VALUES (?, ?, ?)",
+        [(i, value, i + 1 if i % 2 else None) for i, value in enumerate(values)],
+    )
+    data = pd.read_sql_query("SELECT * FROM filter", conn)
+
+    for column in ["anything", "number"]:
+        dataFilter = DataFilter(column, pattern, True)
+        condition, params = engine.dbFilterCondition(dataFilter)
+        selected = pd.read_sql_query(
+            f"SELECT id FROM filter WHERE {condition}", conn, params=params
+        )["id"]
+        matched = data["id"][engine.OutputFilePlan(data).filterMask(dataFilter)]
+        assert set(matched) <= set(selected)
+    conn.close()
+
+
+def test_db_reader_only_reads_the_rows_needed_by_the_output_files(
+    tmp_path: Path, monkeypatch
+):
+    inputFile = _write_meter_db(tmp_path / "domoticz.db")
+
+    expected = _generate(
+        monkeypatch,
+        tmp_path / "all",
+        inputFile,
+        inputFileDbReadRequiredRowsOnly=False,
+        **DB_SETTINGS,
+    )
+    actual = _generate(monkeypatch, tmp_path / "needed", inputFile, **DB_SETTINGS)
+    data = engine.readInputFile(str(inputFile))
+
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name])
+    assert sorted(data["DeviceRowID"].unique()) == [2, 3, 4]
+
+
+def test_db_reader_reads_all_the_rows_for_replaced_hooks(tmp_path: Path, monkeypatch):
+    inputFile = _write_meter_db(tmp_path / "domoticz.db")
+    _configure_engine(monkeypatch, inputFileExtraColumnNames=[], **DB_SETTINGS)
+    monkeypatch.setattr(engine, "customPrepareDataPre", lambda df: df)
+
+    assert len(engine.readInputFile(str(inputFile))) == 200
+
+
+def test_db_reader_skips_the_dates_of_the_previous_run(tmp_path: Path, monkeypatch):
+    inputFile = _write_meter_db(tmp_path / "domoticz.db", periods=2000)
+    _configure_engine(monkeypatch, **DB_SETTINGS)
+    watermark = int(pd.Timestamp("2024-01-05 12:00").timestamp())
+    monkeypatch.setattr(engine, "incrementalWatermark", watermark)
+
+    data = engine.readInputFile(str(inputFile))
+
+    assert data["Date"].min() == "2024-01-03 00:00:00"
+
+
+@pytest.mark.parametrize("chunkSize", [1, 7, 1000])
+def test_db_chunks_match_reading_the_whole_table(
+    tmp_path: Path, monkeypatch, chunkSize
+):
+    inputFile = _write_meter_db(tmp_path / "domoticz.db")
+    _configure_engine(monkeypatch, inputFileChunkSize=chunkSize, **DB_SETTINGS)
+
+    expected = engine.readInputFile(str(inputFile))
+    chunks = list(engine.readInputFileChunks(str(inputFile)))
+
+    assert len(chunks) == -(-len(expected) // chunkSize)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+@pytest.mark.parametrize(
+    "settings", [{}, {"inputFileNumReadJobs": 2}, {"inputFileChunkSize": 16}]
+)
+def test_multiple_db_files_match_one_db_file(tmp_path: Path, monkeypatch, settings):
+    inputDir = tmp_path / "input"
+    inputDir.mkdir()
+    _write_meter_db(inputDir / "domoticz_1.db", periods=20)
+    conn = sqlite3.connect(_write_meter_db(inputDir / "domoticz_2.db", periods=40))
+    conn.execute("DELETE FROM meter WHERE Date < '2024-01-01 01:40:00'")
+    conn.commit()
+    conn.close()
+    inputFile = _write_meter_db(tmp_path / "domoticz.db", periods=40)
+
+    expected = _generate(monkeypatch, tmp_path / "one", inputFile, **DB_SETTINGS)
+    actual = _generate(
+        monkeypatch, tmp_path / "multiple", inputDir / "*.db", **settings, **DB_SETTINGS
+    )
+
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name], check_dtype=False)
+
+
+# ---------- parallel loading ----------
+
+
+def _readInputFileDefiningOutputFiles(inputFileName: str) -> pd.DataFrame:
+    """Custom reader which defines the output files based on the file contents."""
+    df = engine.engineReadInputFile(inputFileName)
+    engine.outputFiles = OUTPUT_FILES[:1]
+    return df
+
+
+def test_parallel_loading_matches_serial_loading(tmp_path: Path, monkeypatch):
+    inputDir = tmp_path / "input"
+    inputDir.mkdir()
+    data = pd.read_csv(_write_readings_csv(tmp_path / "readings.csv", periods=40))
+    for i, part in data.groupby(data.index // 20):
+        part.to_csv(inputDir / f"part{i}.csv", index=False)
+    settings = {"outputFiles": OUTPUT_FILES}
+
+    expected = _generate(
+        monkeypatch, tmp_path / "serial", inputDir / "*.csv", **settings
+    )
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "parallel",
+        inputDir / "*.csv",
+        inputFileNumReadJobs=2,
+        **settings,
+    )
+
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name])
+
+
+def test_parallel_loading_keeps_output_files_of_custom_reader(
+    tmp_path: Path, monkeypatch
+):
+    for i in range(2):
+        _write_readings_csv(tmp_path / f"input{i}.csv", periods=5)
+    monkeypatch.setattr(engine, "readInputFile", _readInputFileDefiningOutputFiles)
+
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "parallel",
+        tmp_path / "input*.csv",
+        inputFileNumReadJobs=2,
+    )
+
+    assert list(actual) == ["usage_high_resolution.csv"]
+
+
+def test_parallel_loading_reports_all_failed_files(tmp_path: Path, monkeypatch, capsys):
+    _write_readings_csv(tmp_path / "input0.csv", periods=5)
+    (tmp_path / "input1.csv").write_text("")
+    (tmp_path / "input2.csv").write_text("")
+
+    with pytest.raises(SystemExit):
+        _generate(
+            monkeypatch,
+            tmp_path / "parallel",
+            tmp_path / "input*.csv",
+            outputFiles=OUTPUT_FILES,
+            inputFileNumReadJobs=3,
+        )
+
+    output = capsys.readouterr().out
+    assert "Could not load 2 of 3 files:" in output
+    assert "input1.csv" in output and "input2.csv" in output
+
+
+# ---------- output file plan ----------
+
+
+def _readings_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            engine.dateTimeColumnName: [0, 900, 1800, 2700, 3600, 4500],
+            "register": ["day", "night", "day", "night", "day", "night"],
+            "value": ["1.5", "0", "n/a", "2", "0", "3.25"],
+        }
+    )
+
+
+def test_output_file_plan_evaluates_shared_work_once(monkeypatch):
+    _configure_engine(monkeypatch)
+    dataFrame = _readings_frame()
+    plan = engine.OutputFilePlan(dataFrame)
+
+    for outputFile in OUTPUT_FILES:
+        plan.selectData(outputFile.valueColumnName, outputFile.dataFilters)
+
+    assert list(plan.values) == ["value"]
+    assert len(plan.filterMasks) == 2
+    # The data itself is not modified
+    pd.testing.assert_frame_equal(dataFrame, _readings_frame())
+
+
+@pytest.mark.parametrize(
+    "removeInvalid, removeZero, expected",
+    [
+        (False, False, [(0, 1.5), (1800, 0.0), (3600, 0.0)]),
+        (False, True, [(0, 1.5)]),
+        (True, False, [(0, 1.5), (3600, 0.0)]),
+        (True, True, [(0, 1.5)]),
+    ],
+)
+def test_output_file_plan_selects_valid_filtered_rows(
+    monkeypatch, removeInvalid, removeZero, expected
+):
+    _configure_engine(
+        monkeypatch,
+        inputFileDataRemoveInvalidValues=removeInvalid,
+        inputFileDataRemoveZeroValues=removeZero,
+    )
+
+    df = engine.OutputFilePlan(_readings_frame()).selectData(
+        "value", [DataFilter("register", "^day$", True)]
+    )
+
+    assert df.columns.tolist() == [engine.dateTimeColumnName, "value"]
+    assert list(df.itertuples(index=False, name=None)) == expected
+
+
+def test_output_file_plan_filters_value_column_on_numeric_values(monkeypatch):
+    _configure_engine(monkeypatch)
+
+    df = engine.OutputFilePlan(_readings_frame()).selectData(
+        "value", [DataFilter("value", "^0.0$", False)]
+    )
+
+    assert df["value"].tolist() == [1.5, 2.0, 3.25]
+
+
+# ---------- hourly downsampling ----------
+
+
+def _select_hourly_data_reference(dataFrame: pd.DataFrame, dataColumnName: str):
+    """The original per-row implementation of the hourly selection."""
+    df = dataFrame.copy()
+    df[engine.dateTimeColumnName] = df[engine.dateTimeColumnName].apply(
+        lambda x: (x // 3600) * 3600
+    )
+    return df.groupby(engine.dateTimeColumnName, as_index=False)[dataColumnName].first()
+
+
+def _hourly_frame(timestamps) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            engine.dateTimeColumnName: timestamps,
+            "value": [round(0.001 * i, 3) for i in range(len(timestamps))],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "timestamps",
+    [
+        [0, 10, 3599, 3600, 3610, 10800, 14399],
+        [3610, 0, 10, 3600, 7200],  # not sorted, uses the fallback
+        [5],
+        [],
+    ],
+)
+def test_select_hourly_data_matches_reference(timestamps):
+    dataFrame = _hourly_frame(pd.Series(timestamps, dtype="int64"))
+
+    actual = engine.selectHourlyData(dataFrame, "value")
+
+    expected = _select_hourly_data_reference(dataFrame, "value")
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_select_hourly_data_of_a_week_matches_reference():
+    # Ten second readings of about a week (the timing is measured by benchmark/EngineBenchmark.py)
+    dataFrame = _hourly_frame(pd.Series(range(1700000000, 1700000000 + 10 * 60000, 10)))
+
+    actual = engine.selectHourlyData(dataFrame, "value")
+
+    expected = _select_hourly_data_reference(dataFrame, "value")
+    assert actual.to_csv(index=False) == expected.to_csv(index=False)
+
+
+# ---------- interval recalculation ----------
+
+
+def _recalculate_reference(
+    dataFrame: pd.DataFrame, intervalMode: IntervalMode, initialValue: float = 0
+) -> pd.DataFrame:
+    """The original implementation (interval of the first two rows, extra row appended with concat)."""
+    df = dataFrame.copy()
+    if intervalMode == IntervalMode.USAGE:
+        cumulative = df["value"].cumsum().add(float(initialValue)).round(3)
+        df["value"] = cumulative.shift(1, fill_value=initialValue)
+        lastValue = cumulative.iloc[-1]
+    else:
+        df["value"] = df["value"].shift(1)
+        df = df.iloc[1:].reset_index(drop=True)
+        lastValue = dataFrame["value"].iloc[-1]
+    interval = df["_DateTime"].iloc[1] - df["_DateTime"].iloc[0]
+    extraRow = {"_DateTime": df["_DateTime"].iloc[-1] + interval, "value": lastValue}
+    return pd.concat([df, pd.DataFrame([extraRow])], ignore_index=True)
+
+
+def _interval_frame(timestamps: list) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "_DateTime": pd.Series(timestamps, dtype="int64"),
+            "value": [round(0.1 * i + 0.25, 3) for i in range(len(timestamps))],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "intervalMode", [IntervalMode.USAGE, IntervalMode.READING_END_INTERVAL]
+)
+def test_recalculation_matches_reference(monkeypatch, intervalMode):
+    monkeypatch.setattr(engine, "dateTimeColumnName", "_DateTime")
+    dataFrame = _interval_frame(list(range(1700000000, 1700000000 + 900 * 1000, 900)))
+
+    if intervalMode == IntervalMode.USAGE:
+        actual = engine.recalculateUsageData(dataFrame, "value", 100)
+    else:
+        actual = engine.recalculateEndOfIntervalData(dataFrame, "value")
+
+    expected = _recalculate_reference(dataFrame, intervalMode, 100)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize(
+    "timestamps, interval",
+    [
+        ([0, 3600, 4500, 5400, 6300], 900),  # gap at the start
+        ([0, 0, 900, 1800, 1800, 2700], 900),  # duplicates
+        ([0, 900, 2700], 900),  # tie, the first interval is used
+        ([5, 5], 0),  # no positive intervals, the first interval is used
+    ],
+)
+def test_dominant_interval_ignores_gaps(timestamps, interval):
+    intervalCounts: dict = {}
+    engine.countIntervals(np.array(timestamps), intervalCounts)
+
+    assert engine.getDominantInterval(intervalCounts, timestamps[:2]) == interval
+
+
+@pytest.mark.parametrize("chunkSize", [0, 1, 3])
+def test_extra_row_uses_the_dominant_interval(tmp_path: Path, monkeypatch, chunkSize):
+    # 15 minute readings with a gap of an hour after the first two readings
+    dates = [pd.Timestamp("2024-01-01 00:00"), pd.Timestamp("2024-01-01 00:15")]
+    dates += list(pd.date_range("2024-01-01 01:15", periods=8, freq="15min"))
+    inputFile = tmp_path / "input.csv"
+    pd.DataFrame(
+        {
+            "date": [date.strftime("%Y-%m-%d %H:%M") for date in dates for _ in "dn"],
+            "register": ["day", "night"] * len(dates),
+            "value": [1.0, 2.0] * len(dates),
+        }
+    ).to_csv(inputFile, index=False)
+
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "output",
+        inputFile,
+        outputFiles=OUTPUT_FILES[:2],
+        inputFileChunkSize=chunkSize,
+    )
+
+    lastTimestamp = int(dates[-1].timestamp())
+    usage = actual["usage_high_resolution.csv"]
+    assert usage.iloc[-1].tolist() == [lastTimestamp + 900, 110.0]
+    end = actual["end_high_resolution.csv"]
+    assert end.iloc[-1].tolist() == [lastTimestamp + 900, 2.0]
+    assert len(end) == len(dates)
+
+
+# ---------- filter evaluation ----------
+
+
+def _filter_data_reference(dataFrame: pd.DataFrame, filters) -> pd.DataFrame:
+    """The original row by row implementation of filterData."""
+    df = dataFrame
+    for dataFilter in filters:
+        series = df[dataFilter.column].astype(str).str.contains(dataFilter.value)
+        df = df[series if dataFilter.equal else ~series]
+    return df
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        [DataFilter("register", "^day$", True)],
+        [DataFilter("register", "night", False), DataFilter("mixed", r"^1\.0$", True)],
+        [DataFilter("mixed", "^(?:nan|None|True)$", True)],
+        [DataFilter("meter", "^1", True)],
+    ],
+)
+def test_filter_data_matches_reference(filters):
+    dataFrame = pd.DataFrame(
+        {
+            "register": ["day", "night", "day", None, "day", "night"],
+            "mixed": [1, 1.0, True, "1", None, float("nan")],
+            "meter": [10.5, 1.0, -0.5, 12.0, float("nan"), 1.0],
+        }
+    )
+
+    pd.testing.assert_frame_equal(
+        engine.filterData(dataFrame, filters),
+        _filter_data_reference(dataFrame, filters),
+    )
+
+
+def test_filter_regex_is_evaluated_per_unique_value(monkeypatch):
+    _configure_engine(monkeypatch)
+    dataFrame = pd.concat([_readings_frame()] * 1000, ignore_index=True)
+    plan = engine.OutputFilePlan(dataFrame)
+
+    mask = plan.filterMask(DataFilter("register", "^day$", True))
+
+    codes, uniqueValues = plan.filterColumns["register"]
+    assert uniqueValues.tolist() == ["day", "night"]
+    assert mask.sum() == 3000
+    # Another filter on the same column reuses the encoded column
+    plan.filterMask(DataFilter("register", "^night$", True))
+    assert list(plan.filterColumns) == ["register"]
+
+
+# ---------- split date/time parsing ----------
+
+
+@pytest.mark.parametrize(
+    "dates, times, dateTimeFormat",
+    [
+        (
+            ["01-03-2024", "01-03-2024", "02-03-2024"],
+            ["00:00", "23:45", "00:15"],
+            "%d-%m-%Y %H:%M",
+        ),
+        (
+            ["2024/03/01", "2024/03/01"],
+            ["1:00:00 PM", "12:15:30 AM"],
+            "%Y/%m/%d %I:%M:%S %p",
+        ),
+        (["1 Mar 2024", "2 Mar 2024"], ["08:00", "09:00"], "%d %b %Y %H:%M"),
+        ([20240301, 20240301], [0, 15], "%Y%m%d %M"),
+    ],
+)
+def test_split_date_time_matches_combined_parsing(
+    monkeypatch, dates, times, dateTimeFormat
+):
+    _configure_engine(monkeypatch, inputFileDateTimeColumnFormat=dateTimeFormat)
+    dateColumn, timeColumn = pd.Series(dates), pd.Series(times)
+
+    expected = pd.to_datetime(
+        dateColumn.astype(str) + " " + timeColumn.astype(str),
+        format=dateTimeFormat,
+        utc=True,
+    )
+
+    pd.testing.assert_series_equal(
+        engine.parseSplitDateTime(dateColumn, timeColumn), expected
+    )
+
+
+@pytest.mark.parametrize(
+    "dates, times, dateTimeFormat",
+    [
+        # The date and time part of the format cannot be separated by the spaces in the values
+        (["01-03-2024 00:00"], ["+01:00"], "%d-%m-%Y %H:%M %z"),
+        (["1 Mar 2024", "02-Mar-2024"], ["08:00", "09:00"], "%d %b %Y %H:%M"),
+        (["01-03-2024"], ["12:00"], "%d-%m-%Y"),
+        # Missing values are left to the combined parsing
+        (["01-03-2024", None], ["12:00", "13:00"], "%d-%m-%Y %H:%M"),
+    ],
+)
+def test_split_date_time_falls_back_to_combined_parsing(
+    monkeypatch, dates, times, dateTimeFormat
+):
+    _configure_engine(monkeypatch, inputFileDateTimeColumnFormat=dateTimeFormat)
+
+    assert engine.parseSplitDateTime(pd.Series(dates), pd.Series(times)) is None
+
+
+# ---------- timezone localization ----------
+
+
+@pytest.mark.parametrize(
+    "timeZoneName", ["Europe/Amsterdam", "America/New_York", "Australia/Sydney", "UTC"]
+)
+def test_localize_date_times_matches_pandas_localization(monkeypatch, timeZoneName):
+    timeZoneInfo = engine.ZoneInfo(timeZoneName)
+    monkeypatch.setattr(engine, "getTimeZoneInfo", lambda: timeZoneInfo)
+    # Every 15 minutes over several years, which includes each transition once (a single occurrence uses DST)
+    localTimes = pd.Series(
+        pd.date_range("2021-01-01", "2024-12-31 23:45", freq="15min")
+    )
+    localTimes.iloc[3] = pd.NaT
+
+    expected = (
+        localTimes.dt.tz_localize(
+            timeZoneInfo, ambiguous=True, nonexistent="shift_forward"
+        )
+        .dt.tz_convert("UTC")
+        .dt.tz_localize(None)
+    )
+
+    pd.testing.assert_series_equal(engine.localizeDateTimes(localTimes), expected)
+
+
+def test_localize_date_times_resolves_repeated_hour_by_input_order(monkeypatch):
+    timeZoneInfo = engine.ZoneInfo("Europe/Amsterdam")
+    monkeypatch.setattr(engine, "getTimeZoneInfo", lambda: timeZoneInfo)
+    # The hour 02:00-03:00 is repeated at the end of DST on 27 October 2024
+    localTimes = pd.Series(
+        pd.to_datetime(
+            ["2024-10-27 01:30", "2024-10-27 02:00", "2024-10-27 02:30"]
+            + ["2024-10-27 02:00", "2024-10-27 02:30", "2024-10-27 03:00"]
+        )
+    )
+
+    utcTimes = engine.localizeDateTimes(localTimes)
+
+    assert list(utcTimes.dt.strftime("%H:%M")) == [
+        "23:30",
+        "00:00",
+        "00:30",
+        "01:00",
+        "01:30",
+        "02:00",
+    ]
+
+
+# ---------- input file cache ----------
+
+
+def _configure_cache(monkeypatch, cacheDirectory: Path, **settings):
+    _configure_engine(
+        monkeypatch,
+        inputFileUseCache=True,
+        inputFileCacheDirectory=str(cacheDirectory),
+        **settings,
+    )
+
+
+def test_cached_input_file_is_not_parsed_again(tmp_path: Path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    _configure_cache(monkeypatch, tmp_path / "cache")
+    expected = engine.readInputFile(str(inputFile))
+
+    def failingReader(inputFileName):
+        raise AssertionError("The file is parsed again")
+
+    monkeypatch.setattr(engine, "readCsvFile", failingReader)
+    actual = engine.readInputFile(str(inputFile))
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert len(list((tmp_path / "cache").glob("*.parquet"))) == 1
+
+
+def test_cache_key_depends_on_content_and_reader_settings(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    _configure_cache(monkeypatch, tmp_path / "cache")
+    key = engine.getInputFileCacheKey(str(inputFile))
+
+    monkeypatch.setattr(engine, "inputFileNumFooterRows", 1)
+    assert engine.getInputFileCacheKey(str(inputFile)) != key
+    monkeypatch.setattr(engine, "inputFileNumFooterRows", 0)
+    assert engine.getInputFileCacheKey(str(inputFile)) == key
+
+    # Another reader engine may parse the file differently
+    monkeypatch.setattr(engine, "inputFileCsvReaderEngine", "python")
+    assert engine.getInputFileCacheKey(str(inputFile)) != key
+    monkeypatch.setattr(engine, "inputFileCsvReaderEngine", "c")
+    monkeypatch.setattr(engine, "inputFileExcelReaderEngine", "default")
+    assert engine.getInputFileCacheKey(str(inputFile)) != key
+    monkeypatch.setattr(engine, "inputFileExcelReaderEngine", "calamine")
+    assert engine.getInputFileCacheKey(str(inputFile)) == key
+
+    with open(inputFile, "a") as f:
+        f.write("2024-01-01 02:30,day,1\n")
+    assert engine.getInputFileCacheKey(str(inputFile)) != key
+
+
+def test_cache_is_only_used_when_enabled(monkeypatch):
+    assert engine.engineDefaults["inputFileUseCache"] is False
+
+    monkeypatch.setattr(engine, "inputFileUseCache", False)
+    parser = engine.createArgumentParser(inputFileArguments=False)
+    engine.applyArguments(parser, parser.parse_args(["--cache"]))
+    assert engine.inputFileUseCache is True
+
+
+def test_data_which_cannot_be_cached_exactly_is_not_cached(tmp_path: Path, monkeypatch):
+    _configure_cache(monkeypatch, tmp_path / "cache")
+    dataFrame = pd.DataFrame({"register": ["day", None, float("nan")]})
+
+    engine.writeCachedInputFile("mixed", dataFrame)
+
+    assert engine.readCachedInputFile("mixed") is None
+
+
+def test_cache_removes_least_recently_used_files(tmp_path: Path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    _configure_cache(monkeypatch, tmp_path / "cache")
+    dataFrame = pd.DataFrame({"value": range(1000)})
+    engine.writeCachedInputFile("first", dataFrame)
+    monkeypatch.setattr(
+        engine,
+        "inputFileCacheMaxSize",
+        (tmp_path / "cache" / "first.parquet").stat().st_size,
+    )
+    os.utime(tmp_path / "cache" / "first.parquet", (0, 0))
+
+    engine.writeCachedInputFile("second", dataFrame)
+
+    assert sorted(p.name for p in (tmp_path / "cache").iterdir()) == ["second.parquet"]
+
+
+# ---------- incremental mode ----------
+
+
+def _run_incremental(monkeypatch, directory: Path, inputFile: Path, **settings):
+    """Run in incremental mode in the given directory and return the output files."""
+    _configure_engine(monkeypatch, incrementalMode=True, **settings)
+    directory.mkdir(exist_ok=True)
+    monkeypatch.chdir(directory)
+    for name in directory.glob("*.csv"):
+        name.unlink()
+    engine.generateImportDataFiles(str(inputFile))
+    return {
+        name: (
+            pd.read_csv(directory / name, header=None)
+            if (directory / name).stat().st_size
+            else pd.DataFrame()
+        )
+        for name in sorted(os.listdir(directory))
+        if name.endswith(".csv")
+    }
+
+
+@pytest.mark.parametrize("hourly", [False, True])
+def test_incremental_runs_continue_the_output_files(
+    tmp_path: Path, monkeypatch, hourly
+):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=60)
+    settings = {"outputFiles": OUTPUT_FILES, "inputFileDateTimeOnlyUseHourly": hourly}
+    expected = _generate(
+        monkeypatch, tmp_path / "full", inputFile, inputFileChunkSize=1000, **settings
+    )
+
+    # First run on part of the data, second run on a new export of all the data
+    data = pd.read_csv(inputFile)
+    partialFile = tmp_path / "partial.csv"
+    data.iloc[:70].to_csv(partialFile, index=False)
+    first = _run_incremental(
+        monkeypatch, tmp_path / "incremental", partialFile, **settings
+    )
+    second = _run_incremental(
+        monkeypatch, tmp_path / "incremental", inputFile, **settings
+    )
+
+    assert list(first) == list(second) == list(expected)
+    for name in expected:
+        actual = pd.concat([first[name], second[name]], ignore_index=True)
+        pd.testing.assert_frame_equal(actual, expected[name])
+    assert (tmp_path / "incremental" / engine.incrementalStateFileName).exists()
+
+
+@pytest.mark.parametrize("chunkSize", [0, 1000])
+@pytest.mark.parametrize(
+    "script, inputFiles, prefix",
+    [
+        # Days in random order
+        ("Shelly EM3/ShellyEM3DataPrepare.py", "em_data_phaseA.csv", "phaseA"),
+        # Integer values
+        ("Domoticz/DomoticzDataPrepare.py", "domoticz.db", ""),
+    ],
+)
+def test_incremental_run_of_a_sample_equals_the_full_run(
+    tmp_path: Path, monkeypatch, script, inputFiles, prefix, chunkSize
+):
+    sampleDir = (DATASOURCES / script).parent / "Sample files"
+    providerEngine = engine.Engine(
+        engine.ProviderConfig.fromProviderScript(str(DATASOURCES / script))
+    )
+    monkeypatch.chdir(tmp_path)
+
+    assert providerEngine.generateImportDataFiles(
+        str(sampleDir / inputFiles),
+        prefix=prefix,
+        arguments=(
+            ["--incremental", "--chunk-size", str(chunkSize)]
+            if chunkSize
+            else ["--incremental"]
+        ),
+    )
+
+    outputFiles = sorted(os.listdir(tmp_path))
+    assert outputFiles.pop(outputFiles.index(engine.incrementalStateFileName))
+    assert outputFiles
+    for outputFile in outputFiles:
+        assert (tmp_path / outputFile).read_bytes() == (
+            sampleDir / outputFile
+        ).read_bytes()
+
+
+def test_incremental_run_without_new_data_writes_empty_files(
+    tmp_path: Path, monkeypatch
+):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    settings = {"outputFiles": OUTPUT_FILES}
+
+    _run_incremental(monkeypatch, tmp_path / "incremental", inputFile, **settings)
+    second = _run_incremental(
+        monkeypatch, tmp_path / "incremental", inputFile, **settings
+    )
+
+    assert all(df.empty for df in second.values())
+
+
+def test_incremental_run_restarts_when_the_output_definition_changes(
+    tmp_path: Path, monkeypatch
+):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    first = _run_incremental(
+        monkeypatch, tmp_path / "incremental", inputFile, outputFiles=OUTPUT_FILES[:1]
+    )
+
+    changed = [OUTPUT_FILES[0]._replace(initialValue=0)]
+    second = _run_incremental(
+        monkeypatch, tmp_path / "incremental", inputFile, outputFiles=changed
+    )
+
+    name = "usage_high_resolution.csv"
+    assert len(second[name]) == len(first[name])
+    assert second[name][1].tolist() == [
+        round(v - 100, 3) for v in first[name][1].tolist()
+    ]
+
+
+@pytest.mark.filterwarnings("error::pandas.errors.SettingWithCopyWarning")
+@pytest.mark.parametrize("watermark", [None, "2024-01-01 04:00"])
+def test_prepare_data_does_not_write_to_a_selection(monkeypatch, watermark):
+    monkeypatch.setattr(engine, "dateTimeColumnName", "_DateTime")
+    monkeypatch.setattr(
+        engine,
+        "incrementalWatermark",
+        watermark and int(pd.Timestamp(watermark).timestamp()),
+    )
+    dateTimes = pd.date_range("2024-01-01", periods=10, freq="h")
+    dataFrame = pd.DataFrame(
+        {"_DateTime": dateTimes.insert(0, pd.Timestamp("1960-01-01")), "v": range(11)}
+    )
+
+    df = engine.prepareData(dataFrame, dateTimesPrepared=True)
+
+    assert df["_DateTime"].tolist()[-1] == int(dateTimes[-1].timestamp())
+    assert dataFrame["_DateTime"].iloc[-1] == dateTimes[-1]
+
+
+# ---------- output file writer ----------
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [0.25, 1.0, -3.5, 1e16, 1e-05, 0.0001, -0.0, float("nan"), float("inf")],
+        [123456789012345680.0, 0.1 + 0.2, 2.5e-310, 5e-324, 1.7976931348623157e308],
+        [1, 2, -3],
+        [],
+    ],
+)
+def test_write_import_data_matches_pandas(tmp_path: Path, values):
+    dataFrame = pd.DataFrame(
+        {"_DateTime": range(1_600_000_000, 1_600_000_000 + len(values)), "v": values}
+    )
+    dataFrame.to_csv(tmp_path / "expected.csv", header=False, index=False)
+
+    engine.writeImportData(dataFrame, str(tmp_path / "actual.csv"))
+
+    assert (tmp_path / "actual.csv").read_bytes() == (
+        tmp_path / "expected.csv"
+    ).read_bytes()
+
+
+def test_write_import_data_matches_pandas_for_random_values(
+    tmp_path: Path, monkeypatch
+):
+    monkeypatch.setattr(engine, "outputFileWriteBlockSize", 1000)
+    rng = np.random.default_rng(0)
+    values = np.frombuffer(rng.bytes(8 * 5000), dtype=np.float64)
+    dataFrame = pd.DataFrame({"_DateTime": np.arange(5000), "v": values})
+    dataFrame.to_csv(tmp_path / "expected.csv", header=False, index=False)
+
+    engine.writeImportData(dataFrame.iloc[:2500], str(tmp_path / "actual.csv"))
+    engine.writeImportData(
+        dataFrame.iloc[2500:], str(tmp_path / "actual.csv"), append=True
+    )
+
+    assert (tmp_path / "actual.csv").read_bytes() == (
+        tmp_path / "expected.csv"
+    ).read_bytes()
+
+
+def test_write_import_data_writes_other_types_with_pandas(tmp_path: Path):
+    dataFrame = pd.DataFrame({"_DateTime": [1, 2], "v": ["a,b", None]})
+    dataFrame.to_csv(tmp_path / "expected.csv", header=False, index=False)
+
+    engine.writeImportData(dataFrame, str(tmp_path / "actual.csv"))
+
+    assert (tmp_path / "actual.csv").read_bytes() == (
+        tmp_path / "expected.csv"
+    ).read_bytes()
+
+
+@pytest.mark.parametrize("numWriteThreads", [1, 4])
+def test_output_files_are_written_by_writer_threads(
+    tmp_path: Path, monkeypatch, numWriteThreads
+):
+    monkeypatch.setattr(engine, "outputFileNumWriteThreads", numWriteThreads)
+    inputFile = _write_readings_csv(tmp_path / "input.csv")
+
+    outputs = _generate(
+        monkeypatch, tmp_path / "output", inputFile, outputFiles=OUTPUT_FILES
+    )
+
+    assert list(outputs) == sorted(o.outputFileName for o in OUTPUT_FILES)
+    assert outputs["start_high_resolution.csv"][1].tolist()[:3] == [0.25, 0.35, 0.45]
+
+
+# ---------- database output ----------
+
+
+def _read_import_data(databaseFile: Path) -> list:
+    conn = sqlite3.connect(databaseFile)
+    try:
+        return conn.execute(
+            "SELECT id, resolution, timestamp, value FROM IMPORT_DATA "
+            "ORDER BY id, resolution, timestamp"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("chunkSize", [0, 7])
+def test_database_output_matches_importing_the_files(
+    tmp_path: Path, monkeypatch, chunkSize
+):
+    inputFile = _write_readings_csv(tmp_path / "input.csv")
+    outputs = _generate(
+        monkeypatch, tmp_path / "files", inputFile, outputFiles=OUTPUT_FILES
+    )
+    expectedDatabase = tmp_path / "expected.db"
+    conn = sqlite3.connect(expectedDatabase)
+    ImportData.create_table(conn.cursor(), ImportData.DatabaseType.SQLITE)
+    for name in outputs:
+        idValue, resolution = ImportData.compute_id_and_resolution(name)
+        ImportData.import_csv_data(
+            conn.cursor(),
+            str(tmp_path / "files" / name),
+            "?",
+            idValue,
+            resolution,
+            ImportData.DatabaseType.SQLITE,
+        )
+    conn.commit()
+    conn.close()
+
+    actualDatabase = tmp_path / "actual.db"
+    monkeypatch.setattr(
+        engine,
+        "outputDatabaseSettings",
+        {"db_type": "sqlite", "sqlite_db": str(actualDatabase)},
+    )
+    _generate(
+        monkeypatch,
+        tmp_path / "database",
+        inputFile,
+        outputFiles=OUTPUT_FILES,
+        inputFileChunkSize=chunkSize,
+    )
+
+    assert os.listdir(tmp_path / "database") == []
+    assert _read_import_data(actualDatabase) == _read_import_data(expectedDatabase)
+    assert engine.outputDatabase is None
+
+
+def test_database_output_keeps_the_table_when_not_recreated(
+    tmp_path: Path, monkeypatch
+):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    databaseFile = tmp_path / "output.db"
+    monkeypatch.setattr(
+        engine,
+        "outputDatabaseSettings",
+        {"db_type": ImportData.DatabaseType.SQLITE, "sqlite_db": str(databaseFile)},
+    )
+    _generate(monkeypatch, tmp_path / "first", inputFile, outputFiles=OUTPUT_FILES)
+    rowCount = len(_read_import_data(databaseFile))
+
+    monkeypatch.setattr(engine, "outputDatabaseRecreateTable", False)
+    _generate(
+        monkeypatch,
+        tmp_path / "second",
+        inputFile,
+        outputFiles=[OUTPUT_FILES[2]._replace(outputFileName="other.csv")],
+    )
+
+    rows = _read_import_data(databaseFile)
+    assert len(rows) == rowCount + 10
+    assert {row[:2] for row in rows if row[0] == "other"} == {("other", "HIGH")}
+
+
+# ---------- profiling ----------
+
+
+def _run_profiled(monkeypatch, tmp_path: Path, **settings):
+    """Generate the output files with profiling enabled and return the profiled stages."""
+    monkeypatch.setattr(engine, "profileMode", True)
+    monkeypatch.setattr(engine, "profileStages", {})
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=40)
+    _generate(
+        monkeypatch,
+        tmp_path / "output",
+        inputFile,
+        outputFiles=OUTPUT_FILES,
+        **settings,
+    )
+    return engine.profileStages
+
+
+@pytest.mark.parametrize("chunkSize", [0, 25])
+def test_profile_measures_each_stage(tmp_path: Path, monkeypatch, chunkSize):
+    stages = _run_profiled(
+        monkeypatch,
+        tmp_path,
+        inputFileChunkSize=chunkSize,
+        inputFileDateTimeOnlyUseHourly=True,
+    )
+
+    # The streamed chunks are ordered before the output files are generated
+    assert list(stages) == [
+        "readInputFile",
+        "prepareData",
+        *(["orderData"] if chunkSize else []),
+        "filterData",
+        "recalculateUsageData",
+        "selectHourlyData",
+        "writeImportData",
+        "recalculateEndOfIntervalData",
+    ]
+    assert stages["readInputFile"].rowsOut == 80
+    assert stages["readInputFile"].calls == (1 if chunkSize == 0 else 4)
+    assert stages["prepareData"].rowsIn == stages["prepareData"].rowsOut == 80
+    if chunkSize:
+        assert stages["orderData"].rowsIn == stages["orderData"].rowsOut == 80
+    assert stages["filterData"].rowsOut == 120
+    assert all(stage.seconds > 0 for stage in stages.values())
+
+
+def test_profile_peak_memory_includes_nested_stages(monkeypatch):
+    monkeypatch.setattr(engine, "profileMode", True)
+    monkeypatch.setattr(engine, "profileStages", {})
+
+    with engine.profileStage("outer"):
+        with engine.profileStage("inner", 10) as stage:
+            data = bytearray(8 * 1024**2)
+            stage.rowsOut = 5
+        del data
+
+    stages = engine.profileStages
+    assert stages["inner"].peakMemory >= 8 * 1024**2
+    assert stages["outer"].peakMemory >= stages["inner"].peakMemory
+    assert (stages["inner"].rowsIn, stages["inner"].rowsOut) == (10, 5)
+    assert stages["outer"].rowsIn is None
+
+
+def test_profile_report_is_written_as_json(tmp_path: Path, monkeypatch, capsys):
+    _run_profiled(monkeypatch, tmp_path)
+    reportFile = tmp_path / "profile.json"
+    monkeypatch.setattr(engine, "profileFileName", str(reportFile))
+
+    engine.reportProfile()
+
+    report = json.loads(reportFile.read_text())
+    assert [stage["name"] for stage in report["stages"]] == list(engine.profileStages)
+    assert "prepareData" in capsys.readouterr().out
+
+
+def test_no_stages_are_measured_without_profiling(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(engine, "profileMode", False)
+    monkeypatch.setattr(engine, "profileStages", {})
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+
+    _generate(monkeypatch, tmp_path / "output", inputFile, outputFiles=OUTPUT_FILES)
+
+    assert engine.profileStages == {}
+
+
+# ---------- sorting ----------
+
+
+def _runs_frame(runs: list) -> pd.DataFrame:
+    dateTimes = [minute for run in runs for minute in run]
+    return pd.DataFrame(
+        {
+            "_DateTime": pd.to_datetime(dateTimes, unit="m"),
+            "row": range(len(dateTimes)),
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "runs",
+    [
+        [range(0, 50), range(50, 100)],  # sorted
+        [range(60, 90), range(0, 30), range(30, 60)],  # runs in the wrong order
+        [range(0, 40), range(30, 70), range(20, 50)],  # overlapping runs
+        [range(0, 20), range(19, 40), [5, 5, 5]],  # equal date/times of different runs
+        [range(i, 100, 5) for i in range(5)],  # odd number of overlapping runs
+        [list(np.random.default_rng(3).integers(0, 50, 200))],  # not sorted
+    ],
+)
+@pytest.mark.parametrize("maxRuns", [1024, 2])
+def test_sort_data_matches_stable_sort(monkeypatch, runs, maxRuns):
+    monkeypatch.setattr(engine, "dateTimeColumnName", "_DateTime")
+    monkeypatch.setattr(engine, "sortDataMaxRuns", maxRuns)
+    dataFrame = _runs_frame(runs)
+
+    actual = engine.sortData(dataFrame)
+
+    expected = dataFrame.sort_values("_DateTime", kind="stable")
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_merge_sorted_runs_puts_the_first_run_first_on_ties():
+    dateTimes = np.array([1, 3, 3, 5, 0, 3, 5, 6])
+
+    merged = engine.mergeSortedRuns(dateTimes, np.arange(0, 4), np.arange(4, 8))
+
+    assert merged.tolist() == [4, 0, 1, 2, 5, 3, 6, 7]
+
+
+def test_sorted_data_is_not_copied(monkeypatch):
+    monkeypatch.setattr(engine, "dateTimeColumnName", "_DateTime")
+    dataFrame = _runs_frame([range(0, 10), range(10, 20)])
+
+    assert engine.sortData(dataFrame) is dataFrame
+
+
+# ---------- deduplication ----------
+
+
+@pytest.mark.parametrize("keep", ["first", "last"])
+@pytest.mark.parametrize("numKeyColumns", [0, 1, 2])
+def test_find_duplicate_rows_matches_pandas(keep, numKeyColumns):
+    rng = np.random.default_rng(7)
+    data = pd.DataFrame(
+        {
+            "timestamp": np.sort(rng.integers(0, 200, 2000)),
+            "register": rng.integers(0, 3, 2000),
+            "meter": rng.integers(0, 2, 2000),
+        }
+    )
+    keyColumns = ["register", "meter"][:numKeyColumns]
+
+    actual = engine.findDuplicateRows(
+        data["timestamp"].to_numpy(),
+        [data[column].to_numpy() for column in keyColumns],
+        keep,
+    )
+
+    expected = data.duplicated(["timestamp"] + keyColumns, keep=keep).to_numpy()
+    np.testing.assert_array_equal(actual, expected)
+
+
+def _write_overlapping_exports(directory: Path) -> list:
+    """Write two exports of which the second overlaps the last 10 readings of the first (with other values)."""
+    directory.mkdir()
+    data = pd.read_csv(_write_readings_csv(directory / "all.txt", periods=40))
+    first, second = data.iloc[:60].copy(), data.iloc[40:].copy()
+    second.loc[second.index < 60, "value"] += 1000
+    first.to_csv(directory / "export_1.csv", index=False)
+    second.to_csv(directory / "export_2.csv", index=False)
+    return [data, first, second]
+
+
+@pytest.mark.parametrize("policy", ["first", "last", "newest"])
+def test_duplicates_of_overlapping_exports_are_removed(
+    tmp_path: Path, monkeypatch, policy
+):
+    data, first, second = _write_overlapping_exports(tmp_path / "input")
+    # The first export is downloaded last
+    os.utime(tmp_path / "input" / "export_1.csv", (2000000000, 2000000000))
+
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "output",
+        tmp_path / "input" / "export_*.csv",
+        outputFiles=OUTPUT_FILES,
+        inputFileDuplicatePolicy=policy,
+    )
+
+    # The rows of the kept export are the same as the rows of one export of all the data
+    if policy == "last":
+        data = pd.concat([first.iloc[:40], second], ignore_index=True)
+    expectedFile = tmp_path / "expected.csv"
+    data.to_csv(expectedFile, index=False)
+    expected = _generate(
+        monkeypatch,
+        tmp_path / "expected",
+        expectedFile,
+        outputFiles=OUTPUT_FILES,
+        inputFileDuplicatePolicy="",
+    )
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name])
+
+
+@pytest.mark.parametrize("freq", ["15min", "h"])
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_overlapping_exports_are_localized_per_file(
+    tmp_path: Path, monkeypatch, freq, jobs
+):
+    # Both exports contain the repeated hour at the end of DST
+    inputDir = tmp_path / "input"
+    inputDir.mkdir()
+    _write_dst_end_csv(
+        inputDir / "export_1.csv", "2024-10-26 22:00", "2024-10-27 04:00", freq
+    )
+    _write_dst_end_csv(
+        inputDir / "export_2.csv", "2024-10-27 00:00", "2024-10-27 06:00", freq
+    )
+    expectedFile = _write_dst_end_csv(
+        tmp_path / "expected.csv", "2024-10-26 22:00", "2024-10-27 06:00", freq
+    )
+    settings = {
+        "outputFiles": OUTPUT_FILES,
+        "inputFileDateTimeIsUTC": False,
+        "inputFileTimeZoneName": "Europe/Amsterdam",
+        "inputFileDuplicatePolicy": "first",
+    }
+
+    actual = _generate(
+        monkeypatch,
+        tmp_path / "output",
+        inputDir / "export_*.csv",
+        inputFileNumReadJobs=jobs,
+        **settings,
+    )
+
+    expected = _generate(monkeypatch, tmp_path / "expected", expectedFile, **settings)
+    assert list(actual) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(actual[name], expected[name], check_exact=True)
+
+
+@pytest.mark.parametrize("chunkSize", [7, 15])
+@pytest.mark.parametrize("policy", ["first", "last", "newest"])
+def test_streaming_applies_the_duplicate_policy(
+    tmp_path: Path, monkeypatch, policy, chunkSize
+):
+    _write_overlapping_exports(tmp_path / "input")
+    os.utime(tmp_path / "input" / "export_1.csv", (2000000000, 2000000000))
+    settings = {"outputFiles": OUTPUT_FILES, "inputFileDuplicatePolicy": policy}
+
+    _generate(
+        monkeypatch,
+        tmp_path / "streamed",
+        tmp_path / "input" / "export_*.csv",
+        inputFileChunkSize=chunkSize,
+        **settings,
+    )
+
+    expected = _generate(
+        monkeypatch,
+        tmp_path / "expected",
+        tmp_path / "input" / "export_*.csv",
+        **settings,
+    )
+    assert sorted(os.listdir(tmp_path / "streamed")) == list(expected)
+    for name in expected:
+        assert (tmp_path / "streamed" / name).read_bytes() == (
+            tmp_path / "expected" / name
+        ).read_bytes()
+
+
+# ---------- data quality ----------
+
+
+QUALITY_OUTPUT_FILES = [
+    OutputFileDefinition("reading_high_resolution.csv", "reading", []),
+    OutputFileDefinition("usage_high_resolution.csv", "usage", [], IntervalMode.USAGE),
+]
+
+
+def _write_quality_csv(path: Path) -> Path:
+    """Write 15 minute readings (and usage) with one problem of each kind."""
+    dates = list(pd.date_range("2024-01-01", periods=6, freq="15min"))
+    dates += [dates[-1]]  # duplicate timestamp
+    dates += list(pd.date_range("2024-01-01 03:00", periods=8, freq="15min"))  # gap
+    readings = [100, 101, 102, 103, 104, 105, 105, 106, 107, 5000, 108, 107.5, 2, 3, 4]
+    usage = [1, 1, 1, 1, 1, 1, 1, 1, 1, 2000, 1, -0.5, 1, 1, 1]
+    pd.DataFrame(
+        {
+            "date": [date.strftime("%Y-%m-%d %H:%M") for date in dates],
+            "reading": readings,
+            "usage": usage,
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("chunkSize", [0, 4])
+def test_data_quality_report_lists_the_problems(tmp_path: Path, monkeypatch, chunkSize):
+    inputFile = _write_quality_csv(tmp_path / "input.csv")
+    reportFile = tmp_path / "report.json"
+    _generate(
+        monkeypatch,
+        tmp_path / "output",
+        inputFile,
+        outputFiles=QUALITY_OUTPUT_FILES,
+        inputFileChunkSize=chunkSize,
+        dataQualityReportFileName=str(reportFile),
+    )
+
+    reading, usage = json.loads(reportFile.read_text())
+    gapStart = int(pd.Timestamp("2024-01-01 01:15").timestamp())
+    for report in (reading, usage):
+        assert (report["rows"], report["interval"]) == (15, 900)
+        assert (report["gaps"], report["largestGap"]) == (1, 6300)
+        assert report["largestGapStart"] == gapStart
+        assert report["duplicateTimestamps"] == 1
+        assert report["spikes"] == 1
+        assert report["negativeUsage"] == 1
+        assert report["repairedRows"] == 0
+    assert reading["counterResets"] == 1
+    assert usage["counterResets"] == 0
+    assert reading["spikesFirst"] == int(pd.Timestamp("2024-01-01 03:30").timestamp())
+
+
+@pytest.mark.parametrize("chunkSize", [0, 4])
+def test_data_quality_repair_removes_the_invalid_rows(
+    tmp_path: Path, monkeypatch, chunkSize
+):
+    inputFile = _write_quality_csv(tmp_path / "input.csv")
+    settings = {"outputFiles": QUALITY_OUTPUT_FILES, "inputFileChunkSize": chunkSize}
+    repaired = _generate(
+        monkeypatch,
+        tmp_path / "repaired",
+        inputFile,
+        dataQualityReportFileName=str(tmp_path / "report.csv"),
+        dataQualityAction="repair",
+        **settings,
+    )
+    report = pd.read_csv(tmp_path / "report.csv")
+    assert report["repairedRows"].tolist() == [3, 3]
+
+    # The duplicate, spike and negative usage rows are removed, the gap and new meter are kept
+    data = pd.read_csv(inputFile)
+    cleanFile = tmp_path / "clean.csv"
+    data.drop(index=[6, 9, 11]).to_csv(cleanFile, index=False)
+    expected = _generate(
+        monkeypatch,
+        tmp_path / "clean",
+        cleanFile,
+        dataQualityReportFileName="",
+        **settings,
+    )
+
+    assert list(repaired) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(repaired[name], expected[name], check_dtype=False)
+
+
+def test_data_quality_fail_stops_before_the_output_files(tmp_path: Path, monkeypatch):
+    inputFile = _write_quality_csv(tmp_path / "input.csv")
+    reportFile = tmp_path / "report.json"
+
+    with pytest.raises(SystemExit):
+        _generate(
+            monkeypatch,
+            tmp_path / "output",
+            inputFile,
+            outputFiles=QUALITY_OUTPUT_FILES,
+            dataQualityReportFileName=str(reportFile),
+            dataQualityAction="fail",
+        )
+
+    assert reportFile.exists()
+    assert os.listdir(tmp_path / "output") == []
+
+
+# ---------- engine instances ----------
+
+
+def test_provider_config_holds_the_changed_settings():
+    config = engine.ProviderConfig(inputFileNameExtension=".json", outputFiles=[])
+    config.inputFileJsonPath = ["data"]
+
+    assert config.settings == {
+        "inputFileNameExtension": ".json",
+        "outputFiles": [],
+        "inputFileJsonPath": ["data"],
+    }
+    assert config.inputFileDateTimeIsUTC is True
+    assert config.customPrepareDataPre is engine.engineCustomPrepareDataPre
+    with pytest.raises(AttributeError, match="Unknown engine setting"):
+        engine.ProviderConfig(inputFileDateColumName="date")
+
+
+def test_engine_restores_the_engine_globals(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    _configure_engine(monkeypatch)
+    monkeypatch.chdir(tmp_path)
+
+    # Hooks can change engine globals during a run
+    def customPrepareDataPre(dataFrame: pd.DataFrame) -> pd.DataFrame:
+        engine.inputFileDateTimeIsUTC = False
+        engine.outputFiles.append(OUTPUT_FILES[1])
+        return dataFrame
+
+    config = engine.ProviderConfig(
+        outputFiles=OUTPUT_FILES[:1],
+        customPrepareDataPre=customPrepareDataPre,
+        inputFileDateColumnName="date",
+        inputFileDateTimeColumnFormat="%Y-%m-%d %H:%M",
+    )
+    engine.Engine(config).main(["-y", str(inputFile)])
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "end_high_resolution.csv",
+        "input.csv",
+        "usage_high_resolution.csv",
+    ]
+    assert config.settings["outputFiles"] == OUTPUT_FILES[:1]
+    assert engine.outputFiles == []
+    assert engine.inputFileDateTimeIsUTC is True
+    assert engine.customPrepareDataPre is engine.engineCustomPrepareDataPre
+
+
+def test_globals_created_by_a_run_are_removed(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_csv(tmp_path / "input.csv", periods=10)
+    _configure_engine(monkeypatch)
+    monkeypatch.chdir(tmp_path)
+    seen = []
+
+    # The hook of the first provider creates an engine global, the hook of the second provider looks for it
+    def createGlobal(dataFrame: pd.DataFrame) -> pd.DataFrame:
+        engine.providerReadingCount = len(dataFrame)
+        return dataFrame
+
+    def findGlobal(dataFrame: pd.DataFrame) -> pd.DataFrame:
+        seen.append(hasattr(engine, "providerReadingCount"))
+        return dataFrame
+
+    settings = {
+        "outputFiles": OUTPUT_FILES[:1],
+        "inputFileDateColumnName": "date",
+        "inputFileDateTimeColumnFormat": "%Y-%m-%d %H:%M",
+    }
+    for hook in (createGlobal, findGlobal):
+        config = engine.ProviderConfig(customPrepareDataPre=hook, **settings)
+        assert engine.Engine(config).generateImportDataFiles(str(inputFile))
+
+    assert seen == [False]
+    assert not hasattr(engine, "providerReadingCount")
+
+
+def test_engines_of_several_providers_run_in_one_process(tmp_path: Path, monkeypatch):
+    providers = [
+        (
+            DATASOURCES / "SolarEdge" / "SolarEdgeDataPrepare.py",
+            DATASOURCES / "SolarEdge" / "Sample files" / "UTC",
+            "solaredge_????_??.json",
+        ),
+        (
+            DATASOURCES / "Domoticz" / "DomoticzDataPrepare.py",
+            DATASOURCES / "Domoticz" / "Sample files",
+            "domoticz.db",
+        ),
+    ]
+    engines = [
+        engine.Engine(engine.ProviderConfig.fromProviderScript(str(script)))
+        for script, _, _ in providers
+    ]
+    assert engine.inputFileNameExtension == ".csv"
+
+    for run in range(2):
+        for providerEngine, (_, sampleDir, inputFiles) in zip(engines, providers):
+            directory = tmp_path / f"{sampleDir.parent.parent.name}_{run}"
+            directory.mkdir()
+            monkeypatch.chdir(directory)
+            providerEngine.generateImportDataFiles(str(sampleDir / inputFiles))
+
+            for outputFile in os.listdir(directory):
+                assert (directory / outputFile).read_bytes() == (
+                    sampleDir / outputFile
+                ).read_bytes()
+            assert os.listdir(directory)
+
+    assert engine.customPrepareDataPre is engine.engineCustomPrepareDataPre
+
+
+def test_engine_options_and_input_patterns_of_a_run(tmp_path: Path, monkeypatch):
+    inputFile = _write_readings_csv(tmp_path / "input_1.csv", periods=10)
+    expected = _generate(
+        monkeypatch, tmp_path / "expected", inputFile, outputFiles=OUTPUT_FILES[:1]
+    )
+    config = engine.ProviderConfig(
+        outputFiles=OUTPUT_FILES[:1],
+        inputFileDateColumnName="date",
+        inputFileDateTimeColumnFormat="%Y-%m-%d %H:%M",
+    )
+
+    # Files matching several patterns are read once
+    assert engine.Engine(config).generateImportDataFiles(
+        [str(inputFile), str(tmp_path / "input_*.csv")],
+        prefix="house1",
+        arguments=["--chunk-size", "5"],
+    )
+    output = pd.read_csv(
+        tmp_path / "expected" / "house1_usage_high_resolution.csv", header=None
+    )
+    pd.testing.assert_frame_equal(output, expected["usage_high_resolution.csv"])
+    assert engine.inputFileChunkSize == 0
+    assert not engine.Engine(config).generateImportDataFiles(str(tmp_path / "x*.csv"))
+
+
+# ---------- batch runner ----------
+
+
+def test_batch_runner_validates_the_jobs(tmp_path: Path):
+    import BatchDataPrepare
+
+    jobs = BatchDataPrepare.resolve_jobs(
+        {"jobs": [{"script": "Domoticz/DomoticzDataPrepare.py", "input": "x.db"}]},
+        tmp_path,
+    )
+    assert jobs[0]["name"] == "DomoticzDataPrepare"
+    assert jobs[0]["input"] == [str(tmp_path / "x.db")]
+    assert jobs[0]["output_dir"] == str(tmp_path)
+
+    with pytest.raises(SystemExit, match="unknown key"):
+        BatchDataPrepare.resolve_jobs(
+            {"jobs": [{"script": "a.py", "input": "x", "outputdir": "y"}]}, tmp_path
+        )
+    with pytest.raises(SystemExit, match="are required"):
+        BatchDataPrepare.resolve_jobs({"jobs": [{"script": "a.py"}]}, tmp_path)
+    with pytest.raises(SystemExit, match="Duplicate job name"):
+        BatchDataPrepare.resolve_jobs(
+            {"jobs": [{"script": "a.py", "input": "x"}] * 2}, tmp_path
+        )
+
+
+def test_batch_runner_isolates_failing_jobs(tmp_path: Path):
+    import BatchDataPrepare
+
+    sampleDir = DATASOURCES / "Domoticz" / "Sample files"
+    (tmp_path / "manifest.toml").write_text(
+        f"""
+[[jobs]]
+name = "house1"
+script = {json.dumps(str(DATASOURCES / "Domoticz" / "DomoticzDataPrepare.py"))}
+input = [{json.dumps(str(sampleDir / "domoticz.db"))}]
+output_dir = "house1"
+
+[[jobs]]
+name = "house2"
+script = {json.dumps(str(DATASOURCES / "Domoticz" / "DomoticzDataPrepare.py"))}
+input = "missing.db"
+output_dir = "house2"
+""",
+        encoding="utf-8",
+    )
+    manifest = BatchDataPrepare.load_manifest(tmp_path / "manifest.toml")
+    jobs = BatchDataPrepare.resolve_jobs(manifest, tmp_path)
+
+    results = BatchDataPrepare.run_jobs(jobs, 2)
+
+    assert [result["status"] for result in results] == ["ok", "failed"]
+    assert (tmp_path / "house1" / "elec_solar_high_resolution.csv").read_bytes() == (
+        sampleDir / "elec_solar_high_resolution.csv"
+    ).read_bytes()
+    assert "No files found" in (tmp_path / "house2" / "house2.log").read_text()
+
+
+# ---------- startup ----------
+
+
+@pytest.mark.parametrize(
+    "script", ["Fluvius/FluviusDataPrepare.py", "SolarEdge/SolarEdgeDataPrepare.py"]
+)
+def test_help_does_not_import_the_heavy_modules(script):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(DATASOURCES / script), "--help"],
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0
+    assert "--chunk-size" in result.stdout
+    importedModules = {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    assert not importedModules & {"numpy", "pandas", "sqlite3", "tzlocal"}
+
+
+def test_help_works_with_only_the_engine_and_the_provider_script(tmp_path: Path):
+    # The folder the README tells the users to create (ImportData.py is not copied)
+    for fileName in ("DataPrepareEngine.py", "Fluvius/FluviusDataPrepare.py"):
+        (tmp_path / Path(fileName).name).write_bytes(
+            (DATASOURCES / fileName).read_bytes()
+        )
+
+    result = subprocess.run(
+        [sys.executable, str(tmp_path / "FluviusDataPrepare.py"), "--help"],
+        capture_output=True,
+        text=True,
+        cwd=tmp_path,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "--chunk-size" in result.stdout
+    assert "--db-type" not in result.stdout
+
+
+def test_lazy_module_is_imported_on_first_use():
+    module = engine.LazyModule("colorsys")
+
+    assert module.rgb_to_hsv(1, 0, 0) == (0, 1, 1)
+    assert module.__dict__["hls_to_rgb"] is sys.modules["colorsys"].hls_to_rgb
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 import pytest
@@ -9,3 +10,17 @@ def repo_root() -> Path:
     Returns the absolute path to the project root directory.
     """
     return Path(__file__).resolve().parent
+
+
+@pytest.fixture(scope="session", autouse=True)
+def input_file_cache(tmp_path_factory):
+    """
+    Keeps the input file cache of the data preparation scripts out of the user's cache directory.
+    """
+    previous = os.environ.get("XDG_CACHE_HOME")
+    os.environ["XDG_CACHE_HOME"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    if previous is None:
+        del os.environ["XDG_CACHE_HOME"]
+    else:
+        os.environ["XDG_CACHE_HOME"] = previous